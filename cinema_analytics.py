@@ -0,0 +1,249 @@
+import datetime
+import sqlite3
+import struct
+import time
+from typing import BinaryIO, Dict, Optional
+
+from cinema_seat_map import DEFAULT_HALL
+
+# Группировки отчетов о продажах: имя -> колонка счетчиков
+GROUP_COLUMNS = {'hall': 'hall_number', 'movie': 'movie_id', 'day': 'day'}
+
+# Вместимость сеанса: по схеме зала, для залов без схемы — по залу по умолчанию
+_CAPACITY = f'COALESCE(h.rows * h.seats_per_row, {DEFAULT_HALL[0] * DEFAULT_HALL[1]})'
+
+# Счетчики продаж по (день сеанса, зал, фильм); поддерживаются при каждой покупке
+SALES_DAILY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT NOT NULL,
+        hall_number INTEGER NOT NULL,
+        movie_id INTEGER NOT NULL,
+        total_seats INTEGER NOT NULL DEFAULT 0,
+        sold_seats INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, hall_number, movie_id)
+    ) WITHOUT ROWID
+'''
+
+# Удержанные места сеанса: заняты и вычтены из available_seats, но еще не проданы
+_HELD = '(SELECT COALESCE(SUM(hd.seat_count), 0) FROM holds hd WHERE hd.screening_id = s.id)'
+
+# Пересчет всех счетчиков по сеансам и билетам (одним проходом по каждой таблице).
+# Входит в миграцию 4 (до удержаний и архива) и не меняется.
+REBUILD_SALES_DAILY = f'''
+    INSERT INTO sales_daily (day, hall_number, movie_id, total_seats, sold_seats, revenue)
+    SELECT date(s.screening_time), s.hall_number, s.movie_id,
+           SUM({_CAPACITY}), SUM({_CAPACITY} - s.available_seats), SUM(COALESCE(r.revenue, 0))
+    FROM screenings s
+    LEFT JOIN halls h ON h.number = s.hall_number
+    LEFT JOIN (SELECT screening_id, SUM(total_price) AS revenue FROM tickets GROUP BY screening_id) r
+        ON r.screening_id = s.id
+    GROUP BY date(s.screening_time), s.hall_number, s.movie_id
+'''
+
+def _screening_sales(screenings: str, tickets: str, sold_seats: str) -> str:
+    return f'''
+        SELECT s.screening_time, s.hall_number, s.movie_id, {_CAPACITY} AS total_seats, {sold_seats} AS sold_seats,
+               (SELECT COALESCE(SUM(t.total_price), 0) FROM {tickets} t WHERE t.screening_id = s.id) AS revenue
+        FROM {screenings} s
+        LEFT JOIN halls h ON h.number = s.hall_number
+        WHERE s.screening_time >= COALESCE(?, '') AND s.screening_time < COALESCE(?, '9999-12-31')
+    '''
+
+# Места и выручка каждого сеанса с временем в окне [?, ?) — рабочие и архивные таблицы
+# (параметры окна повторяются для каждой части); выручка считается по индексу билетов
+_SCREENING_SALES = (_screening_sales('screenings', 'tickets', f'{_CAPACITY} - s.available_seats - {_HELD}')
+                    + 'UNION ALL'
+                    + _screening_sales('screenings_archive', 'tickets_archive', f'{_CAPACITY} - s.available_seats'))
+
+_REBUILD_SALES_DAILY_CURRENT = f'''
+    INSERT INTO sales_daily (day, hall_number, movie_id, total_seats, sold_seats, revenue)
+    SELECT date(screening_time), hall_number, movie_id, SUM(total_seats), SUM(sold_seats), SUM(revenue)
+    FROM ({_SCREENING_SALES})
+    GROUP BY 1, 2, 3
+'''
+
+# Новый сеанс: его места добавляются к счетчикам группы (проданные до записи — сразу в sold_seats)
+ADD_SCREENING_SALES = f'''
+    INSERT INTO sales_daily (day, hall_number, movie_id, total_seats, sold_seats, revenue)
+    SELECT date(s.screening_time), s.hall_number, s.movie_id, {_CAPACITY}, {_CAPACITY} - s.available_seats, 0
+    FROM screenings s
+    LEFT JOIN halls h ON h.number = s.hall_number
+    WHERE s.id = ?
+    ON CONFLICT (day, hall_number, movie_id) DO UPDATE SET
+        total_seats = total_seats + excluded.total_seats,
+        sold_seats = sold_seats + excluded.sold_seats
+'''
+
+# Продажа: параметры (проданные места, выручка, id сеанса)
+ADD_SALE = '''
+    UPDATE sales_daily SET sold_seats = sold_seats + ?, revenue = revenue + ?
+    WHERE (day, hall_number, movie_id) = (
+        SELECT date(screening_time), hall_number, movie_id FROM screenings WHERE id = ?
+    )
+'''
+
+# Запись группы счетчиков в снимке: день, зал, фильм, всего мест, продано, выручка
+_GROUP_RECORD = struct.Struct('<10sqqqqd')
+
+def _day(value) -> Optional[str]:
+    """Граница окна в виде дня 'YYYY-MM-DD' (дата, datetime или строка)"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+def _group_column(group_by: str) -> str:
+    try:
+        return GROUP_COLUMNS[group_by]
+    except KeyError:
+        raise ValueError(f"Неизвестная группировка: {group_by}") from None
+
+def _report_entry(total_seats: int, sold_seats: int, revenue: float) -> Dict:
+    return {
+        'total_seats': total_seats,
+        'sold_seats': sold_seats,
+        'revenue': revenue,
+        'utilization': sold_seats / total_seats if total_seats else 0.0,
+    }
+
+class SalesCounters:
+    """Счетчики мест и выручки по (день сеанса, зал, фильм) для системы в памяти.
+
+    Обновляются при добавлении сеанса и каждой продаже, поэтому отчет стоит
+    O(число групп), а не O(сеансы + билеты).
+    """
+
+    def __init__(self):
+        # (день, зал, фильм) -> [всего мест, продано мест, выручка]
+        self._groups: Dict[tuple, list] = {}
+        # id сеанса -> ключ его группы
+        self._keys: Dict[int, tuple] = {}
+
+    def add_screening(self, screening_id: int, screening_time: datetime.datetime, hall_number: int, movie_id: int,
+                      capacity: int, sold_seats: int = 0):
+        key = (screening_time.strftime('%Y-%m-%d'), hall_number, movie_id)
+        self._keys[screening_id] = key
+        group = self._groups.setdefault(key, [0, 0, 0.0])
+        group[0] += capacity
+        group[1] += sold_seats
+
+    def add_sale(self, screening_id: int, seats: int, revenue: float):
+        """Учесть продажу; сеансы, не добавленные через add_screening, пропускаются"""
+        key = self._keys.get(screening_id)
+        if key is not None:
+            group = self._groups[key]
+            group[1] += seats
+            group[2] += revenue
+
+    def report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """Загрузка и выручка по группам за дни сеансов в окне [start, end)"""
+        _group_column(group_by)
+        index = ('day', 'hall', 'movie').index(group_by)
+        start, end = _day(start), _day(end)
+        totals: Dict = {}
+        for key, (total_seats, sold_seats, revenue) in self._groups.items():
+            if (start and key[0] < start) or (end and key[0] >= end):
+                continue
+            group = totals.setdefault(key[index], [0, 0, 0.0])
+            group[0] += total_seats
+            group[1] += sold_seats
+            group[2] += revenue
+        return {key: _report_entry(*totals[key]) for key in sorted(totals)}
+
+    def dump(self, f: BinaryIO):
+        """Записать счетчики групп (привязка сеансов к группам восстанавливается через add_screening)"""
+        f.write(struct.pack('<Q', len(self._groups)))
+        for (day, hall_number, movie_id), (total_seats, sold_seats, revenue) in self._groups.items():
+            f.write(_GROUP_RECORD.pack(day.encode('ascii'), hall_number, movie_id, total_seats, sold_seats, revenue))
+
+    def load(self, buffer: memoryview, offset: int) -> int:
+        """Заменить счетчики групп записанными dump; возвращает смещение после них"""
+        (count,) = struct.unpack_from('<Q', buffer, offset)
+        offset += 8
+        self._groups = {}
+        end = offset + count * _GROUP_RECORD.size
+        for day, hall_number, movie_id, total_seats, sold_seats, revenue in _GROUP_RECORD.iter_unpack(buffer[offset:end]):
+            self._groups[(day.decode('ascii'), hall_number, movie_id)] = [total_seats, sold_seats, revenue]
+        return end
+
+def sales_report(conn: sqlite3.Connection, group_by: str = 'hall', start=None, end=None) -> Dict:
+    """Отчет по счетчикам sales_daily за дни сеансов в окне [start, end)"""
+    column = _group_column(group_by)
+    rows = conn.execute(f'''
+        SELECT {column}, SUM(total_seats), SUM(sold_seats), SUM(revenue)
+        FROM sales_daily
+        WHERE day >= COALESCE(?, '') AND day < COALESCE(?, '9999-12-31')
+        GROUP BY {column}
+        ORDER BY {column}
+    ''', (_day(start), _day(end))).fetchall()
+    return {row[0]: _report_entry(*row[1:]) for row in rows}
+
+def recompute_sales_report(conn: sqlite3.Connection, group_by: str = 'hall', start=None, end=None) -> Dict:
+    """Отчет, вычисленный агрегатным запросом по сеансам и билетам.
+
+    Окно [start, end) задается с точностью до секунды; выручка сеанса считается
+    по индексу билетов только для сеансов из окна. Учитываются и архивные сеансы.
+    """
+    column = 'date(screening_time)' if group_by == 'day' else _group_column(group_by)
+    window = (str(start) if start is not None else None, str(end) if end is not None else None)
+    rows = conn.execute(f'''
+        SELECT {column}, SUM(total_seats), SUM(sold_seats), SUM(revenue)
+        FROM ({_SCREENING_SALES})
+        GROUP BY 1
+        ORDER BY 1
+    ''', window * 2).fetchall()
+    return {row[0]: _report_entry(*row[1:]) for row in rows}
+
+def rebuild_sales_counters(conn: sqlite3.Connection):
+    """Пересчитать sales_daily заново (после загрузки данных в обход системы)"""
+    conn.execute('DELETE FROM sales_daily')
+    conn.execute(_REBUILD_SALES_DAILY_CURRENT, (None, None) * 2)
+
+def compare_reports(first: Dict, second: Dict) -> bool:
+    """Совпадают ли два отчета о продажах (выручка — с точностью до копейки)"""
+    return first.keys() == second.keys() and all(
+        first[key]['total_seats'] == second[key]['total_seats']
+        and first[key]['sold_seats'] == second[key]['sold_seats']
+        and abs(first[key]['revenue'] - second[key]['revenue']) < 0.01
+        for key in first
+    )
+
+def analytics_experiment(tickets: int = 200_000, db_name: str = "cinema_analytics.db", repeats: int = 20):
+    """Сравнение отчетов по счетчикам с пересчетом по сеансам и билетам в обеих системах"""
+    from cinema_data_generator import CinemaDataGenerator, load_memory, load_sqlite
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== АНАЛИТИКА ПРОДАЖ ===")
+    generator = CinemaDataGenerator(movies=50, halls=10, days=30, slots_per_day=8, tickets=tickets)
+    remove_database(db_name)
+    sqlite_system = CinemaTicketSystemSQLite(db_name, sample_data=False)
+    try:
+        load_sqlite(db_name, generator)
+        memory_system = CinemaTicketSystemExperiment(sample_data=False)
+        load_memory(memory_system, generator)
+        print(f"Билетов: {tickets}, сеансов: {generator.screening_count}")
+
+        start = generator.start + datetime.timedelta(days=7)
+        end = start + datetime.timedelta(days=7)
+        for name, system in (('SQLite', sqlite_system), ('В памяти', memory_system)):
+            for method in ('get_sales_report', 'recompute_sales_report'):
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    report = getattr(system, method)('hall', start, end)
+                elapsed = (time.perf_counter() - started) / repeats * 1000
+                print(f"{name:>9} {method:<24} {elapsed:8.2f} мс на отчет ({len(report)} групп)")
+            same = compare_reports(system.get_sales_report('movie'), system.recompute_sales_report('movie'))
+            print(f"{name:>9} счетчики совпадают с пересчетом: {'да' if same else 'НЕТ'}")
+
+        print("\nЗагрузка залов за неделю (SQLite):")
+        for hall, stats in sqlite_system.get_sales_report('hall', start, end).items():
+            print(f"Зал {hall}: {stats['utilization'] * 100:.1f}%, выручка {stats['revenue']:.0f} руб.")
+    finally:
+        sqlite_system.close()
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    analytics_experiment()
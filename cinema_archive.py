@@ -0,0 +1,173 @@
+import datetime
+import os
+import sqlite3
+import time
+from typing import Tuple
+
+from cinema_analytics import compare_reports
+from cinema_data_generator import CinemaDataGenerator, load_sqlite
+from cinema_rows import parse_datetime
+
+# Архив прошедших сеансов и их билетов: те же колонки, что у рабочих таблиц, id сохраняются.
+# Рабочие таблицы screenings и tickets содержат только предстоящие сеансы.
+SCREENING_COLUMNS = 'id, movie_id, screening_time, hall_number, price, available_seats, seat_map, starts_at'
+TICKET_COLUMNS = ('id, screening_id, customer_name, customer_email, seat_number, purchase_time, total_price, '
+                  'purchased_at')
+
+SCREENINGS_ARCHIVE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS screenings_archive (
+        id INTEGER PRIMARY KEY,
+        movie_id INTEGER NOT NULL,
+        screening_time DATETIME NOT NULL,
+        hall_number INTEGER NOT NULL,
+        price DECIMAL(10,2) NOT NULL,
+        available_seats INTEGER NOT NULL,
+        seat_map BLOB,
+        starts_at INTEGER NOT NULL
+    )
+'''
+
+TICKETS_ARCHIVE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS tickets_archive (
+        id INTEGER PRIMARY KEY,
+        screening_id INTEGER NOT NULL,
+        customer_name TEXT NOT NULL,
+        customer_email TEXT NOT NULL,
+        seat_number INTEGER NOT NULL,
+        purchase_time DATETIME,
+        total_price DECIMAL(10,2) NOT NULL,
+        purchased_at INTEGER
+    )
+'''
+
+# Пакет архивации: самые ранние сеансы, начавшиеся до границы (диапазон по индексу starts_at).
+# Подзапрос повторяется в каждом операторе пакета и внутри транзакции дает одни и те же id.
+_BATCH = 'SELECT id FROM screenings WHERE starts_at < ? ORDER BY starts_at LIMIT ?'
+
+_ARCHIVE_SCREENINGS = f'''
+    INSERT INTO screenings_archive ({SCREENING_COLUMNS})
+    SELECT {SCREENING_COLUMNS} FROM screenings WHERE id IN ({_BATCH})
+'''
+
+_ARCHIVE_TICKETS = f'''
+    INSERT INTO tickets_archive ({TICKET_COLUMNS})
+    SELECT {TICKET_COLUMNS} FROM tickets WHERE screening_id IN ({_BATCH})
+'''
+
+def archive_batch(cursor: sqlite3.Cursor, cutoff: int, batch_size: int) -> Tuple[int, int]:
+    """Перенести до batch_size сеансов, начавшихся до cutoff (секунды эпохи), вместе с билетами.
+
+    Выполняется внутри открытой транзакции; возвращает (сеансов, билетов).
+    Удержания мест на перенесенные сеансы удаляются: сеанс уже начался.
+    """
+    params = (cutoff, batch_size)
+    cursor.execute(_ARCHIVE_SCREENINGS, params)
+    screenings = cursor.rowcount
+    if not screenings:
+        return 0, 0
+    cursor.execute(_ARCHIVE_TICKETS, params)
+    tickets = cursor.rowcount
+    cursor.execute(f'DELETE FROM holds WHERE screening_id IN ({_BATCH})', params)
+    cursor.execute(f'DELETE FROM tickets WHERE screening_id IN ({_BATCH})', params)
+    cursor.execute(f'DELETE FROM screenings WHERE id IN ({_BATCH})', params)
+    return screenings, tickets
+
+def archive_experiment(tickets: int = 300_000, past_days: int = 53, upcoming_days: int = 7,
+                       db_name: str = "cinema_archive.db", repeats: int = 200):
+    """Задержка запросов предстоящих сеансов до и после архивации прошедших"""
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== АРХИВАЦИЯ ПРОШЕДШИХ СЕАНСОВ ===")
+    remove_database(db_name)
+    try:
+        start = datetime.datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        generator = CinemaDataGenerator(movies=50, halls=10, days=past_days + upcoming_days, slots_per_day=8,
+                                        start=start - datetime.timedelta(days=past_days), tickets=tickets)
+        CinemaTicketSystemSQLite(db_name, sample_data=False).close()
+        load_sqlite(db_name, generator)
+
+        def measure(system) -> dict:
+            timings = {}
+            for name, operation in (('get_available_movies', system.get_available_movies),
+                                    ('get_screenings_by_movie', lambda: system.get_screenings_by_movie(1)),
+                                    ('get_ticket_history',
+                                     lambda: system.get_ticket_history("customer1@example.com"))):
+                operation()
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    operation()
+                timings[name] = (time.perf_counter() - started) / repeats * 1e6
+            return timings
+
+        with CinemaTicketSystemSQLite(db_name, sample_data=False) as system:
+            history = system.get_ticket_history("customer1@example.com")
+            report = system.recompute_sales_report('movie')
+            before = measure(system)
+            started = time.perf_counter()
+            moved = system.archive_past_screenings()
+            elapsed = time.perf_counter() - started
+            after = measure(system)
+            print(f"Сеансов: {generator.screening_count}, билетов: {tickets}; перенесено в архив: "
+                  f"{moved['screenings']} сеансов, {moved['tickets']} билетов за {elapsed:.2f} с")
+            for name in before:
+                print(f"{name:<24} {before[name]:9.1f} мкс -> {after[name]:9.1f} мкс")
+            same_history = system.get_ticket_history("customer1@example.com") == history
+            same_report = compare_reports(system.recompute_sales_report('movie'), report)
+            same_counters = compare_reports(system.get_sales_report('movie'), report)
+            print(f"История покупок не изменилась: {'да' if same_history else 'НЕТ'}")
+            print(f"Пересчет отчета совпадает со счетчиками: {'да' if same_report and same_counters else 'НЕТ'}")
+    finally:
+        remove_database(db_name)
+
+def timezone_experiment(timezone: str = 'Asia/Tokyo', db_name: str = "cinema_timezone.db"):
+    """Предстоящие и прошедшие сеансы при часовом поясе не UTC: SQLite (по starts_at) и система в памяти
+    (по datetime) должны видеть одни и те же сеансы"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print(f"=== ЧАСОВОЙ ПОЯС {timezone} ===")
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = timezone
+    time.tzset()
+    remove_database(db_name)
+    try:
+        # Сеансы по обе стороны от текущего момента ближе, чем смещение пояса от UTC
+        now = datetime.datetime.now().replace(microsecond=0)
+        offsets = (-6, -2, -0.5, 0.5, 2, 6)
+        memory = CinemaTicketSystemExperiment(sample_data=False)
+        movie = memory.add_movie('Проверка', 'Драма', 120, 7.0)
+        for hours in offsets:
+            memory.add_screening(movie.id, now + datetime.timedelta(hours=hours), 1, 400, 100)
+        upcoming = [screening.screening_time for screening in memory.get_screenings_by_movie(movie.id)]
+
+        with CinemaTicketSystemSQLite(db_name, sample_data=False) as system:
+            movie_id = system.add_movie('Проверка', 'Драма', 120, 7.0)
+            for hours in offsets:
+                system.add_screening(movie_id, now + datetime.timedelta(hours=hours), 1, 400, 100)
+            sqlite_upcoming = [parse_datetime(screening['screening_time'])
+                               for screening in system.get_screenings_by_movie(movie_id)]
+            with system.readers.connection() as conn:
+                # Значения to_epoch совпадают с выражением, которым миграция 6 заполняет starts_at
+                mismatched = conn.execute("SELECT COUNT(*) FROM screenings "
+                                          "WHERE starts_at != CAST(strftime('%s', screening_time, 'utc') AS INTEGER)"
+                                          ).fetchone()[0]
+            archived = system.archive_past_screenings()['screenings']
+
+        past = sum(hours < 0 for hours in offsets)
+        print(f"Предстоящих сеансов: в памяти {len(upcoming)}, в SQLite {len(sqlite_upcoming)}; "
+              f"перенесено в архив: {archived} (ожидалось {past})")
+        print(f"starts_at расходится с пересчетом миграции: {mismatched}")
+        if upcoming != sqlite_upcoming or archived != past or mismatched:
+            raise RuntimeError(f"Время сеансов в SQLite расходится с системой в памяти в поясе {timezone}")
+        print("Сеансы совпадают")
+    finally:
+        if previous is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = previous
+        time.tzset()
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    archive_experiment()
+    timezone_experiment()
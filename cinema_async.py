@@ -0,0 +1,97 @@
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite
+
+class AsyncCinemaTicketSystem:
+    """Асинхронный фасад над CinemaTicketSystemSQLite.
+
+    Чтение выполняется в пуле потоков на соединениях системы только для чтения (mode=ro),
+    все покупки проходят через поток групповой фиксации и соединение-писатель,
+    поэтому писатели не конкурируют за блокировку базы.
+    """
+
+    def __init__(self, db_name: str = "cinema.db", readers: int = 4):
+        self.system = CinemaTicketSystemSQLite(db_name, pool_size=readers, group_commit=True)
+        self.executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="cinema-reader")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Дождаться записи накопленных покупок и закрыть соединения"""
+        self.executor.shutdown(wait=True)
+        self.system.close()
+
+    async def _read(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, method, *args)
+
+    async def get_available_movies(self) -> List[Dict]:
+        """Получить список доступных фильмов"""
+        return await self._read(self.system.get_available_movies)
+
+    async def get_screenings_by_movie(self, movie_id: int) -> List[Dict]:
+        """Получить сеансы для конкретного фильма"""
+        return await self._read(self.system.get_screenings_by_movie, movie_id)
+
+    async def get_ticket_history(self, customer_email: str) -> List[Dict]:
+        """Получить историю покупок"""
+        return await self._read(self.system.get_ticket_history, customer_email)
+
+    async def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+                              seat_numbers: Optional[List[int]] = None) -> bool:
+        """Покупка билетов через поток-писатель; ошибка записи пакета передается вызывающему"""
+        batcher = self.system.batcher
+        if not batcher.alive:
+            # Закрытый или остановленный поток не ответит: ожидание не начинается
+            raise sqlite3.ProgrammingError("Поток групповой фиксации остановлен")
+        future = batcher.submit(screening_id, customer_name, customer_email, seat_count, seat_numbers)
+        return await asyncio.wrap_future(future)
+
+async def _request(system: AsyncCinemaTicketSystem, rng: random.Random, i: int):
+    # 40% - поиск фильмов, 40% - покупка билетов, 20% - поиск истории
+    op_type = rng.random()
+    if op_type < 0.4:
+        await system.get_available_movies()
+    elif op_type < 0.8:
+        await system.purchase_ticket(rng.randint(1, 140), f"Async{i}", f"async{i % 100}@test.com", 1)
+    else:
+        await system.get_ticket_history(f"async{rng.randint(0, 99)}@test.com")
+
+async def _run_load(system: AsyncCinemaTicketSystem, concurrency: int, requests: int) -> float:
+    rng = random.Random(concurrency)
+    counter = iter(range(requests))
+
+    async def client():
+        for i in counter:
+            await _request(system, rng, i)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start_time
+
+def async_benchmark(concurrency_levels: Sequence[int] = (1, 4, 16, 64), requests: int = 2000, readers: int = 4):
+    """Замер запросов в секунду при разном числе одновременных клиентов"""
+    print("=== АСИНХРОННЫЙ ФАСАД: МАСШТАБИРОВАНИЕ ===")
+
+    for concurrency in concurrency_levels:
+        with tempfile.TemporaryDirectory() as directory:
+            system = AsyncCinemaTicketSystem(os.path.join(directory, "async.db"), readers)
+            try:
+                elapsed = asyncio.run(_run_load(system, concurrency, requests))
+            finally:
+                system.close()
+            print(f"Одновременных клиентов: {concurrency}, {requests / elapsed:.0f} запросов/с")
+
+if __name__ == "__main__":
+    async_benchmark()
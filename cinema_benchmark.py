@@ -0,0 +1,240 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+from cinema_ticket_system_hybrid import CinemaTicketSystemHybrid
+from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite
+
+SEATS_PER_SCREENING = 100
+ORDERS_PER_BATCH = 10000
+
+# Фабрики систем: создают пустую систему с тестовыми данными в каталоге directory
+BACKENDS: Dict[str, Callable] = {
+    'sqlite': lambda directory, cache_size: CinemaTicketSystemSQLite(
+        os.path.join(directory, "benchmark.db"), cache_size=cache_size
+    ),
+    'memory': lambda directory, cache_size: CinemaTicketSystemExperiment(cache_size=cache_size),
+    'hybrid': lambda directory, cache_size: CinemaTicketSystemHybrid(
+        os.path.join(directory, "benchmark.db"), cache_size=cache_size
+    ),
+}
+
+SCENARIOS = ('browse', 'purchase', 'history', 'mixed')
+
+class Dataset:
+    """Параметры загруженных данных, из которых сценарии выбирают аргументы запросов"""
+
+    def __init__(self, tickets: int, customers: int, screening_ids: List[int], movie_ids: List[int]):
+        self.tickets = tickets
+        self.customers = customers
+        # Сеансы, на которые еще можно купить билеты
+        self.screening_ids = screening_ids
+        self.movie_ids = movie_ids
+
+def _entity_id(value) -> int:
+    # add_screening возвращает id (SQLite) или объект сеанса (в памяти)
+    return getattr(value, 'id', value)
+
+def prepare_dataset(system, tickets: int) -> Dataset:
+    """Догрузить в систему продажи на tickets билетов (через публичное API)"""
+    customers = max(tickets // 10, 100)
+    movies = system.get_available_movies()
+    movie_ids = [movie['id'] if isinstance(movie, dict) else movie.id for movie in movies]
+
+    base_time = datetime.datetime.now().replace(minute=0, second=0, microsecond=0) + datetime.timedelta(days=30)
+    orders = []
+    for number in range((tickets + SEATS_PER_SCREENING - 1) // SEATS_PER_SCREENING):
+        movie_id = movie_ids[number % len(movie_ids)]
+        screening_id = _entity_id(system.add_screening(
+            movie_id, base_time + datetime.timedelta(hours=number), number % 3 + 1, 500, SEATS_PER_SCREENING
+        ))
+        for seat in range(min(SEATS_PER_SCREENING, tickets - number * SEATS_PER_SCREENING)):
+            index = number * SEATS_PER_SCREENING + seat
+            orders.append((screening_id, f"Bench{index % customers}", f"bench{index % customers}@test.com", 1))
+        if len(orders) >= ORDERS_PER_BATCH:
+            system.purchase_tickets_bulk(orders)
+            orders = []
+    if orders:
+        system.purchase_tickets_bulk(orders)
+
+    # Покупки идут на будущие сеансы, где еще есть места
+    open_screening_ids = []
+    for movie_id in movie_ids:
+        for screening in system.get_screenings_by_movie(movie_id):
+            if isinstance(screening, dict):
+                if screening['available_seats'] > 0:
+                    open_screening_ids.append(screening['id'])
+            elif screening.available_seats > 0:
+                open_screening_ids.append(screening.id)
+    return Dataset(tickets, customers, open_screening_ids, movie_ids)
+
+def _operation(system, dataset: Dataset, scenario: str, rng: random.Random) -> Callable:
+    """Случайная операция сценария (замыкание без аргументов)"""
+    if scenario == 'mixed':
+        # 40% - поиск фильмов, 40% - покупка билетов, 20% - поиск истории
+        op_type = rng.random()
+        scenario = 'browse' if op_type < 0.4 else 'purchase' if op_type < 0.8 else 'history'
+
+    if scenario == 'browse':
+        return system.get_available_movies
+    if scenario == 'purchase':
+        screening_id = rng.choice(dataset.screening_ids)
+        customer = rng.randrange(dataset.customers)
+        return lambda: system.purchase_ticket(screening_id, f"Bench{customer}", f"bench{customer}@test.com", 1)
+    customer = rng.randrange(dataset.customers)
+    return lambda: system.get_ticket_history(f"bench{customer}@test.com")
+
+def _percentile(sorted_values: List[int], fraction: float) -> float:
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def run_scenario(system, dataset: Dataset, scenario: str, operations: int, warmup: int, seed: int,
+                 measure_memory: bool = True) -> Dict:
+    """Выполнить сценарий и вернуть статистику задержек (в микросекундах)"""
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        _operation(system, dataset, scenario, rng)()
+
+    # Аргументы готовятся заранее, чтобы в замер попадала только сама операция
+    plan = [_operation(system, dataset, scenario, rng) for _ in range(operations)]
+    timings = []
+    gc.collect()
+    started = time.perf_counter_ns()
+    for operation in plan:
+        start = time.perf_counter_ns()
+        operation()
+        timings.append(time.perf_counter_ns() - start)
+    total = time.perf_counter_ns() - started
+
+    peak_memory = None
+    if measure_memory:
+        # Отдельный короткий проход: tracemalloc сильно замедляет выполнение
+        memory_plan = [_operation(system, dataset, scenario, rng) for _ in range(min(operations, 200))]
+        tracemalloc.start()
+        for operation in memory_plan:
+            operation()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'scenario': scenario,
+        'operations': operations,
+        'ops_per_sec': operations / (total / 1e9),
+        'mean_us': sum(timings) / len(timings) / 1000,
+        'p50_us': _percentile(timings, 0.50) / 1000,
+        'p95_us': _percentile(timings, 0.95) / 1000,
+        'p99_us': _percentile(timings, 0.99) / 1000,
+        'max_us': timings[-1] / 1000,
+        'peak_memory_kb': peak_memory / 1024 if peak_memory is not None else None,
+    }
+
+def run_benchmarks(backends: List[str], scenarios: List[str], ticket_counts: List[int], operations: int = 2000,
+                   warmup: int = 200, seed: int = 42, cache_size: int = 0, measure_memory: bool = True) -> Dict:
+    """Прогнать все сочетания систем, размеров данных и сценариев"""
+    results = []
+    for backend in backends:
+        for tickets in ticket_counts:
+            # Каждый сценарий начинается на свежих данных, чтобы покупки одного не влияли на другой
+            for scenario in scenarios:
+                with tempfile.TemporaryDirectory() as directory:
+                    system = BACKENDS[backend](directory, cache_size)
+                    try:
+                        load_start = time.perf_counter()
+                        dataset = prepare_dataset(system, tickets)
+                        load_time = time.perf_counter() - load_start
+                        result = run_scenario(system, dataset, scenario, operations, warmup, seed, measure_memory)
+                    finally:
+                        if hasattr(system, 'close'):
+                            system.close()
+                result.update({'backend': backend, 'tickets': tickets, 'load_seconds': load_time})
+                results.append(result)
+                print(_format_result(result))
+
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'operations': operations,
+            'warmup': warmup,
+            'seed': seed,
+            'cache_size': cache_size,
+        },
+        'results': results,
+    }
+
+def _format_result(result: Dict) -> str:
+    memory = f", пик памяти {result['peak_memory_kb']:.0f} КБ" if result['peak_memory_kb'] is not None else ""
+    return (f"{result['backend']:>7} {result['scenario']:>8} билетов={result['tickets']:<9} "
+            f"{result['ops_per_sec']:>9.0f} оп/с  p50 {result['p50_us']:.1f} мкс  "
+            f"p95 {result['p95_us']:.1f} мкс  p99 {result['p99_us']:.1f} мкс{memory}")
+
+def compare_with_baseline(current: Dict, baseline: Dict, threshold: float = 0.2) -> List[str]:
+    """Найти регрессии: рост p95 или падение пропускной способности больше чем на threshold"""
+    baseline_results = {
+        (result['backend'], result['scenario'], result['tickets']): result
+        for result in baseline['results']
+    }
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get((result['backend'], result['scenario'], result['tickets']))
+        if not previous:
+            continue
+        name = f"{result['backend']}/{result['scenario']}/{result['tickets']}"
+        if result['p95_us'] > previous['p95_us'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_us']:.1f} -> {result['p95_us']:.1f} мкс")
+        if result['ops_per_sec'] < previous['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: {previous['ops_per_sec']:.0f} -> {result['ops_per_sec']:.0f} оп/с")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнительный замер производительности систем продажи билетов")
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--tickets', nargs='+', type=int, default=[1000, 10000],
+                        help="размеры истории продаж (от 10**3 до 10**7)")
+    parser.add_argument('--operations', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache-size', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="не измерять пик памяти")
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    parser.add_argument('--baseline', help="JSON с базовыми результатами для поиска регрессий")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    print("=== СРАВНИТЕЛЬНЫЙ ЗАМЕР ПРОИЗВОДИТЕЛЬНОСТИ ===")
+    results = run_benchmarks(args.backends, args.scenarios, args.tickets, args.operations, args.warmup,
+                             args.seed, args.cache_size, not args.no_memory)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print("\nОбнаружены регрессии:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nРегрессий относительно базовых результатов нет")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
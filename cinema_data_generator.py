@@ -0,0 +1,271 @@
+import datetime
+import random
+import sqlite3
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from cinema_analytics import rebuild_sales_counters
+from cinema_rows import to_epoch
+from cinema_seat_map import SeatMap, hall_layout
+
+GENRES = ['Фантастика', 'Драма', 'Комедия', 'Боевик', 'Мультфильм', 'Триллер', 'Ужасы', 'Мелодрама']
+TITLE_WORDS = [
+    'Последний', 'Тайный', 'Северный', 'Звездный', 'Темный', 'Город', 'Путь', 'Остров',
+    'Рассвет', 'Код', 'Мир', 'Шторм', 'Легенда', 'Граница', 'Сигнал', 'Вектор',
+]
+
+class CinemaDataGenerator:
+    """Детерминированный генератор афиши и продаж.
+
+    Залы работают slots_per_day сеансов в день на протяжении days дней начиная с start.
+    Заполняемость сеанса определяется кривой продаж: популярность фильма (закон Ципфа
+    с показателем popularity_skew), время сеанса (вечером больше), выходные и случайный шум.
+    Если задан tickets, кривая масштабируется так, чтобы всего было продано около tickets билетов.
+    """
+
+    def __init__(self, seed: int = 42, movies: int = 20, halls: int = 10, days: int = 7, slots_per_day: int = 6,
+                 start: Optional[datetime.datetime] = None, occupancy: float = 0.5, tickets: Optional[int] = None,
+                 customers: Optional[int] = None, popularity_skew: float = 1.0, max_group: int = 4,
+                 sales_window_days: int = 14):
+        self.seed = seed
+        self.movies = movies
+        self.halls = halls
+        self.days = days
+        self.slots_per_day = slots_per_day
+        self.start = start or datetime.datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.occupancy = occupancy
+        self.tickets = tickets
+        self.customers = customers or max(1000, (tickets or 0) // 20)
+        self.popularity_skew = popularity_skew
+        self.max_group = max_group
+        self.sales_window_days = sales_window_days
+        # Кривая продаж вычисляется один раз: доля проданных мест для каждого сеанса
+        self._fill = None
+
+    @property
+    def screening_count(self) -> int:
+        return self.halls * self.days * self.slots_per_day
+
+    def movie_rows(self) -> List[Tuple]:
+        """Фильмы: (id, title, genre, duration, rating)"""
+        rng = random.Random(f"{self.seed}:movies")
+        rows = []
+        for movie_id in range(1, self.movies + 1):
+            title = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS).lower()} {movie_id}"
+            rows.append((movie_id, title, rng.choice(GENRES), rng.randint(85, 190), round(rng.uniform(5.0, 9.5), 1)))
+        return rows
+
+    def _schedule(self) -> Iterator[Tuple]:
+        """Сеансы по порядку времени: (id, movie_id, time, hall_number, price, weight)"""
+        rng = random.Random(f"{self.seed}:schedule")
+        popularity = [1 / (rank ** self.popularity_skew) for rank in range(1, self.movies + 1)]
+        rng.shuffle(popularity)
+        top = max(popularity)
+        movie_indexes = range(self.movies)
+        slot_hours = 14 / self.slots_per_day
+
+        screening_id = 0
+        for day in range(self.days):
+            day_start = self.start + datetime.timedelta(days=day)
+            weekend = 1.3 if day_start.weekday() >= 5 else 1.0
+            for slot in range(self.slots_per_day):
+                screening_time = day_start + datetime.timedelta(hours=slot * slot_hours)
+                evening = 0.6 + 0.8 * slot / max(self.slots_per_day - 1, 1)
+                for hall in range(1, self.halls + 1):
+                    screening_id += 1
+                    movie_index = rng.choices(movie_indexes, popularity)[0]
+                    price = 300 + 50 * (slot * 4 // self.slots_per_day) + (100 if weekend > 1 else 0)
+                    weight = popularity[movie_index] / top * evening * weekend * rng.uniform(0.7, 1.3)
+                    yield screening_id, movie_index + 1, screening_time, hall, price, weight
+
+    def _fill_fractions(self) -> List[float]:
+        if self._fill is not None:
+            return self._fill
+        raw = []
+        capacities = []
+        for _, _, _, hall, _, weight in self._schedule():
+            rows, cols = hall_layout(hall)
+            raw.append(weight)
+            capacities.append(rows * cols)
+        mean = sum(raw) / len(raw) if raw else 1.0
+
+        if self.tickets is None:
+            scale = self.occupancy / mean
+        else:
+            total_capacity = sum(capacities)
+            if self.tickets > total_capacity:
+                raise ValueError(f"Нельзя продать {self.tickets} билетов: всего мест {total_capacity}")
+            # Несколько уточнений масштаба, чтобы учесть сеансы, заполненные полностью
+            scale = self.tickets / sum(w * c for w, c in zip(raw, capacities))
+            for _ in range(8):
+                sold = sum(min(1.0, w * scale) * c for w, c in zip(raw, capacities))
+                if sold <= 0 or abs(sold - self.tickets) < 1:
+                    break
+                scale *= self.tickets / sold
+        self._fill = [min(1.0, weight * scale) for weight in raw]
+        return self._fill
+
+    def iter_screenings(self) -> Iterator[Tuple]:
+        """Сеансы с продажами: (id, movie_id, time, hall_number, price, rows, cols, sold)"""
+        fill = self._fill_fractions()
+        for (screening_id, movie_id, screening_time, hall, price, _), fraction in zip(self._schedule(), fill):
+            rows, cols = hall_layout(hall)
+            yield screening_id, movie_id, screening_time, hall, price, rows, cols, round(fraction * rows * cols)
+
+    def iter_orders(self, screening: Tuple, rng: random.Random) -> Iterator[Tuple[int, int, int, float]]:
+        """Заказы сеанса: (номер покупателя, первое место, количество, за сколько секунд до сеанса)"""
+        sold = screening[-1]
+        seat = 1
+        rand = rng.random  # быстрее randint/randrange, генерация идет в горячем цикле
+        window = self.sales_window_days * 86400
+        while seat <= sold:
+            count = min(1 + int(rand() * self.max_group), sold - seat + 1)
+            # Чем ближе сеанс, тем больше покупок
+            lead = rand() ** 2 * window
+            yield int(rand() * self.customers), seat, count, lead
+            seat += count
+
+    @staticmethod
+    def sold_seat_map(rows: int, cols: int, sold: int) -> bytes:
+        """Карта мест, в которой заняты первые sold мест"""
+        full, rest = divmod(sold, 8)
+        bits = b'\xff' * full + (bytes([(1 << rest) - 1]) if rest else b'')
+        return bits.ljust((rows * cols + 7) // 8, b'\x00')
+
+def _customer(number: int) -> Tuple[str, str]:
+    return f"Customer{number}", f"customer{number}@example.com"
+
+def load_sqlite(db_name: str, generator: CinemaDataGenerator, chunk_size: int = 100_000) -> int:
+    """Загрузить данные генератора в пустую базу; возвращает число билетов.
+
+    Схема должна быть создана заранее (например, CinemaTicketSystemSQLite(db_name, sample_data=False)).
+    На время загрузки отключается синхронная запись на диск, а индексы таблиц сеансов
+    и билетов удаляются и строятся заново одним проходом после загрузки,
+    счетчики продаж пересчитываются в конце.
+    """
+    conn = sqlite3.connect(db_name)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    try:
+        if conn.execute('SELECT 1 FROM movies LIMIT 1').fetchone():
+            raise ValueError("Генератор загружает данные только в пустую базу")
+
+        indexes = conn.execute('''
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name IN ('screenings', 'tickets') AND sql IS NOT NULL
+        ''').fetchall()
+
+        conn.execute('BEGIN')
+        for name, _ in indexes:
+            conn.execute(f'DROP INDEX {name}')
+
+        conn.executemany('INSERT INTO movies (id, title, genre, duration, rating) VALUES (?, ?, ?, ?, ?)',
+                         generator.movie_rows())
+        conn.executemany('INSERT OR IGNORE INTO halls (number, rows, seats_per_row) VALUES (?, ?, ?)',
+                         [(hall, *hall_layout(hall)) for hall in range(1, generator.halls + 1)])
+
+        # Билеты разворачиваются из заказов на стороне SQLite: Python формирует
+        # одну строку на заказ, а не на место
+        conn.execute('CREATE TEMP TABLE generated_orders (screening_id, customer, first_seat, seat_count, purchase_time, price)')
+        conn.execute('CREATE TEMP TABLE seat_offsets (n INTEGER PRIMARY KEY)')
+        conn.executemany('INSERT INTO seat_offsets (n) VALUES (?)', [(n,) for n in range(generator.max_group)])
+
+        rng = random.Random(f"{generator.seed}:orders")
+        screening_rows = []
+        order_rows = []
+        for screening in generator.iter_screenings():
+            screening_id, movie_id, screening_time, hall, price, rows, cols, sold = screening
+            screening_rows.append((screening_id, movie_id, str(screening_time), hall, price, rows * cols - sold,
+                                   generator.sold_seat_map(rows, cols, sold), to_epoch(screening_time)))
+            screening_text = screening_rows[-1][2]
+            for customer, first_seat, count, lead in generator.iter_orders(screening, rng):
+                order_rows.append((screening_id, customer, first_seat, count, screening_text, int(lead), price))
+
+            if len(order_rows) >= chunk_size:
+                _flush(conn, screening_rows, order_rows)
+        _flush(conn, screening_rows, order_rows)
+
+        for _, sql in indexes:
+            conn.execute(sql)
+        rebuild_sales_counters(conn)
+        conn.commit()
+        # Статистика для планировщика по выборке, а не по всей таблице
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('ANALYZE')
+        return conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
+    finally:
+        conn.close()
+
+def _flush(conn: sqlite3.Connection, screening_rows: list, order_rows: list):
+    conn.executemany('''
+        INSERT INTO screenings (id, movie_id, screening_time, hall_number, price, available_seats, seat_map, starts_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', screening_rows)
+    # Время покупки: время сеанса минус lead секунд (вычисляется в SQLite)
+    conn.executemany(
+        "INSERT INTO generated_orders VALUES (?, ?, ?, ?, datetime(julianday(?) - ? / 86400.0), ?)",
+        order_rows
+    )
+    # Имена и email покупателей строятся так же, как в _customer; время покупки — местное, как и время сеанса
+    conn.execute('''
+        INSERT INTO tickets (screening_id, customer_name, customer_email, seat_number, purchase_time, total_price,
+                             purchased_at)
+        SELECT o.screening_id, 'Customer' || o.customer, 'customer' || o.customer || '@example.com',
+               o.first_seat + s.n, o.purchase_time, o.price, CAST(strftime('%s', o.purchase_time, 'utc') AS INTEGER)
+        FROM generated_orders o CROSS JOIN seat_offsets s
+        WHERE s.n < o.seat_count
+    ''')
+    conn.execute('DELETE FROM generated_orders')
+    screening_rows.clear()
+    order_rows.clear()
+
+def load_memory(system, generator: CinemaDataGenerator) -> int:
+    """Заполнить CinemaTicketSystemExperiment (созданную с sample_data=False); возвращает число билетов"""
+    for _, title, genre, duration, rating in generator.movie_rows():
+        system.add_movie(title, genre, duration, rating)
+    movie_offset = system.next_movie_id - 1 - generator.movies
+
+    rng = random.Random(f"{generator.seed}:orders")
+    customers = {}
+    tickets = 0
+    for screening in generator.iter_screenings():
+        _, movie_id, screening_time, hall, price, rows, cols, sold = screening
+        created = system.add_screening(movie_id + movie_offset, screening_time, hall, price, rows * cols - sold)
+        system.seat_maps[created.id] = SeatMap(rows, cols, generator.sold_seat_map(rows, cols, sold))
+        for customer, first_seat, count, lead in generator.iter_orders(screening, rng):
+            name, email = customers.get(customer) or customers.setdefault(customer, _customer(customer))
+            purchase_time = screening_time - datetime.timedelta(seconds=int(lead))
+            for seat in range(first_seat, first_seat + count):
+                system.add_ticket(created.id, name, email, seat, purchase_time, price)
+            tickets += count
+    return tickets
+
+def generator_experiment(tickets: int = 1_000_000, db_name: str = "cinema_generated.db"):
+    """Замер скорости генерации и загрузки данных в обе системы"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== ГЕНЕРАЦИЯ ДАННЫХ ===")
+    screenings = (tickets + 49) // 50 + 1
+    generator = CinemaDataGenerator(movies=200, halls=40, days=max(1, screenings // (40 * 12) + 1), slots_per_day=12,
+                                    tickets=tickets)
+
+    # Загрузчик принимает только пустую базу: файлы прошлого запуска удаляются
+    remove_database(db_name)
+    try:
+        CinemaTicketSystemSQLite(db_name, sample_data=False).close()
+        start_time = time.perf_counter()
+        loaded = load_sqlite(db_name, generator)
+        print(f"SQLite: {loaded} билетов, {generator.screening_count} сеансов "
+              f"за {time.perf_counter() - start_time:.1f} с")
+    finally:
+        remove_database(db_name)
+
+    system = CinemaTicketSystemExperiment(sample_data=False)
+    start_time = time.perf_counter()
+    loaded = load_memory(system, generator)
+    print(f"В памяти: {loaded} билетов за {time.perf_counter() - start_time:.1f} с")
+
+if __name__ == "__main__":
+    generator_experiment()
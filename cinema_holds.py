@@ -0,0 +1,213 @@
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional
+
+from cinema_analytics import compare_reports
+
+# Срок удержания мест по умолчанию, секунды
+DEFAULT_HOLD_TTL = 600.0
+
+# Удержания мест в SQLite: места уже заняты в карте сеанса и вычтены из available_seats
+HOLDS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        screening_id INTEGER NOT NULL,
+        seats TEXT NOT NULL,
+        seat_count INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        FOREIGN KEY (screening_id) REFERENCES screenings (id)
+    )
+'''
+
+def format_seats(seats: List[int]) -> str:
+    """Номера мест для колонки holds.seats"""
+    return ','.join(map(str, seats))
+
+def parse_seats(value: str) -> List[int]:
+    return [int(seat) for seat in value.split(',')]
+
+@dataclass
+class Hold:
+    id: int
+    screening_id: int
+    seats: List[int]
+    expires_at: float  # секунды эпохи
+
+class TimingWheel:
+    """Иерархическое колесо таймеров.
+
+    Уровень 0 — 2**bits ячеек по tick секунд, каждый следующий уровень в 2**bits раз
+    грубее. Добавление и отмена — O(1), продвижение на один тик — O(1) плюс число
+    сработавших таймеров; записи верхних уровней переносятся на нижние, когда до
+    их срока остается один оборот нижнего колеса. Время — clock() в секундах.
+    """
+
+    def __init__(self, tick: float = 0.1, bits: int = 6, levels: int = 4, clock=time.time):
+        self.tick = tick
+        self.bits = bits
+        self.levels = levels
+        self.clock = clock
+        self._mask = (1 << bits) - 1
+        self._span = 1 << (bits * levels)  # тиков в полном обороте верхнего уровня
+        # Ячейка: ключ -> тик срабатывания
+        self._wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        self._location: Dict[Hashable, dict] = {}
+        self._due: Dict[Hashable, int] = {}  # таймеры, срок которых наступил до добавления
+        self._current = self._tick_at(clock())
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._location)
+
+    def _tick_at(self, moment: float) -> int:
+        return int(moment / self.tick)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Запланировать срабатывание key в момент deadline (заменяет прежний срок)"""
+        with self._lock:
+            self._remove(key)
+            self._insert(key, math.ceil(deadline / self.tick))
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key: Hashable) -> bool:
+        slot = self._location.pop(key, None)
+        if slot is None:
+            return False
+        del slot[key]
+        return True
+
+    def _insert(self, key: Hashable, expires: int):
+        delta = expires - self._current
+        if delta <= 0:
+            slot = self._due
+        else:
+            level = 0
+            while level < self.levels - 1 and delta >= 1 << (self.bits * (level + 1)):
+                level += 1
+            # Дальше полного оборота: ждем в последней ячейке и переносимся заново
+            position = expires if delta < self._span else self._current + self._span - 1
+            slot = self._wheels[level][(position >> (self.bits * level)) & self._mask]
+        slot[key] = expires
+        self._location[key] = slot
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Продвинуть колесо до момента now; возвращает ключи сработавших таймеров"""
+        target = self._tick_at(self.clock() if now is None else now)
+        expired = []
+        with self._lock:
+            if not self._location:
+                self._current = max(self._current, target)
+                return expired
+            while self._current < target:
+                if not self._location:
+                    self._current = target
+                    break
+                self._current += 1
+                tick = self._current
+                # Переносы начинаются с верхнего уровня: его записи могут попасть в ячейки нижних
+                aligned = 0
+                while aligned < self.levels - 1 and not tick & ((1 << (self.bits * (aligned + 1))) - 1):
+                    aligned += 1
+                for level in range(aligned, 0, -1):
+                    slot = self._wheels[level][(tick >> (self.bits * level)) & self._mask]
+                    entries = list(slot.items())
+                    slot.clear()
+                    for key, expires in entries:
+                        self._insert(key, expires)
+                slot = self._wheels[0][tick & self._mask]
+                if slot:
+                    for key in slot:
+                        del self._location[key]
+                    expired.extend(slot)
+                    slot.clear()
+            if self._due:
+                for key in self._due:
+                    del self._location[key]
+                expired.extend(self._due)
+                self._due.clear()
+        return expired
+
+def _total_available(system) -> int:
+    return sum(screening['available_seats'] if isinstance(screening, dict) else screening.available_seats
+               for movie in system.get_available_movies()
+               for screening in system.get_screenings_by_movie(movie['id'] if isinstance(movie, dict) else movie.id))
+
+def _screening_ids(system) -> List[int]:
+    return [screening['id'] if isinstance(screening, dict) else screening.id
+            for movie in system.get_available_movies()
+            for screening in system.get_screenings_by_movie(movie['id'] if isinstance(movie, dict) else movie.id)]
+
+def _sold_seats(system) -> int:
+    return sum(stats['sold_seats'] for stats in system.get_sales_report('movie').values())
+
+def holds_experiment(holds: int = 1000, ttl: float = 2.0, wheel_timers: int = 100_000,
+                     db_name: str = "cinema_holds.db"):
+    """Удержания мест: скорость удержания и подтверждения, цена снятия истекших удержаний"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== УДЕРЖАНИЕ МЕСТ ===")
+    wheel = TimingWheel(tick=0.01)
+    now = time.time()
+    started = time.perf_counter()
+    for key in range(wheel_timers):
+        wheel.schedule(key, now + random.uniform(0, 60))
+    scheduled = time.perf_counter() - started
+    started = time.perf_counter()
+    fired = len(wheel.advance(now + 61))
+    advanced = time.perf_counter() - started
+    print(f"Колесо таймеров: {wheel_timers} сроков, добавление {scheduled / wheel_timers * 1e6:.2f} мкс, "
+          f"продвижение на 61 с {advanced * 1000:.1f} мс ({fired} сработало)")
+
+    remove_database(db_name)
+    systems = (('В памяти', CinemaTicketSystemExperiment()), ('SQLite', CinemaTicketSystemSQLite(db_name)))
+    try:
+        for name, system in systems:
+            screening_ids = _screening_ids(system)
+            rng = random.Random(42)
+            available = _total_available(system)
+            sold = _sold_seats(system)
+
+            started = time.perf_counter()
+            hold_ids = [system.hold_seats(rng.choice(screening_ids), rng.randint(1, 3), ttl=ttl) for _ in range(holds)]
+            hold_rate = holds / (time.perf_counter() - started)
+            deadline = time.time() + ttl
+            hold_ids = [hold_id for hold_id in hold_ids if hold_id is not None]
+            held = available - _total_available(system)
+
+            # Половина удержаний оплачивается, остальные истекают
+            paid = hold_ids[::2]
+            started = time.perf_counter()
+            confirmed = sum(system.confirm_hold(hold_id, f"Hold{hold_id}", f"hold{hold_id % 100}@test.com")
+                            for hold_id in paid)
+            confirm_rate = len(paid) / (time.perf_counter() - started)
+            # Ждем истечения последних удержаний (колесо срабатывает с точностью до тика)
+            time.sleep(max(0.0, deadline + system.hold_wheel.tick - time.time()))
+            started = time.perf_counter()
+            remaining = _total_available(system)
+            expiry = time.perf_counter() - started
+            released = remaining - (available - held)
+            # Места оплаченных удержаний остаются занятыми, остальные должны освободиться
+            expected = held - (_sold_seats(system) - sold)
+
+            print(f"\n{name}:")
+            print(f"  удержаний: {len(hold_ids)} ({hold_rate:.0f}/с), мест удержано: {held}")
+            print(f"  подтверждено: {confirmed} из {len(paid)} ({confirm_rate:.0f}/с)")
+            print(f"  после истечения срока освобождено мест: {released} (ожидалось {expected}), "
+                  f"первый просмотр афиши со снятием {expiry * 1000:.1f} мс")
+            reconfirmed = system.confirm_hold(hold_ids[1], 'X', 'x@test.com')
+            print(f"  повторное подтверждение истекшего удержания: {reconfirmed}")
+            same = compare_reports(system.get_sales_report('movie'), system.recompute_sales_report('movie'))
+            print(f"  счетчики продаж совпадают с пересчетом: {'да' if same else 'НЕТ'}")
+    finally:
+        systems[1][1].close()
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    holds_experiment()
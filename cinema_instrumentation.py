@@ -0,0 +1,309 @@
+import functools
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Методы систем, время которых измеряется
+INSTRUMENTED_METHODS = ('purchase_ticket', 'get_available_movies', 'get_screenings_by_movie', 'get_ticket_history')
+
+# Значащих бит в номере корзины: 2**(SUB_BITS - 1) корзин на каждую степень двойки (погрешность ~3%)
+SUB_BITS = 6
+# Границы корзин для экспорта в Prometheus: 2**k наносекунд, от ~1 мкс до ~8.6 с
+PROMETHEUS_BOUNDS = [2 ** k for k in range(10, 34)]
+
+# Планы запросов снимаются только для выборок и изменений данных
+_PLANNED_STATEMENT = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.IGNORECASE)
+
+def _bucket_index(value: int) -> int:
+    length = value.bit_length()
+    if length <= SUB_BITS:
+        return value
+    shift = length - SUB_BITS
+    half = 1 << (SUB_BITS - 1)
+    return (1 << SUB_BITS) + (shift - 1) * half + ((value >> shift) - half)
+
+def _bucket_bounds(index: int):
+    """Границы корзины [нижняя, верхняя) в наносекундах"""
+    if index < 1 << SUB_BITS:
+        return index, index + 1
+    half = 1 << (SUB_BITS - 1)
+    shift, offset = divmod(index - (1 << SUB_BITS), half)
+    shift += 1
+    return (half + offset) << shift, (half + offset + 1) << shift
+
+class LatencyHistogram:
+    """Гистограмма задержек в наносекундах с логарифмически-линейными корзинами (как в HDR Histogram)"""
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, value: int):
+        index = _bucket_index(value)
+        with self._lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, fraction: float) -> int:
+        """Верхняя граница корзины, в которую попадает доля fraction значений"""
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * fraction))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_bounds(index)[1] - 1, self.max)
+        return self.max
+
+    def cumulative(self, bounds: List[int]) -> List[int]:
+        """Число значений меньше каждой из границ bounds (границы — степени двойки)"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < len(self.counts) and _bucket_bounds(index)[1] <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def summary(self) -> Dict:
+        """Сводка в микросекундах"""
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0.0,
+            'min_us': (self.min or 0) / 1000,
+            'p50_us': self.percentile(0.50) / 1000,
+            'p90_us': self.percentile(0.90) / 1000,
+            'p99_us': self.percentile(0.99) / 1000,
+            'p999_us': self.percentile(0.999) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+def normalize_statement(sql: str) -> str:
+    """Текст запроса с одиночными пробелами (ключ статистики запросов)"""
+    return ' '.join(sql.split())
+
+class Instrumentation:
+    """Сбор задержек методов системы и SQL-запросов.
+
+    Подключается явно: attach(system) подменяет методы экземпляра обертками,
+    а пул соединений SQLite с instrumentation открывает соединения TracedConnection.
+    Без подключения системы работают без каких-либо дополнительных затрат.
+    """
+
+    def __init__(self, slow_query_ms: float = 10.0, slow_log_size: int = 100):
+        self.slow_query_ns = int(slow_query_ms * 1_000_000)
+        self.methods: Dict[str, LatencyHistogram] = {}
+        self.statements: Dict[str, LatencyHistogram] = {}
+        # Журнал медленных запросов и планы (снимаются один раз на каждый различный запрос,
+        # не только на медленный: регрессию плана частого быстрого запроса тоже видно)
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.plans: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, system, methods=INSTRUMENTED_METHODS):
+        """Измерять время методов methods экземпляра system"""
+        for name in methods:
+            method = getattr(system, name, None)
+            if method is not None:
+                setattr(system, name, self._timed(name, method))
+        return system
+
+    def _histogram(self, registry: Dict[str, LatencyHistogram], name: str) -> LatencyHistogram:
+        histogram = registry.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = registry.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def _timed(self, name: str, method):
+        histogram = self._histogram(self.methods, name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter_ns() - start)
+        return timed
+
+    def record_statement(self, conn: sqlite3.Connection, sql: str, parameters, elapsed: int):
+        """Учесть выполнение SQL-запроса; при первом выполнении снимается его план,
+        медленные выполнения попадают в журнал"""
+        statement = normalize_statement(sql)
+        self._histogram(self.statements, statement).record(elapsed)
+        if statement not in self.plans:
+            # Запрос занимается под блокировкой: EXPLAIN выполняет только первый поток
+            with self._lock:
+                first = statement not in self.plans
+                if first:
+                    self.plans[statement] = []
+            if first:
+                plan = self._explain(conn, sql, parameters)
+                with self._lock:
+                    self.plans[statement] = plan
+        if elapsed < self.slow_query_ns:
+            return
+        with self._lock:
+            self.slow_queries.append({
+                'statement': statement,
+                'duration_ms': elapsed / 1_000_000,
+                'time': time.time(),
+            })
+
+    def _explain(self, conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+        if not _PLANNED_STATEMENT.match(sql):
+            return []
+        try:
+            # Базовый метод, чтобы сам EXPLAIN не попадал в статистику
+            rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+            return [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            return [f"план недоступен: {e}"]
+
+    def to_dict(self) -> Dict:
+        return {
+            'methods': {name: histogram.summary() for name, histogram in sorted(self.methods.items())},
+            'statements': {sql: histogram.summary() for sql, histogram in sorted(self.statements.items())},
+            'slow_queries': [dict(entry, plan=self.plans.get(entry['statement'], [])) for entry in self.slow_queries],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Статистика в текстовом формате Prometheus"""
+        lines = [
+            '# HELP cinema_method_latency_seconds Время выполнения методов системы продажи билетов',
+            '# TYPE cinema_method_latency_seconds histogram',
+        ]
+        for name, histogram in sorted(self.methods.items()):
+            for bound, count in zip(PROMETHEUS_BOUNDS, histogram.cumulative(PROMETHEUS_BOUNDS)):
+                lines.append(f'cinema_method_latency_seconds_bucket{{method="{name}",le="{bound / 1e9:.9g}"}} {count}')
+            lines.append(f'cinema_method_latency_seconds_bucket{{method="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'cinema_method_latency_seconds_sum{{method="{name}"}} {histogram.total / 1e9:.9g}')
+            lines.append(f'cinema_method_latency_seconds_count{{method="{name}"}} {histogram.count}')
+
+        lines += [
+            '# HELP cinema_sql_latency_seconds Время выполнения SQL-запросов',
+            '# TYPE cinema_sql_latency_seconds summary',
+        ]
+        for sql, histogram in sorted(self.statements.items()):
+            label = sql.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile in (0.5, 0.9, 0.99):
+                lines.append(f'cinema_sql_latency_seconds{{statement="{label}",quantile="{quantile}"}} '
+                             f'{histogram.percentile(quantile) / 1e9:.9g}')
+            lines.append(f'cinema_sql_latency_seconds_sum{{statement="{label}"}} {histogram.total / 1e9:.9g}')
+            lines.append(f'cinema_sql_latency_seconds_count{{statement="{label}"}} {histogram.count}')
+        lines.append(f'cinema_slow_queries_logged {len(self.slow_queries)}')
+        return '\n'.join(lines) + '\n'
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, измеряющий время execute/executemany (до получения первой строки)"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter_ns()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            instrumentation = self.connection.instrumentation
+            if instrumentation is not None:
+                instrumentation.record_statement(self.connection, sql, parameters, time.perf_counter_ns() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Параметры нужны и для выполнения, и для плана первой строки
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter_ns()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            instrumentation = self.connection.instrumentation
+            if instrumentation is not None:
+                instrumentation.record_statement(self.connection, sql, seq_of_parameters[0] if seq_of_parameters else (),
+                                                 time.perf_counter_ns() - start)
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого выполняются через TracedCursor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instrumentation: Optional[Instrumentation] = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def instrumentation_experiment(operations: int = 2000, db_name: str = "cinema_instrumented.db"):
+    """Замер накладных расходов инструментирования и пример экспорта статистики"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    def workload(system, rng):
+        for i in range(operations):
+            op_type = rng.random()
+            if op_type < 0.4:
+                system.get_available_movies()
+            elif op_type < 0.6:
+                system.get_screenings_by_movie(rng.randint(1, 5))
+            elif op_type < 0.8:
+                system.purchase_ticket(rng.randint(1, 140), f"Customer{i}", f"customer{i % 100}@test.com", 1)
+            else:
+                system.get_ticket_history(f"customer{rng.randrange(100)}@test.com")
+
+    print("=== ИНСТРУМЕНТИРОВАНИЕ ===")
+    try:
+        instrumentation = None
+        for backend in ('memory', 'sqlite'):
+            for enabled in (False, True):
+                remove_database(db_name)
+                instrumentation = Instrumentation(slow_query_ms=0.5) if enabled else None
+                if backend == 'sqlite':
+                    system = CinemaTicketSystemSQLite(db_name, instrumentation=instrumentation)
+                else:
+                    system = CinemaTicketSystemExperiment(instrumentation=instrumentation)
+                start = time.perf_counter()
+                workload(system, random.Random(42))
+                elapsed = time.perf_counter() - start
+                if hasattr(system, 'close'):
+                    system.close()
+                print(f"{backend:>7}, инструментирование {'вкл ' if enabled else 'выкл'}: "
+                      f"{operations / elapsed:.0f} оп/с")
+
+        print("\nЗадержки методов (SQLite):")
+        for name, stats in instrumentation.to_dict()['methods'].items():
+            print(f"  {name:<24} n={stats['count']:<5} p50 {stats['p50_us']:.1f} мкс  p99 {stats['p99_us']:.1f} мкс")
+        print(f"Различных SQL-запросов: {len(instrumentation.statements)}, "
+              f"медленных выполнений в журнале: {len(instrumentation.slow_queries)}")
+        for statement, plan in list(instrumentation.plans.items())[:3]:
+            print(f"  {statement[:80]}")
+            for step in plan:
+                print(f"    {step}")
+    finally:
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    instrumentation_experiment()
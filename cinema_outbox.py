@@ -0,0 +1,205 @@
+import json
+import random
+import sqlite3
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+# Поток изменений (outbox) для внешних потребителей: отчетов, уведомлений.
+# Событие записывается в той же транзакции, что и само изменение, поэтому в потоке
+# нет ни потерянных, ни лишних событий, а порядок номеров seq совпадает с порядком фиксации.
+# Пока не зарегистрирован ни один потребитель, события не записываются: читать их некому,
+# а удаляются события только подтверждением.
+EVENT_PURCHASE = 'purchase'            # куплены места (в том числе по удержанию: есть hold_id)
+EVENT_HOLD = 'hold'                    # места удержаны на время оплаты
+EVENT_HOLD_RELEASED = 'hold_released'  # удержание снято покупателем
+EVENT_HOLD_EXPIRED = 'hold_expired'    # удержание истекло
+EVENTS = (EVENT_PURCHASE, EVENT_HOLD, EVENT_HOLD_RELEASED, EVENT_HOLD_EXPIRED)
+
+# AUTOINCREMENT: номера не используются повторно даже после удаления всех событий
+OUTBOX_TABLE = '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        screening_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+# Подтвержденная позиция каждого потребителя: события с seq <= position им обработаны
+OUTBOX_CONSUMERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS outbox_consumers (
+        name TEXT PRIMARY KEY,
+        position INTEGER NOT NULL
+    )
+'''
+
+INSERT_EVENT = '''
+    INSERT INTO outbox (event, screening_id, payload, created_at)
+    SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM outbox_consumers)
+'''
+
+_READ_EVENTS = '''
+    SELECT seq, event, screening_id, payload, created_at
+    FROM outbox
+    WHERE seq > ?
+    ORDER BY seq
+    LIMIT ?
+'''
+
+# Позиция потребителя только растет: повторное подтверждение старого пакета ее не откатывает
+_ACKNOWLEDGE = '''
+    INSERT INTO outbox_consumers (name, position) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET position = MAX(position, excluded.position)
+'''
+
+# Удаляются события, подтвержденные всеми зарегистрированными потребителями
+_TRUNCATE = 'DELETE FROM outbox WHERE seq <= (SELECT MIN(position) FROM outbox_consumers)'
+
+class ChangeEvent(namedtuple('ChangeEvent', 'seq event screening_id payload created_at')):
+    __slots__ = ()
+
+def event_row(event: str, screening_id: int, **payload) -> tuple:
+    """Параметры INSERT_EVENT; payload хранится компактным JSON"""
+    return event, screening_id, json.dumps(payload, ensure_ascii=False, separators=(',', ':')), time.time()
+
+def read_events(conn: sqlite3.Connection, after: int, limit: int) -> List[ChangeEvent]:
+    """До limit событий с номерами больше after (по первичному ключу, без сортировки)"""
+    return [ChangeEvent(seq, event, screening_id, json.loads(payload), created_at)
+            for seq, event, screening_id, payload, created_at in conn.execute(_READ_EVENTS, (after, limit))]
+
+def register_consumer(cursor: sqlite3.Cursor, consumer: str, from_latest: bool = False) -> int:
+    """Зарегистрировать потребителя (повторная регистрация ничего не меняет); возвращает его позицию.
+
+    Новый потребитель читает поток с первого хранимого события или, при from_latest, только новые события.
+    """
+    start = cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM outbox').fetchone()[0] if from_latest else 0
+    cursor.execute('INSERT OR IGNORE INTO outbox_consumers (name, position) VALUES (?, ?)', (consumer, start))
+    return consumer_position(cursor, consumer)
+
+def consumer_position(cursor: sqlite3.Cursor, consumer: str) -> Optional[int]:
+    """Подтвержденная позиция потребителя; None — потребитель не зарегистрирован"""
+    row = cursor.execute('SELECT position FROM outbox_consumers WHERE name = ?', (consumer,)).fetchone()
+    return row[0] if row else None
+
+def acknowledge(cursor: sqlite3.Cursor, consumer: str, position: int) -> int:
+    """Подтвердить обработку событий до position включительно и удалить события,
+    подтвержденные всеми потребителями; возвращает число удаленных событий"""
+    cursor.execute(_ACKNOWLEDGE, (consumer, position))
+    cursor.execute(_TRUNCATE)
+    return cursor.rowcount
+
+class Outbox:
+    """Поток изменений в памяти с тем же порядком номеров, чтением пакетами и подтверждениями.
+
+    Номера идут подряд, поэтому пакет после позиции находится по смещению без поиска.
+    """
+
+    def __init__(self):
+        self.events: List[ChangeEvent] = []
+        self.next_seq = 1
+        self.consumers: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def append(self, event: str, screening_id: int, **payload) -> Optional[int]:
+        """Записать событие; без зарегистрированных потребителей событие отбрасывается (возвращается None)"""
+        if not self.consumers:
+            return None
+        seq = self.next_seq
+        self.next_seq += 1
+        self.events.append(ChangeEvent(seq, event, screening_id, payload, time.time()))
+        return seq
+
+    def read(self, after: int = 0, limit: int = 1000) -> List[ChangeEvent]:
+        """До limit событий с номерами больше after"""
+        if not self.events:
+            return []
+        start = max(after + 1 - self.events[0].seq, 0)
+        return self.events[start:start + limit]
+
+    def register(self, consumer: str, from_latest: bool = False) -> int:
+        return self.consumers.setdefault(consumer, self.next_seq - 1 if from_latest else 0)
+
+    def position(self, consumer: str) -> Optional[int]:
+        return self.consumers.get(consumer)
+
+    def acknowledge(self, consumer: str, position: int) -> int:
+        """Подтвердить события до position включительно; возвращает число удаленных событий"""
+        self.consumers[consumer] = max(self.consumers.get(consumer, 0), position)
+        if not self.events:
+            return 0
+        truncated = max(min(min(self.consumers.values()) + 1 - self.events[0].seq, len(self.events)), 0)
+        del self.events[:truncated]
+        return truncated
+
+def outbox_experiment(purchases: int = 2000, batch_size: int = 500, db_name: str = "cinema_outbox.db"):
+    """Цена записи событий на пути покупки, чтение потока пакетами и удаление подтвержденных событий"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== ПОТОК ИЗМЕНЕНИЙ (OUTBOX) ===")
+    remove_database(db_name)
+    try:
+        rng = random.Random(42)
+        orders = [(rng.randint(1, 140), f"Customer{i}", f"customer{i % 100}@example.com", rng.randint(1, 2))
+                  for i in range(purchases)]
+
+        with CinemaTicketSystemSQLite(db_name) as system:
+            system.register_consumer('reports')
+            system.register_consumer('notifications')
+
+            started = time.perf_counter()
+            successful = sum(system.purchase_ticket(*order) for order in orders)
+            purchase_us = (time.perf_counter() - started) / purchases * 1e6
+            # Отдельно — только запись событий: внутри уже открытой транзакции покупки это один INSERT
+            # (фиксация и fsync общие с покупкой); пробные события откатываются
+            with system.writer.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                started = time.perf_counter()
+                for order in orders:
+                    conn.execute(INSERT_EVENT, event_row(EVENT_PURCHASE, order[0], customer_name=order[1],
+                                                         customer_email=order[2], seats=[1, 2], price=400.0))
+                event_us = (time.perf_counter() - started) / purchases * 1e6
+                conn.rollback()
+            print(f"Покупок: {purchases} (успешных {successful}), {purchase_us:.0f} мкс на покупку, "
+                  f"из них запись события ~{event_us:.1f} мкс ({event_us / purchase_us:.1%})")
+
+            # Потребитель отчетов читает поток пакетами с сохраненной позиции и подтверждает их
+            seats = 0
+            started = time.perf_counter()
+            position = system.consumer_position('reports')
+            while True:
+                batch = system.read_changes(position, batch_size)
+                if not batch:
+                    break
+                seats += sum(len(event.payload['seats']) for event in batch if event.event == EVENT_PURCHASE)
+                position = batch[-1].seq
+                system.ack_changes('reports', position)
+            elapsed = time.perf_counter() - started
+            with system.readers.connection() as conn:
+                tickets = conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
+                stored = conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+            print(f"Потребитель 'reports': {position} событий за {elapsed * 1e3:.1f} мс, мест в событиях: {seats}, "
+                  f"билетов в базе: {tickets} ({'совпадает' if seats == tickets else 'НЕ СОВПАДАЕТ'})")
+            print(f"Хранится событий, пока 'notifications' не подтвердил: {stored}")
+            truncated = system.ack_changes('notifications', position)
+            print(f"После подтверждения 'notifications' удалено: {truncated}")
+
+        # Система в памяти: события удержаний в том же потоке
+        memory = CinemaTicketSystemExperiment()
+        memory.register_consumer('notifications')
+        confirmed = memory.hold_seats(1, 2)
+        memory.confirm_hold(confirmed, "Иван", "ivan@example.com")
+        memory.release_hold(memory.hold_seats(2, 1))
+        memory.hold_seats(3, 1, ttl=0.0)
+        time.sleep(memory.hold_wheel.tick * 2)
+        memory.expire_holds()
+        print("События системы в памяти:", ', '.join(f"{event.seq}:{event.event}" for event in memory.read_changes()))
+    finally:
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    outbox_experiment()
@@ -0,0 +1,16 @@
+import base64
+import json
+from typing import Tuple
+
+def encode_cursor(purchase_time, ticket_id: int) -> str:
+    """Непрозрачный курсор страницы: позиция последнего выданного билета"""
+    payload = json.dumps([str(purchase_time), ticket_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Разобрать курсор в (время покупки в виде строки, id билета)"""
+    try:
+        purchase_time, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(purchase_time), int(ticket_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Некорректный курсор страницы") from e
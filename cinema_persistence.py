@@ -0,0 +1,470 @@
+import datetime
+import mmap
+import os
+import random
+import shutil
+import signal
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from cinema_seat_map import SeatMap
+from cinema_ticket_store import TicketStore, from_micros, to_micros
+
+# Журнал: заголовок (сигнатура, эпоха), затем записи: длина данных, CRC32 (типа и данных), тип, данные.
+# Эпоха журнала совпадает с эпохой снимка, к которому он дописывается.
+LOG_MAGIC = b'CTSL'
+LOG_HEADER = struct.Struct('<4sQ')
+RECORD_HEADER = struct.Struct('<IIB')
+
+# Типы записей
+MOVIE = ord('M')
+SCREENING = ord('S')
+TICKET = ord('T')
+PURCHASE = ord('P')
+
+_MOVIE = struct.Struct('<qqd')  # id, длительность, рейтинг (+ название, жанр)
+_SCREENING = struct.Struct('<qqqqdq')  # id, фильм, время, зал, цена, свободные места
+_TICKET = struct.Struct('<qqqd')  # сеанс, место, время покупки, цена (+ имя, email)
+_PURCHASE = struct.Struct('<qqI')  # сеанс, время покупки, число мест (+ имя, email, места)
+
+# Снимок: сигнатура, версия, порядок байтов, эпоха, следующие id фильма, сеанса и билета, число фильмов,
+# сеансов и карт мест; далее фильмы, сеансы, карты мест, счетчики продаж и хранилище билетов
+SNAPSHOT_MAGIC = b'CTSS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHcQQQQQQQ')
+_SEAT_MAP = struct.Struct('<qHH')  # сеанс, ряды, места в ряду (+ битовая маска)
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+def _unpack_str(buffer, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    return str(buffer[offset:offset + length], 'utf-8'), offset + length
+
+class PurchaseLog:
+    """Журнал изменений только на дозапись с контрольными суммами записей.
+
+    Каждая запись передается ОС одним вызовом write, поэтому аварийное завершение
+    процесса не теряет подтвержденных записей. fsync (защита от сбоя питания)
+    выполняется раз в fsync_batch записей и не позже fsync_interval секунд после
+    первой несброшенной записи (по таймеру, даже если новых записей нет):
+    fsync_batch=1 — после каждой записи, 0 — только при закрытии и сбросе журнала.
+    """
+
+    def __init__(self, path: str, fsync_batch: int = 1, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.epoch = None
+        self.records = 0  # записей с последнего сброса журнала
+        self._fd = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        # Таймер сброса и дозапись из потока покупок работают с журналом под одной блокировкой
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def open(self, epoch: int) -> Iterator[Tuple[int, memoryview]]:
+        """Выдать записи журнала эпохи epoch для воспроизведения и открыть его на дозапись.
+
+        Журнал открывается, когда записи выданы полностью. Журнал более старой эпохи
+        уже целиком вошел в снимок и начинается заново. Хвост после первой поврежденной
+        или недописанной записи отбрасывается.
+        """
+        valid_end = None
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if len(data) >= LOG_HEADER.size:
+                magic, log_epoch = LOG_HEADER.unpack_from(data)
+                if magic != LOG_MAGIC:
+                    raise ValueError(f"{self.path} не является журналом покупок")
+                if log_epoch > epoch:
+                    raise ValueError("Журнал новее снимка: снимок потерян или подменен")
+                if log_epoch == epoch:
+                    valid_end = LOG_HEADER.size
+                    for record_type, payload, end in _iter_records(data):
+                        yield record_type, payload
+                        valid_end = end
+                        self.records += 1
+
+        if valid_end is None:
+            self._create(epoch)
+        else:
+            self.epoch = epoch
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            os.ftruncate(self._fd, valid_end)
+
+    def _create(self, epoch: int):
+        # Новый журнал создается рядом и атомарно заменяет старый
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, epoch))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        _fsync_directory(self.path)
+        if self._fd is not None:
+            os.close(self._fd)
+        self.epoch = epoch
+        self.records = 0
+        self._pending = 0
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+
+    def append(self, record_type: int, payload: bytes):
+        header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload, record_type), record_type)
+        with self._lock:
+            os.write(self._fd, header + payload)
+            self.records += 1
+            self._pending += 1
+            if not self.fsync_batch:
+                return
+            if self._pending >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            elif self._timer is None:
+                # Без следующих записей несброшенные записи ждали бы закрытия журнала
+                self._timer = threading.Timer(self.fsync_interval, self._sync_due)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_due(self):
+        with self._lock:
+            self._timer = None
+            self._sync()
+
+    def sync(self):
+        """Сбросить журнал на диск"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._fd is not None and self._pending:
+            os.fsync(self._fd)
+            self._pending = 0
+            self._last_sync = time.monotonic()
+
+    def reset(self, epoch: int):
+        """Начать пустой журнал новой эпохи (после записи снимка)"""
+        with self._lock:
+            self._create(epoch)
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._fd is not None:
+                self._sync()
+                os.close(self._fd)
+                self._fd = None
+
+def _iter_records(data: bytes) -> Iterator[Tuple[int, memoryview, int]]:
+    view = memoryview(data)
+    offset = LOG_HEADER.size
+    while offset + RECORD_HEADER.size <= len(data):
+        length, checksum, record_type = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = view[start:start + length]
+        if len(payload) < length or zlib.crc32(payload, record_type) != checksum:
+            return
+        offset = start + length
+        yield record_type, payload, offset
+
+def _fsync_directory(path: str):
+    descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def write_snapshot(system, path: str, epoch: int):
+    """Записать полное состояние системы в снимок (атомарно, через временный файл)"""
+    # Удержания мест не сохраняются: в снимке удержанные места свободны
+    held = system.held_seats()
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, b'<' if sys.byteorder == 'little' else b'>', epoch,
+            system.next_movie_id, system.next_screening_id, system.next_ticket_id,
+            len(system.movies), len(system.screenings), len(system.seat_maps)
+        ))
+        for movie in system.movies:
+            f.write(_MOVIE.pack(movie.id, movie.duration, movie.rating) + _pack_str(movie.title) + _pack_str(movie.genre))
+        for screening in system.screenings:
+            f.write(_SCREENING.pack(screening.id, screening.movie_id, to_micros(screening.screening_time),
+                                    screening.hall_number, screening.price,
+                                    screening.available_seats + len(held.get(screening.id, ()))))
+        for screening_id, seat_map in system.seat_maps.items():
+            if screening_id in held:
+                seat_map = SeatMap(seat_map.rows, seat_map.cols, seat_map.to_bytes())
+                seat_map.release_seats(held[screening_id])
+            f.write(_SEAT_MAP.pack(screening_id, seat_map.rows, seat_map.cols) + seat_map.to_bytes())
+        system.sales.dump(f)
+        system.tickets.dump(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(path)
+
+def load_snapshot(system, path: str) -> int:
+    """Загрузить снимок в пустую систему через mmap; возвращает эпоху снимка"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = memoryview(mapped)
+        try:
+            return _read_snapshot(system, buffer)
+        finally:
+            buffer.release()
+
+def _read_snapshot(system, buffer: memoryview) -> int:
+    (magic, version, byteorder, epoch, next_movie_id, next_screening_id, next_ticket_id,
+     movie_count, screening_count, seat_map_count) = SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Неизвестный формат снимка")
+    if byteorder != (b'<' if sys.byteorder == 'little' else b'>'):
+        raise ValueError("Снимок записан на платформе с другим порядком байтов")
+    offset = SNAPSHOT_HEADER.size
+
+    for _ in range(movie_count):
+        movie_id, duration, rating = _MOVIE.unpack_from(buffer, offset)
+        title, offset = _unpack_str(buffer, offset + _MOVIE.size)
+        genre, offset = _unpack_str(buffer, offset)
+        system.next_movie_id = movie_id
+        system.add_movie(title, genre, duration, rating)
+    for _ in range(screening_count):
+        screening_id, movie_id, screening_time, hall_number, price, available_seats = \
+            _SCREENING.unpack_from(buffer, offset)
+        offset += _SCREENING.size
+        system.next_screening_id = screening_id
+        system.add_screening(movie_id, from_micros(screening_time), hall_number, price, available_seats)
+    for _ in range(seat_map_count):
+        screening_id, rows, cols = _SEAT_MAP.unpack_from(buffer, offset)
+        offset += _SEAT_MAP.size
+        size = (rows * cols + 7) // 8
+        system.seat_maps[screening_id] = SeatMap(rows, cols, bytes(buffer[offset:offset + size]))
+        offset += size
+    offset = system.sales.load(buffer, offset)
+    system.tickets, offset = TicketStore.load(buffer, offset)
+
+    system.next_movie_id = next_movie_id
+    system.next_screening_id = next_screening_id
+    system.next_ticket_id = next_ticket_id
+    return epoch
+
+class Persistence:
+    """Снимок и журнал изменений системы в памяти в каталоге directory.
+
+    Каждое изменение (фильм, сеанс, билет, покупка) записывается в журнал.
+    Раз в snapshot_every записей (0 — только по вызову checkpoint) состояние
+    сохраняется в снимок, а журнал начинается заново, поэтому время запуска
+    определяется размером снимка, а не всей историей продаж.
+    """
+
+    def __init__(self, directory: str, fsync_batch: int = 1, fsync_interval: float = 1.0,
+                 snapshot_every: int = 100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, 'snapshot.bin')
+        self.log = PurchaseLog(os.path.join(directory, 'purchases.log'), fsync_batch, fsync_interval)
+        self.snapshot_every = snapshot_every
+        self.system = None
+
+    def restore(self, system) -> bool:
+        """Восстановить состояние пустой системы; False — сохраненных данных нет"""
+        self.system = system
+        epoch = 0
+        restored = os.path.exists(self.snapshot_path)
+        if restored:
+            epoch = load_snapshot(system, self.snapshot_path)
+        for record_type, payload in self.log.open(epoch):
+            _apply(system, record_type, payload)
+            restored = True
+        return restored
+
+    def log_movie(self, movie):
+        self.log.append(MOVIE, _MOVIE.pack(movie.id, movie.duration, movie.rating)
+                        + _pack_str(movie.title) + _pack_str(movie.genre))
+
+    def log_screening(self, screening):
+        self.log.append(SCREENING, _SCREENING.pack(screening.id, screening.movie_id,
+                                                   to_micros(screening.screening_time), screening.hall_number,
+                                                   screening.price, screening.available_seats))
+
+    def log_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_number: int,
+                   purchase_time, total_price: float):
+        self.log.append(TICKET, _TICKET.pack(screening_id, seat_number, to_micros(purchase_time), total_price)
+                        + _pack_str(customer_name) + _pack_str(customer_email))
+
+    def log_purchase(self, screening_id: int, customer_name: str, customer_email: str, seats: List[int],
+                     purchase_time):
+        self.log.append(PURCHASE, _PURCHASE.pack(screening_id, to_micros(purchase_time), len(seats))
+                        + _pack_str(customer_name) + _pack_str(customer_email)
+                        + struct.pack(f'<{len(seats)}i', *seats))
+
+    def checkpoint_if_due(self):
+        """Сохранить снимок, если с прошлого накопилось snapshot_every записей"""
+        if self.snapshot_every and self.log.records >= self.snapshot_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Сохранить снимок и начать журнал заново (сжатие журнала)"""
+        epoch = self.log.epoch + 1
+        # Порядок важен: пока не заменен снимок, действует старый снимок со старым журналом;
+        # после замены журнал прежней эпохи считается устаревшим
+        write_snapshot(self.system, self.snapshot_path, epoch)
+        self.log.reset(epoch)
+
+    def close(self):
+        self.log.close()
+
+def _apply(system, record_type: int, payload: memoryview):
+    """Применить запись журнала к системе (при восстановлении, без повторной записи в журнал)"""
+    if record_type == MOVIE:
+        movie_id, duration, rating = _MOVIE.unpack_from(payload)
+        title, offset = _unpack_str(payload, _MOVIE.size)
+        genre, _ = _unpack_str(payload, offset)
+        system.next_movie_id = movie_id
+        system.add_movie(title, genre, duration, rating)
+    elif record_type == SCREENING:
+        screening_id, movie_id, screening_time, hall_number, price, available_seats = _SCREENING.unpack_from(payload)
+        system.next_screening_id = screening_id
+        system.add_screening(movie_id, from_micros(screening_time), hall_number, price, available_seats)
+    elif record_type == TICKET:
+        screening_id, seat_number, purchase_time, total_price = _TICKET.unpack_from(payload)
+        customer_name, offset = _unpack_str(payload, _TICKET.size)
+        customer_email, _ = _unpack_str(payload, offset)
+        system.add_ticket(screening_id, customer_name, customer_email, seat_number, from_micros(purchase_time),
+                          total_price)
+    elif record_type == PURCHASE:
+        screening_id, purchase_time, count = _PURCHASE.unpack_from(payload)
+        customer_name, offset = _unpack_str(payload, _PURCHASE.size)
+        customer_email, offset = _unpack_str(payload, offset)
+        seats = list(struct.unpack_from(f'<{count}i', payload, offset))
+        system.apply_purchase(screening_id, customer_name, customer_email, seats, from_micros(purchase_time))
+    else:
+        raise ValueError(f"Неизвестный тип записи журнала: {record_type}")
+
+def _restore(directory: str):
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    return CinemaTicketSystemExperiment(persistence=Persistence(directory, fsync_batch=0, snapshot_every=0))
+
+def persistence_experiment(tickets: int = 200_000, directory: str = "cinema_persistence_data"):
+    """Время восстановления из журнала и из снимка"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment, preload_ticket_history
+
+    print("=== СНИМОК И ЖУРНАЛ ===")
+    shutil.rmtree(directory, ignore_errors=True)
+    persistence = Persistence(directory, fsync_batch=1000, snapshot_every=0)
+    system = CinemaTicketSystemExperiment(persistence=persistence)
+    start = time.perf_counter()
+    preload_ticket_history(system, tickets)
+    print(f"Запись {tickets} билетов в журнал: {time.perf_counter() - start:.2f} с, "
+          f"журнал {os.path.getsize(persistence.log.path) / 2**20:.1f} МБ")
+    persistence.close()
+
+    start = time.perf_counter()
+    restored = _restore(directory)
+    print(f"Восстановление из журнала: {time.perf_counter() - start:.2f} с ({len(restored.tickets)} билетов)")
+    start = time.perf_counter()
+    restored.persistence.checkpoint()
+    print(f"Запись снимка: {time.perf_counter() - start:.2f} с, "
+          f"снимок {os.path.getsize(restored.persistence.snapshot_path) / 2**20:.1f} МБ")
+    restored.persistence.close()
+
+    start = time.perf_counter()
+    restored = _restore(directory)
+    print(f"Восстановление из снимка: {time.perf_counter() - start:.2f} с ({len(restored.tickets)} билетов)")
+    restored.persistence.close()
+    shutil.rmtree(directory)
+
+def _crash_worker(directory: str, acknowledged, snapshot_every: int):
+    """Покупать билеты, пока процесс не будет убит; acknowledged — число подтвержденных билетов"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+
+    system = CinemaTicketSystemExperiment(persistence=Persistence(directory, fsync_batch=0,
+                                                                  snapshot_every=snapshot_every))
+    rng = random.Random(os.getpid())
+    base_time = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    number = 0
+    while True:
+        # Новые сеансы добавляются по ходу, чтобы покупки (и записи в журнал) не прекращались
+        if number % 50 == 0:
+            system.add_screening(system.movies[number % len(system.movies)].id,
+                                 base_time + datetime.timedelta(hours=rng.randrange(1, 24 * 365)), 1, 500, 100)
+        seat_count = rng.randint(1, 3)
+        screening_id = rng.randint(max(1, len(system.screenings) - 50), len(system.screenings))
+        if system.purchase_ticket(screening_id, f"Crash{number}", f"crash{number % 100}@test.com", seat_count):
+            with acknowledged.get_lock():
+                acknowledged.value += seat_count
+        number += 1
+
+def check_consistency(system) -> List[str]:
+    """Проверить, что счетчики мест и карты мест сеансов согласованы с билетами"""
+    sold = {}
+    seats = {}
+    for screening_id, seat in zip(system.tickets.screening_ids, system.tickets.seat_numbers):
+        sold[screening_id] = sold.get(screening_id, 0) + 1
+        seats.setdefault(screening_id, set()).add(seat)
+    problems = []
+    held = system.held_seats()
+    for screening in system.screenings:
+        seat_map = system.get_seat_map(screening.id)
+        count = sold.get(screening.id, 0)
+        taken = seat_map.capacity - screening.available_seats - len(held.get(screening.id, ()))
+        if taken != count:
+            problems.append(f"сеанс {screening.id}: мест занято {taken}, билетов {count}")
+        if len(seats.get(screening.id, ())) != count:
+            problems.append(f"сеанс {screening.id}: одно место продано дважды")
+        if any(seat_map.is_free(seat) for seat in seats.get(screening.id, ())):
+            problems.append(f"сеанс {screening.id}: проданное место свободно на карте")
+    return problems
+
+def crash_recovery_experiment(rounds: int = 5, snapshot_every: int = 300, directory: str = "cinema_crash_data"):
+    """Убить процесс посреди записи (SIGKILL) и проверить восстановленное состояние"""
+    import multiprocessing
+
+    print("=== ВОССТАНОВЛЕНИЕ ПОСЛЕ АВАРИЙНОГО ЗАВЕРШЕНИЯ ===")
+    shutil.rmtree(directory, ignore_errors=True)
+    acknowledged = multiprocessing.Value('q', 0)
+    rng = random.Random(42)
+    failures = 0
+    for number in range(1, rounds + 1):
+        process = multiprocessing.Process(target=_crash_worker, args=(directory, acknowledged, snapshot_every))
+        process.start()
+        time.sleep(rng.uniform(0.3, 1.0))
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+        # Недописанная запись в конце журнала (как при обрыве посреди write)
+        with open(os.path.join(directory, 'purchases.log'), 'ab') as f:
+            f.write(RECORD_HEADER.pack(100, 0, PURCHASE) + b'\x00' * 10)
+
+        system = _restore(directory)
+        problems = check_consistency(system)
+        # Последняя покупка могла попасть в журнал, но не успеть получить подтверждение
+        lost = acknowledged.value - len(system.tickets)
+        status = "OK" if not problems and lost <= 0 else "ОШИБКА"
+        failures += status != "OK"
+        print(f"Раунд {number}: подтверждено билетов {acknowledged.value}, восстановлено {len(system.tickets)}, "
+              f"записей журнала после снимка {system.persistence.log.records}: {status}")
+        if lost > 0:
+            print(f"  Потеряно подтвержденных билетов: {lost}")
+        for problem in problems[:5]:
+            print(f"  {problem}")
+        system.persistence.close()
+        # Следующий раунд продолжает с восстановленного состояния
+        acknowledged.value = len(system.tickets)
+
+    shutil.rmtree(directory)
+    if failures:
+        # Потеря подтвержденной покупки или несогласованное состояние — провал проверки, а не только строка в выводе
+        raise RuntimeError(f"Раундов с ошибками: {failures}")
+    print("Все раунды пройдены успешно")
+
+if __name__ == "__main__":
+    persistence_experiment()
+    crash_recovery_experiment()
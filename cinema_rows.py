@@ -0,0 +1,80 @@
+import datetime
+import sqlite3
+from collections import namedtuple
+from typing import List
+
+# Форматы строк результатов SQLite-системы:
+#   'dict'  — словарь на строку (по умолчанию),
+#   'row'   — sqlite3.Row (доступ по индексу и по имени колонки),
+#   'tuple' — именованный кортеж без __dict__ (MovieRow, ScreeningRow, HistoryRow, SearchScreeningRow),
+#   'raw'   — кортеж sqlite3 как есть, порядок колонок — ROW_SCHEMAS.
+ROW_MODES = ('dict', 'row', 'tuple', 'raw')
+
+def parse_datetime(value) -> datetime.datetime:
+    """Значение колонки DATETIME ('YYYY-MM-DD HH:MM:SS[.ffffff]') в datetime"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+def to_epoch(value) -> int:
+    """Секунды эпохи для местного времени value; то же, что CAST(strftime('%s', value, 'utc') AS INTEGER) в SQLite"""
+    return int(parse_datetime(value).timestamp())
+
+class MovieRow(namedtuple('MovieRow', 'id title genre duration rating')):
+    __slots__ = ()
+
+class ScreeningRow(namedtuple('ScreeningRow', 'id screening_time hall_number price available_seats')):
+    __slots__ = ()
+
+    @property
+    def screening_datetime(self) -> datetime.datetime:
+        # Время хранится строкой и разбирается только при обращении
+        return parse_datetime(self.screening_time)
+
+class HistoryRow(namedtuple('HistoryRow', 'ticket_id movie_title screening_time hall_number seat_number '
+                                          'total_price purchase_time')):
+    __slots__ = ()
+
+    @property
+    def screening_datetime(self) -> datetime.datetime:
+        return parse_datetime(self.screening_time)
+
+    @property
+    def purchase_datetime(self) -> datetime.datetime:
+        return parse_datetime(self.purchase_time)
+
+class SearchScreeningRow(namedtuple('SearchScreeningRow', 'id movie_id movie_title screening_time hall_number '
+                                                          'price available_seats')):
+    __slots__ = ()
+
+    @property
+    def screening_datetime(self) -> datetime.datetime:
+        return parse_datetime(self.screening_time)
+
+# Колонки результатов в режиме 'raw'
+ROW_SCHEMAS = {
+    'movie': MovieRow._fields,
+    'screening': ScreeningRow._fields,
+    'history': HistoryRow._fields,
+    'search_screening': SearchScreeningRow._fields,
+}
+
+def check_row_mode(row_mode: str) -> str:
+    if row_mode not in ROW_MODES:
+        raise ValueError(f"Неизвестный формат строк: {row_mode}")
+    return row_mode
+
+def prepare_cursor(cursor: sqlite3.Cursor, row_mode: str) -> sqlite3.Cursor:
+    """Настроить курсор под формат строк (sqlite3.Row создается самим модулем sqlite3)"""
+    if row_mode == 'row':
+        cursor.row_factory = sqlite3.Row
+    return cursor
+
+def convert_rows(rows: list, row_type, row_mode: str) -> List:
+    """Строки курсора в выбранном формате; row_type задает имена колонок"""
+    if row_mode == 'dict':
+        fields = row_type._fields
+        return [dict(zip(fields, row)) for row in rows]
+    if row_mode == 'tuple':
+        return list(map(row_type._make, rows))
+    return rows
@@ -0,0 +1,167 @@
+import bisect
+import datetime
+import re
+import time
+from typing import Dict, List, Optional, Set
+
+from cinema_data_generator import CinemaDataGenerator, load_memory, load_sqlite
+
+# Слова — последовательности букв и цифр (как у токенизатора unicode61 в FTS5)
+_WORD = re.compile(r'[^\W_]+')
+
+# Полнотекстовый индекс названий и жанров фильмов (внешнее содержимое — таблица movies),
+# синхронизируется триггерами
+MOVIES_FTS_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+        title, genre, content='movies', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+    )
+'''
+
+MOVIES_FTS_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+        INSERT INTO movies_fts (rowid, title, genre) VALUES (new.id, new.title, new.genre);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, title, genre) VALUES ('delete', old.id, old.title, old.genre);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, genre ON movies BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, title, genre) VALUES ('delete', old.id, old.title, old.genre);
+        INSERT INTO movies_fts (rowid, title, genre) VALUES (new.id, new.title, new.genre);
+    END
+    ''',
+)
+
+# Заполнение индекса по уже имеющимся фильмам
+REBUILD_MOVIES_FTS = "INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')"
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста без учета регистра"""
+    return _WORD.findall(text.casefold())
+
+def fts_query(text: Optional[str]) -> Optional[str]:
+    """Запрос MATCH: каждое слово ищется как префикс, нужны все слова; None — слов нет"""
+    words = tokenize(text) if text else []
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+class MovieSearchIndex:
+    """Инвертированный индекс фильмов по словам названия и жанра и по жанру.
+
+    Слово запроса ищется как префикс: начало диапазона в отсортированном словаре
+    находится bisect, поэтому поиск не перебирает все фильмы.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._words: List[str] = []  # словарь по алфавиту
+        self.by_genre: Dict[str, Set[int]] = {}
+
+    def add(self, movie_id: int, title: str, genre: str):
+        for word in set(tokenize(title) + tokenize(genre)):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                bisect.insort(self._words, word)
+            postings.add(movie_id)
+        self.by_genre.setdefault(genre, set()).add(movie_id)
+
+    def _with_prefix(self, prefix: str) -> Set[int]:
+        found = set()
+        words = self._words
+        position = bisect.bisect_left(words, prefix)
+        while position < len(words) and words[position].startswith(prefix):
+            found |= self._postings[words[position]]
+            position += 1
+        return found
+
+    def search(self, text: Optional[str] = None, genre: Optional[str] = None) -> Optional[Set[int]]:
+        """id фильмов, подходящих под слова text и жанр genre; None — без ограничений"""
+        found = None if genre is None else self.by_genre.get(genre, set())
+        # Сначала длинные слова: у них меньше совпадений, пересечение быстрее пустеет
+        for word in sorted(set(tokenize(text or '')), key=len, reverse=True):
+            matches = self._with_prefix(word)
+            found = matches if found is None else found & matches
+            if not found:
+                return set()
+        return found
+
+def search_experiment(movies: int = 20_000, halls: int = 50, days: int = 7, tickets: int = 10_000,
+                      db_name: str = "cinema_search.db", repeats: int = 50):
+    """Поиск по индексам против фильтрации полного списка афиши на стороне клиента; сверка двух систем"""
+    from cinema_ticket_system_experiment import CinemaTicketSystemExperiment
+    from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+    print("=== ПОИСК ФИЛЬМОВ И СЕАНСОВ ===")
+    remove_database(db_name)
+    try:
+        # Первый сеанс — завтра, чтобы оба набора предстоящих сеансов совпадали
+        start = datetime.datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+        generator = CinemaDataGenerator(movies=movies, halls=halls, days=days, slots_per_day=8, start=start,
+                                        tickets=tickets)
+        CinemaTicketSystemSQLite(db_name, sample_data=False).close()
+        load_sqlite(db_name, generator)
+        memory = CinemaTicketSystemExperiment(sample_data=False)
+        load_memory(memory, generator)
+
+        window = dict(start=start + datetime.timedelta(days=2), end=start + datetime.timedelta(days=4))
+        cases = [
+            ('слово названия', 'search_movies', dict(query='шторм')),
+            ('префикс + жанр', 'search_movies', dict(query='сев', genre='Драма')),
+            ('сеансы: слово + окно дат', 'search_screenings', dict(query='код', **window)),
+            ('сеансы: зал + цена', 'search_screenings', dict(hall_number=7, max_price=400)),
+            ('сеансы: жанр + места', 'search_screenings', dict(genre='Ужасы', min_free_seats=50)),
+        ]
+
+        def client_side(system, name: str, filters: dict) -> list:
+            # Без индексов: полный список афиши, затем фильтры в коде клиента
+            words = tokenize(filters.get('query', ''))
+            found = []
+            for movie in system.get_available_movies():
+                movie_words = tokenize(f"{movie['title']} {movie['genre']}")
+                if (filters.get('genre') in (None, movie['genre'])
+                        and all(any(w.startswith(word) for w in movie_words) for word in words)):
+                    found.append(movie)
+            if name == 'search_movies':
+                return found
+            screenings = []
+            for movie in found:
+                for screening in system.get_screenings_by_movie(movie['id']):
+                    screening_time = datetime.datetime.fromisoformat(screening['screening_time'])
+                    if ((filters.get('hall_number') in (None, screening['hall_number']))
+                            and screening['price'] <= filters.get('max_price', float('inf'))
+                            and screening['available_seats'] >= filters.get('min_free_seats', 1)
+                            and filters.get('start', screening_time) <= screening_time
+                            and screening_time < filters.get('end', datetime.datetime.max)):
+                        screenings.append(screening)
+            return screenings
+
+        def measure(operation) -> float:
+            operation()
+            started = time.perf_counter()
+            for _ in range(repeats):
+                operation()
+            return (time.perf_counter() - started) / repeats * 1e3
+
+        with CinemaTicketSystemSQLite(db_name, sample_data=False) as system:
+            print(f"Фильмов: {movies}, сеансов: {generator.screening_count}")
+            print(f"{'запрос':<26} {'найдено':>8} {'SQLite':>10} {'память':>10} {'клиент':>10}  совпадает")
+            for label, name, filters in cases:
+                sqlite_result = getattr(system, name)(**filters)
+                memory_result = getattr(memory, name)(**filters)
+                same = [row['id'] for row in sqlite_result] == [item.id for item in memory_result]
+                sqlite_ms = measure(lambda: getattr(system, name)(**filters))
+                memory_ms = measure(lambda: getattr(memory, name)(**filters))
+                client_ms = measure(lambda: client_side(system, name, filters))
+                print(f"{label:<26} {len(sqlite_result):>8} {sqlite_ms:>8.2f}мс {memory_ms:>8.2f}мс "
+                      f"{client_ms:>8.2f}мс  {'да' if same else 'НЕТ'}")
+    finally:
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    search_experiment()
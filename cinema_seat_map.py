@@ -0,0 +1,128 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Схема залов: номер зала -> (количество рядов, мест в ряду)
+HALLS: Dict[int, Tuple[int, int]] = {
+    1: (10, 10),
+    2: (10, 10),
+    3: (10, 10),
+}
+DEFAULT_HALL = (10, 10)
+
+def hall_layout(hall_number: int) -> Tuple[int, int]:
+    """Получить размеры зала (ряды, места в ряду)"""
+    return HALLS.get(hall_number, DEFAULT_HALL)
+
+class SeatMap:
+    """Карта мест сеанса: один бит на место, 1 — место занято.
+
+    Места нумеруются с 1 построчно: место = ряд * мест_в_ряду + номер_в_ряду + 1.
+    """
+    __slots__ = ('rows', 'cols', 'bits', 'free_count')
+
+    def __init__(self, rows: int, cols: int, bits: Optional[bytes] = None):
+        self.rows = rows
+        self.cols = cols
+        size = (rows * cols + 7) // 8
+        self.bits = bytearray(bits) if bits else bytearray(size)
+        if len(self.bits) != size:
+            raise ValueError("Размер карты мест не совпадает с размерами зала")
+        self.free_count = rows * cols - sum(bin(byte).count('1') for byte in self.bits)
+
+    @classmethod
+    def for_hall(cls, hall_number: int) -> 'SeatMap':
+        rows, cols = hall_layout(hall_number)
+        return cls(rows, cols)
+
+    @property
+    def capacity(self) -> int:
+        return self.rows * self.cols
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+    def is_free(self, seat: int) -> bool:
+        index = seat - 1
+        return not self.bits[index >> 3] & (1 << (index & 7))
+
+    def claim(self, seat: int) -> bool:
+        """Занять место; False, если оно уже занято или не существует"""
+        if not 1 <= seat <= self.capacity or not self.is_free(seat):
+            return False
+        index = seat - 1
+        self.bits[index >> 3] |= 1 << (index & 7)
+        self.free_count -= 1
+        return True
+
+    def release(self, seat: int) -> bool:
+        """Освободить место; False, если оно не было занято"""
+        if not 1 <= seat <= self.capacity or self.is_free(seat):
+            return False
+        index = seat - 1
+        self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self.free_count += 1
+        return True
+
+    def claim_seats(self, seats: Iterable[int]) -> bool:
+        """Занять все указанные места или ни одного"""
+        seats = list(seats)
+        if len(set(seats)) != len(seats):
+            return False
+        if not all(1 <= seat <= self.capacity and self.is_free(seat) for seat in seats):
+            return False
+        for seat in seats:
+            self.claim(seat)
+        return True
+
+    def release_seats(self, seats: Iterable[int]):
+        for seat in seats:
+            self.release(seat)
+
+    def find_adjacent(self, count: int) -> Optional[List[int]]:
+        """Найти count свободных мест подряд в одном ряду"""
+        if count < 1 or count > self.cols or count > self.free_count:
+            return None
+
+        occupied = int.from_bytes(self.bits, 'little')
+        row_mask = (1 << self.cols) - 1
+        for row in range(self.rows):
+            free = ~(occupied >> (row * self.cols)) & row_mask
+            # Бит i в runs установлен, если свободны места i .. i + count - 1 этого ряда
+            runs = free
+            for shift in range(1, count):
+                runs &= free >> shift
+            if runs:
+                first = (runs & -runs).bit_length() - 1
+                start = row * self.cols + first + 1
+                return list(range(start, start + count))
+        return None
+
+    def find_free(self, count: int) -> Optional[List[int]]:
+        """Найти count любых свободных мест"""
+        if count > self.free_count:
+            return None
+        seats = []
+        for byte_index, byte in enumerate(self.bits):
+            if byte == 0xFF:
+                continue
+            for bit in range(8):
+                seat = byte_index * 8 + bit + 1
+                if seat <= self.capacity and not byte & (1 << bit):
+                    seats.append(seat)
+                    if len(seats) == count:
+                        return seats
+        return None
+
+    def allocate(self, count: int, seats: Optional[List[int]] = None) -> Optional[List[int]]:
+        """Занять выбранные места либо подобрать count мест (по возможности рядом)"""
+        if seats is not None:
+            return list(seats) if seats and self.claim_seats(seats) else None
+
+        seats = self.find_adjacent(count) or self.find_free(count)
+        if not seats:
+            return None
+        self.claim_seats(seats)
+        return seats
+
+    def row_and_column(self, seat: int) -> Tuple[int, int]:
+        """Ряд и место в ряду (с 1) для сквозного номера места"""
+        return (seat - 1) // self.cols + 1, (seat - 1) % self.cols + 1
@@ -0,0 +1,271 @@
+import datetime
+import heapq
+import multiprocessing
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from cinema_ticket_system_experiment import CinemaTicketSystemExperiment, Movie, Screening
+
+PARTITIONS = ('screening', 'hall')
+
+def _global_ticket_id(local_id: int, shard: int, shards: int) -> int:
+    # Номера билетов шардов чередуются и не пересекаются; порядок внутри шарда сохраняется
+    return (local_id - 1) * shards + shard + 1
+
+def _shard_worker(conn, shard: int, shards: int):
+    """Процесс шарда: своя система в памяти, команды (метод, аргументы) приходят по каналу"""
+    system = CinemaTicketSystemExperiment(sample_data=False)
+
+    def add_screening(screening_id, movie_id, screening_time, hall_number, price, available_seats):
+        # id сеансов выдает маршрутизатор
+        system.next_screening_id = screening_id
+        return system.add_screening(movie_id, screening_time, hall_number, price, available_seats)
+
+    def available_movie_ids():
+        return [movie.id for movie in system.get_available_movies()]
+
+    def get_ticket_history(customer_email):
+        history = system.get_ticket_history(customer_email)
+        for entry in history:
+            entry['ticket_id'] = _global_ticket_id(entry['ticket_id'], shard, shards)
+        return history
+
+    handlers = {
+        'add_movie': system.add_movie,
+        'add_screening': add_screening,
+        'available_movie_ids': available_movie_ids,
+        'get_screenings_by_movie': system.get_screenings_by_movie,
+        'purchase_ticket': system.purchase_ticket,
+        'purchase_tickets_bulk': system.purchase_tickets_bulk,
+        'get_ticket_history': get_ticket_history,
+        'ticket_count': lambda: len(system.tickets),
+    }
+    while True:
+        command = conn.recv()
+        if command is None:
+            conn.close()
+            return
+        method, args = command
+        try:
+            conn.send((True, handlers[method](*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+class ShardedCinemaTicketSystem:
+    """Система продажи билетов, разделенная между процессами-шардами.
+
+    Сеансы распределяются по шардам по id сеанса (partition='screening') или по залу
+    (partition='hall'); покупки на разные сеансы выполняются в разных процессах
+    без общей блокировки интерпретатора. Фильмы есть в каждом шарде. Объект-маршрутизатор
+    отправляет покупку в шард сеанса, а поиск фильмов, сеансов и истории покупок
+    рассылает всем шардам и объединяет результаты.
+    """
+
+    def __init__(self, shards: Optional[int] = None, partition: str = 'screening', sample_data: bool = True):
+        if partition not in PARTITIONS:
+            raise ValueError(f"Неизвестный способ разделения: {partition}")
+        self.shards = shards or os.cpu_count() or 1
+        self.partition = partition
+        self.movies: List[Movie] = []
+        self.movies_by_id: Dict[int, Movie] = {}
+        self.next_movie_id = 1
+        self.next_screening_id = 1
+        self.shard_of_screening: Dict[int, int] = {}
+
+        self._connections = []
+        self._processes = []
+        # Канал шарда используется одним запросом за раз
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        for shard in range(self.shards):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_shard_worker, args=(child, shard, self.shards),
+                                              name=f"cinema-shard-{shard}", daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+        if sample_data:
+            self.init_sample_data()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Остановить процессы шардов"""
+        for conn, lock in zip(self._connections, self._locks):
+            with lock:
+                conn.send(None)
+                conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+
+    def _receive(self, conn):
+        ok, result = conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def _call(self, shard: int, method: str, *args):
+        with self._locks[shard]:
+            self._connections[shard].send((method, args))
+            return self._receive(self._connections[shard])
+
+    def _fan_out(self, calls: Dict[int, tuple]) -> Dict[int, object]:
+        """Выполнить calls {шард: (метод, аргументы)} параллельно во всех шардах"""
+        shards = sorted(calls)
+        # Блокировки берутся в порядке номеров шардов, чтобы параллельные рассылки не ждали друг друга по кругу
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            for shard in shards:
+                self._connections[shard].send(calls[shard])
+            # Ответы читаются из всех шардов, даже после ошибки: непрочитанный ответ достался бы следующему вызову
+            replies = {shard: self._connections[shard].recv() for shard in shards}
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+        for ok, result in replies.values():
+            if not ok:
+                raise result
+        return {shard: result for shard, (ok, result) in replies.items()}
+
+    def _broadcast(self, method: str, *args) -> List:
+        results = self._fan_out({shard: (method, args) for shard in range(self.shards)})
+        return [results[shard] for shard in range(self.shards)]
+
+    def _shard_for(self, screening_id: int, hall_number: int) -> int:
+        key = screening_id if self.partition == 'screening' else hall_number
+        return hash(key) % self.shards
+
+    def init_sample_data(self):
+        """Инициализация тестовых данных (те же, что у CinemaTicketSystemExperiment)"""
+        movies_data = [
+            ('Аватар: Путь воды', 'Фантастика', 192, 8.1),
+            ('Оппенгеймер', 'Драма', 180, 8.8),
+            ('Барби', 'Комедия', 114, 7.5),
+            ('Джон Уик 4', 'Боевик', 169, 8.2),
+            ('Человек-паук: Паутина вселенных', 'Мультфильм', 140, 9.0)
+        ]
+        for title, genre, duration, rating in movies_data:
+            self.add_movie(title, genre, duration, rating)
+
+        base_time = datetime.datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        for movie in self.movies:
+            for day in range(7):
+                for time_slot in range(4):
+                    screening_time = base_time + datetime.timedelta(days=day, hours=time_slot*3)
+                    self.add_screening(movie.id, screening_time, (movie.id % 3) + 1, 350 + (movie.id * 50), 100)
+
+    def add_movie(self, title: str, genre: str, duration: int, rating: float) -> Movie:
+        """Добавить фильм (во все шарды)"""
+        movie = Movie(self.next_movie_id, title, genre, duration, rating)
+        self.next_movie_id += 1
+        self._broadcast('add_movie', title, genre, duration, rating)
+        self.movies.append(movie)
+        self.movies_by_id[movie.id] = movie
+        return movie
+
+    def add_screening(self, movie_id: int, screening_time: datetime.datetime, hall_number: int,
+                      price: float, available_seats: int) -> Screening:
+        """Добавить сеанс в шард, которому он принадлежит"""
+        screening_id = self.next_screening_id
+        self.next_screening_id += 1
+        shard = self._shard_for(screening_id, hall_number)
+        self.shard_of_screening[screening_id] = shard
+        return self._call(shard, 'add_screening', screening_id, movie_id, screening_time, hall_number, price,
+                          available_seats)
+
+    def get_available_movies(self) -> List[Movie]:
+        """Получить список доступных фильмов"""
+        available = set()
+        for movie_ids in self._broadcast('available_movie_ids'):
+            available.update(movie_ids)
+        return [movie for movie in self.movies if movie.id in available]
+
+    def get_screenings_by_movie(self, movie_id: int) -> List[Screening]:
+        """Получить сеансы для конкретного фильма"""
+        # Каждый шард возвращает сеансы по возрастанию времени
+        return list(heapq.merge(*self._broadcast('get_screenings_by_movie', movie_id),
+                                key=lambda screening: screening.screening_time))
+
+    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+                        seat_numbers: Optional[List[int]] = None) -> bool:
+        """Покупка билетов в шарде сеанса"""
+        shard = self.shard_of_screening.get(screening_id)
+        if shard is None:
+            return False
+        return self._call(shard, 'purchase_ticket', screening_id, customer_name, customer_email, seat_count,
+                          seat_numbers)
+
+    def purchase_tickets_bulk(self, orders: List[tuple]) -> List[bool]:
+        """Пакетная покупка: заказы делятся по шардам и выполняются параллельно.
+
+        Заказ — кортеж (screening_id, customer_name, customer_email, seat_count[, seat_numbers]).
+        Возвращает результат для каждого заказа в исходном порядке.
+        """
+        results = [False] * len(orders)
+        positions: Dict[int, List[int]] = {}
+        batches: Dict[int, List[tuple]] = {}
+        for position, order in enumerate(orders):
+            shard = self.shard_of_screening.get(order[0])
+            if shard is not None:
+                positions.setdefault(shard, []).append(position)
+                batches.setdefault(shard, []).append(order)
+
+        shard_results = self._fan_out({shard: ('purchase_tickets_bulk', (batch,)) for shard, batch in batches.items()})
+        for shard, shard_positions in positions.items():
+            for position, result in zip(shard_positions, shard_results[shard]):
+                results[position] = result
+        return results
+
+    def get_ticket_history(self, customer_email: str) -> List[Dict]:
+        """Получить историю покупок (из всех шардов, по времени покупки)"""
+        return list(heapq.merge(*self._broadcast('get_ticket_history', customer_email),
+                                key=lambda entry: (entry['purchase_time'], entry['ticket_id'])))
+
+    def ticket_count(self) -> int:
+        return sum(self._broadcast('ticket_count'))
+
+def _add_benchmark_screenings(system, screenings: int) -> List[int]:
+    base_time = datetime.datetime.now().replace(minute=0, second=0, microsecond=0) + datetime.timedelta(days=30)
+    screening_ids = []
+    for number in range(screenings):
+        movie = system.movies[number % len(system.movies)]
+        screening = system.add_screening(movie.id, base_time + datetime.timedelta(hours=number), number % 3 + 1,
+                                         500, 100)
+        screening_ids.append(screening.id)
+    return screening_ids
+
+def sharding_benchmark(shard_counts=(1, 2, 4), orders: int = 40000, batch_size: int = 1000, screenings: int = 1000):
+    """Пропускная способность покупок в зависимости от числа шардов"""
+    print("=== МАСШТАБИРОВАНИЕ ПО ШАРДАМ ===")
+    print(f"Процессоров: {os.cpu_count()}, заказов: {orders}, размер пакета: {batch_size}")
+
+    def run(system) -> float:
+        screening_ids = _add_benchmark_screenings(system, screenings)
+        rng = random.Random(42)
+        plan = [(rng.choice(screening_ids), f"Shard{i}", f"shard{i % 1000}@test.com", 1) for i in range(orders)]
+        start = time.perf_counter()
+        successful = 0
+        for offset in range(0, orders, batch_size):
+            successful += sum(system.purchase_tickets_bulk(plan[offset:offset + batch_size]))
+        elapsed = time.perf_counter() - start
+        return successful / elapsed
+
+    baseline = run(CinemaTicketSystemExperiment())
+    print(f"Один процесс без шардов: {baseline:.0f} покупок/с")
+    for shards in shard_counts:
+        with ShardedCinemaTicketSystem(shards) as system:
+            rate = run(system)
+        print(f"Шардов: {shards}: {rate:.0f} покупок/с ({rate / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    sharding_benchmark()
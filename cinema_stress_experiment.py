@@ -0,0 +1,95 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from cinema_seat_map import SeatMap
+from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite
+
+# Сеансы, за которые конкурируют покупатели: мест меньше, чем попыток покупки
+CONTESTED_SCREENINGS = 10
+
+def _buy(system: CinemaTicketSystemSQLite, worker: int, attempts: int) -> int:
+    rng = random.Random(worker)
+    purchased = 0
+    for i in range(attempts):
+        screening_id = rng.randint(1, CONTESTED_SCREENINGS)
+        if system.purchase_ticket(screening_id, f"Worker{worker}", f"worker{worker}@test.com", rng.randint(1, 3)):
+            purchased += 1
+    return purchased
+
+def _process_worker(db_name: str, worker: int, attempts: int) -> int:
+    with CinemaTicketSystemSQLite(db_name, pool_size=1) as system:
+        return _buy(system, worker, attempts)
+
+def check_oversells(db_name: str) -> Dict[str, int]:
+    """Проверить целостность продаж: количество нарушений по видам"""
+    conn = sqlite3.connect(db_name)
+    try:
+        problems = {'oversold_screenings': 0, 'counter_mismatches': 0, 'duplicate_seats': 0, 'seat_map_mismatches': 0}
+        screenings = conn.execute('''
+            SELECT s.id, s.available_seats, s.seat_map, h.rows, h.seats_per_row, COUNT(t.id)
+            FROM screenings s
+            JOIN halls h ON h.number = s.hall_number
+            LEFT JOIN tickets t ON t.screening_id = s.id
+            GROUP BY s.id
+        ''').fetchall()
+        for screening_id, available_seats, bits, rows, cols, sold in screenings:
+            if available_seats < 0 or sold > rows * cols:
+                problems['oversold_screenings'] += 1
+            if available_seats + sold != rows * cols:
+                problems['counter_mismatches'] += 1
+            if bits is not None and SeatMap(rows, cols, bits).free_count != available_seats:
+                problems['seat_map_mismatches'] += 1
+
+        problems['duplicate_seats'] = conn.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT screening_id, seat_number FROM tickets
+                GROUP BY screening_id, seat_number HAVING COUNT(*) > 1
+            )
+        ''').fetchone()[0]
+        return problems
+    finally:
+        conn.close()
+
+def stress_experiment(worker_counts: List[int] = (1, 2, 4, 8), attempts_per_worker: int = 300, use_processes: bool = False):
+    """Нагрузочная проверка конкурентных покупок: отсутствие перепродаж и покупки в секунду"""
+    mode = "процессы" if use_processes else "потоки"
+    print(f"=== КОНКУРЕНТНЫЕ ПОКУПКИ ({mode}) ===")
+
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            db_name = os.path.join(directory, "stress.db")
+            CinemaTicketSystemSQLite(db_name).close()
+
+            start_time = time.perf_counter()
+            if use_processes:
+                with ProcessPoolExecutor(workers) as executor:
+                    futures = [executor.submit(_process_worker, db_name, worker, attempts_per_worker) for worker in range(workers)]
+                    purchased = sum(future.result() for future in futures)
+            else:
+                results = [0] * workers
+                with CinemaTicketSystemSQLite(db_name, pool_size=workers) as system:
+                    def run(worker):
+                        results[worker] = _buy(system, worker, attempts_per_worker)
+                    threads = [threading.Thread(target=run, args=(worker,)) for worker in range(workers)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                purchased = sum(results)
+            elapsed = time.perf_counter() - start_time
+
+            problems = check_oversells(db_name)
+            status = "OK" if not any(problems.values()) else f"НАРУШЕНИЯ: {problems}"
+            print(f"Исполнителей: {workers}, успешных покупок: {purchased}/{workers * attempts_per_worker}, "
+                  f"{purchased / elapsed:.0f} покупок/с, {workers * attempts_per_worker / elapsed:.0f} попыток/с, "
+                  f"целостность: {status}")
+
+if __name__ == "__main__":
+    stress_experiment()
+    stress_experiment(use_processes=True)
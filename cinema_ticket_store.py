@@ -0,0 +1,199 @@
+import bisect
+import datetime
+import struct
+from array import array
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+# Время хранится целым числом микросекунд от 1970-01-01 в том же (локальном) времени,
+# что и наивные datetime системы: преобразование точное и не зависит от часового пояса
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+def to_micros(value: datetime.datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+def from_micros(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+class TicketView:
+    """Легковесное представление строки хранилища с полями билета"""
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: 'TicketStore', row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def id(self) -> int:
+        return self._store.ids[self._row]
+
+    @property
+    def screening_id(self) -> int:
+        return self._store.screening_ids[self._row]
+
+    @property
+    def customer_name(self) -> str:
+        return self._store.strings[self._store.name_codes[self._row]]
+
+    @property
+    def customer_email(self) -> str:
+        return self._store.strings[self._store.email_codes[self._row]]
+
+    @property
+    def seat_number(self) -> int:
+        return self._store.seat_numbers[self._row]
+
+    @property
+    def purchase_time(self) -> datetime.datetime:
+        return from_micros(self._store.purchase_times[self._row])
+
+    @property
+    def total_price(self) -> float:
+        return self._store.total_prices[self._row]
+
+    def __eq__(self, other):
+        return isinstance(other, TicketView) and self._store is other._store and self._row == other._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    def __repr__(self):
+        return (f"TicketView(id={self.id}, screening_id={self.screening_id}, customer_name={self.customer_name!r}, "
+                f"customer_email={self.customer_email!r}, seat_number={self.seat_number}, "
+                f"purchase_time={self.purchase_time!r}, total_price={self.total_price})")
+
+class TicketStore:
+    """Колоночное хранилище билетов.
+
+    Числовые поля лежат в массивах array, имена и email закодированы номерами в общем
+    словаре строк. Для каждого покупателя хранится список номеров строк, упорядоченный
+    по (время покупки, id). Доступ к строкам — через TicketView.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.screening_ids = array('q')
+        self.seat_numbers = array('l')
+        self.purchase_times = array('q')
+        self.total_prices = array('d')
+        self.name_codes = array('l')
+        self.email_codes = array('l')
+        # Словарь строк: код -> строка и обратно
+        self.strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+        # Код email -> номера строк, упорядоченные по (время покупки, id)
+        self._rows_by_email: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row: int) -> TicketView:
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError("Нет билета с таким номером строки")
+        return TicketView(self, row)
+
+    def __iter__(self) -> Iterator[TicketView]:
+        for row in range(len(self.ids)):
+            yield TicketView(self, row)
+
+    def _encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self._codes[value] = code
+            self.strings.append(value)
+        return code
+
+    def _history_key(self, row: int):
+        return self.purchase_times[row], self.ids[row]
+
+    def append(self, ticket_id: int, screening_id: int, customer_name: str, customer_email: str, seat_number: int,
+               purchase_time: datetime.datetime, total_price: float) -> TicketView:
+        """Добавить билет; возвращает представление новой строки"""
+        row = len(self.ids)
+        email_code = self._encode(customer_email)
+        self.ids.append(ticket_id)
+        self.screening_ids.append(screening_id)
+        self.seat_numbers.append(seat_number)
+        self.purchase_times.append(to_micros(purchase_time))
+        self.total_prices.append(total_price)
+        self.name_codes.append(self._encode(customer_name))
+        self.email_codes.append(email_code)
+
+        rows = self._rows_by_email.get(email_code)
+        if rows is None:
+            self._rows_by_email[email_code] = array('l', [row])
+        elif self._history_key(rows[-1]) > self._history_key(row):
+            bisect.insort(rows, row, key=self._history_key)
+        else:
+            rows.append(row)
+        return TicketView(self, row)
+
+    def customer_rows(self, customer_email: str) -> array:
+        """Номера строк билетов покупателя, упорядоченные по (время покупки, id)"""
+        code = self._codes.get(customer_email)
+        return self._rows_by_email.get(code, array('l')) if code is not None else array('l')
+
+    def position_before(self, rows: array, purchase_time: datetime.datetime, ticket_id: int) -> int:
+        """Позиция в rows первой строки с ключом не меньше (purchase_time, ticket_id)"""
+        return bisect.bisect_left(rows, (to_micros(purchase_time), ticket_id), key=self._history_key)
+
+    def nbytes(self) -> int:
+        """Приблизительный объем колонок и индекса покупателей в байтах (без словаря строк)"""
+        columns = (self.ids, self.screening_ids, self.seat_numbers, self.purchase_times, self.total_prices,
+                   self.name_codes, self.email_codes)
+        total = sum(column.buffer_info()[1] * column.itemsize for column in columns)
+        return total + sum(rows.buffer_info()[1] * rows.itemsize for rows in self._rows_by_email.values())
+
+    def _columns(self) -> Tuple[array, ...]:
+        return (self.ids, self.screening_ids, self.seat_numbers, self.purchase_times, self.total_prices,
+                self.name_codes, self.email_codes)
+
+    def dump(self, f: BinaryIO):
+        """Записать хранилище в файл: колонки и индексы пишутся как есть, без построчного кодирования"""
+        encoded = [value.encode('utf-8') for value in self.strings]
+        codes = array('l', self._rows_by_email)
+        lengths = array('l', (len(rows) for rows in self._rows_by_email.values()))
+        # Заголовок: размеры элементов колонок (для проверки совместимости), число билетов, строк и покупателей
+        f.write(struct.pack('<8BQQQ', *(column.itemsize for column in self._columns()), lengths.itemsize,
+                            len(self.ids), len(encoded), len(codes)))
+        for column in self._columns():
+            column.tofile(f)
+        array('l', map(len, encoded)).tofile(f)
+        f.write(b''.join(encoded))
+        codes.tofile(f)
+        lengths.tofile(f)
+        for rows in self._rows_by_email.values():
+            rows.tofile(f)
+
+    @classmethod
+    def load(cls, buffer: memoryview, offset: int) -> Tuple['TicketStore', int]:
+        """Прочитать хранилище, записанное dump, из буфера; возвращает (хранилище, смещение после него)"""
+        store = cls()
+        header = struct.Struct('<8BQQQ')
+        *itemsizes, count, string_count, customer_count = header.unpack_from(buffer, offset)
+        offset += header.size
+        if list(itemsizes) != [column.itemsize for column in store._columns()] + [array('l').itemsize]:
+            raise ValueError("Снимок записан на платформе с другими размерами типов")
+
+        def read(column: array, items: int) -> array:
+            nonlocal offset
+            size = items * column.itemsize
+            column.frombytes(buffer[offset:offset + size])
+            offset += size
+            return column
+
+        for column in store._columns():
+            read(column, count)
+        lengths = read(array('l'), string_count)
+        for length in lengths:
+            store.strings.append(str(buffer[offset:offset + length], 'utf-8'))
+            offset += length
+        store._codes = {value: code for code, value in enumerate(store.strings)}
+        codes = read(array('l'), customer_count)
+        lengths = read(array('l'), customer_count)
+        for code, length in zip(codes, lengths):
+            store._rows_by_email[code] = read(array('l'), length)
+        return store, offset
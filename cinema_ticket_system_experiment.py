@@ -1,9 +1,23 @@
+import bisect
 import datetime
+import heapq
 import time
 import random
-from typing import List, Dict, Optional
+import tracemalloc
+from typing import List, Dict, Iterator, Optional
 from dataclasses import dataclass
 
+from cinema_analytics import SalesCounters
+from cinema_cache import QueryCache
+from cinema_holds import DEFAULT_HOLD_TTL, Hold, TimingWheel
+from cinema_instrumentation import Instrumentation
+from cinema_outbox import EVENT_HOLD, EVENT_HOLD_EXPIRED, EVENT_HOLD_RELEASED, EVENT_PURCHASE, ChangeEvent, Outbox
+from cinema_persistence import Persistence
+from cinema_pagination import decode_cursor, encode_cursor
+from cinema_search import MovieSearchIndex
+from cinema_seat_map import SeatMap, hall_layout
+from cinema_ticket_store import TicketStore, TicketView
+
 @dataclass
 class Movie:
     id: int
@@ -32,14 +46,53 @@ class Ticket:
     total_price: float
 
 class CinemaTicketSystemExperiment:
-    def __init__(self):
+    def __init__(self, cache_size: int = 0, cache_ttl: float = 30.0, sample_data: bool = True,
+                 instrumentation: Optional[Instrumentation] = None, persistence: Optional[Persistence] = None):
         self.movies: List[Movie] = []
         self.screenings: List[Screening] = []
-        self.tickets: List[Ticket] = []
+        # Билеты хранятся по колонкам; элементы — представления TicketView с полями Ticket
+        self.tickets = TicketStore()
         self.next_movie_id = 1
         self.next_screening_id = 1
         self.next_ticket_id = 1
-        self.init_sample_data()
+        
+        # Индексы, которые поддерживаются при каждом изменении данных
+        self.movies_by_id: Dict[int, Movie] = {}
+        self.screenings_by_id: Dict[int, Screening] = {}
+        # Сеансы каждого фильма, отсортированные по времени, и параллельный список времен для bisect
+        self.screenings_by_movie: Dict[int, List[Screening]] = {}
+        self.screening_times_by_movie: Dict[int, List[datetime.datetime]] = {}
+        # Все сеансы по времени (для поиска по окну дат) и индекс слов названий и жанров фильмов
+        self.screenings_by_time: List[Screening] = []
+        self.screening_times: List[datetime.datetime] = []
+        self.search_index = MovieSearchIndex()
+        # Карты мест создаются при первом обращении к сеансу
+        self.seat_maps: Dict[int, SeatMap] = {}
+        # Счетчики загрузки залов и выручки по дням, залам и фильмам
+        self.sales = SalesCounters()
+        # Кэш результатов просмотра афиши (cache_size=0 — без кэша)
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        # Удержания мест на время оплаты; сроки отслеживает колесо таймеров
+        self.holds: Dict[int, Hold] = {}
+        self.hold_wheel = TimingWheel()
+        self.next_hold_id = 1
+        
+        # Сохраненное состояние восстанавливается до подключения журнала, чтобы не записать его повторно,
+        # и до создания потока изменений: восстановление — не новые покупки
+        self.persistence = None
+        self.outbox: Optional[Outbox] = None
+        if persistence and persistence.restore(self):
+            sample_data = False
+        self.persistence = persistence
+        # Поток изменений для внешних потребителей (в памяти, до перезапуска)
+        self.outbox = Outbox()
+        
+        if sample_data:
+            self.init_sample_data()
+        # Инструментирование (задержки методов) включается только явно
+        self.instrumentation = instrumentation
+        if instrumentation:
+            instrumentation.attach(self)
     
     def init_sample_data(self):
         """Инициализация тестовых данных"""
@@ -53,8 +106,7 @@ class CinemaTicketSystemExperiment:
         ]
         
         for title, genre, duration, rating in movies_data:
-            self.movies.append(Movie(self.next_movie_id, title, genre, duration, rating))
-            self.next_movie_id += 1
+            self.add_movie(title, genre, duration, rating)
         
         # Создание сеансов
         base_time = datetime.datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
@@ -63,104 +115,537 @@ class CinemaTicketSystemExperiment:
             for day in range(7):  # На 7 дней вперед
                 for time_slot in range(4):  # 4 сеанса в день
                     screening_time = base_time + datetime.timedelta(days=day, hours=time_slot*3)
-                    self.screenings.append(Screening(
-                        self.next_screening_id,
+                    self.add_screening(
                         movie.id,
                         screening_time,
                         (movie.id % 3) + 1,
                         350 + (movie.id * 50),
                         100
-                    ))
-                    self.next_screening_id += 1
+                    )
+    
+    def add_movie(self, title: str, genre: str, duration: int, rating: float) -> Movie:
+        """Добавить фильм"""
+        movie = Movie(self.next_movie_id, title, genre, duration, rating)
+        self.next_movie_id += 1
+        
+        self.movies.append(movie)
+        self.movies_by_id[movie.id] = movie
+        self.screenings_by_movie[movie.id] = []
+        self.screening_times_by_movie[movie.id] = []
+        self.search_index.add(movie.id, title, genre)
+        if self.persistence:
+            self.persistence.log_movie(movie)
+            self.persistence.checkpoint_if_due()
+        return movie
+    
+    def add_screening(self, movie_id: int, screening_time: datetime.datetime, hall_number: int,
+                      price: float, available_seats: int) -> Screening:
+        """Добавить сеанс"""
+        screening = Screening(self.next_screening_id, movie_id, screening_time, hall_number, price, available_seats)
+        self.next_screening_id += 1
+        
+        self.screenings.append(screening)
+        self.screenings_by_id[screening.id] = screening
+        
+        # Вставка с сохранением порядка по времени сеанса
+        times = self.screening_times_by_movie[movie_id]
+        position = bisect.bisect_right(times, screening_time)
+        times.insert(position, screening_time)
+        self.screenings_by_movie[movie_id].insert(position, screening)
+        position = bisect.bisect_right(self.screening_times, screening_time)
+        self.screening_times.insert(position, screening_time)
+        self.screenings_by_time.insert(position, screening)
+        capacity = self._hall_capacity(hall_number)
+        self.sales.add_screening(screening.id, screening_time, hall_number, movie_id, capacity,
+                                 capacity - available_seats)
+        self._invalidate_movie(movie_id, True)
+        if self.persistence:
+            self.persistence.log_screening(screening)
+            self.persistence.checkpoint_if_due()
+        return screening
+    
+    def _hall_capacity(self, hall_number: int) -> int:
+        rows, cols = hall_layout(hall_number)
+        return rows * cols
+    
+    def get_seat_map(self, screening_id: int) -> Optional[SeatMap]:
+        """Получить карту мест сеанса"""
+        seat_map = self.seat_maps.get(screening_id)
+        if seat_map is None:
+            screening = self.screenings_by_id.get(screening_id)
+            if not screening:
+                return None
+            seat_map = SeatMap(*hall_layout(screening.hall_number))
+            # Места, проданные до появления карты, считаются занятыми с конца зала
+            for seat in range(seat_map.capacity, screening.available_seats, -1):
+                seat_map.claim(seat)
+            self.seat_maps[screening_id] = seat_map
+        return seat_map
+    
+    def add_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_number: int,
+                   purchase_time: datetime.datetime, total_price: float) -> TicketView:
+        """Записать проданный билет (без проверки и учета мест сеанса)"""
+        ticket = self._record_ticket(screening_id, customer_name, customer_email, seat_number, purchase_time,
+                                     total_price)
+        if self.persistence:
+            self.persistence.log_ticket(screening_id, customer_name, customer_email, seat_number, purchase_time,
+                                        total_price)
+            self.persistence.checkpoint_if_due()
+        return ticket
+    
+    def _record_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_number: int,
+                       purchase_time: datetime.datetime, total_price: float) -> TicketView:
+        # Хранилище само поддерживает историю покупателя в порядке (время покупки, id)
+        ticket = self.tickets.append(self.next_ticket_id, screening_id, customer_name, customer_email,
+                                     seat_number, purchase_time, total_price)
+        self.next_ticket_id += 1
+        # Места сеанса учитываются отдельно (в add_screening и purchase_ticket), здесь — только выручка
+        self.sales.add_sale(screening_id, 0, total_price)
+        return ticket
+    
+    def _upcoming_screenings(self, movie_id: int, current_time: datetime.datetime) -> List[Screening]:
+        times = self.screening_times_by_movie.get(movie_id)
+        if not times:
+            return []
+        return self.screenings_by_movie[movie_id][bisect.bisect_right(times, current_time):]
+    
+    def _cached(self, key: tuple, compute) -> list:
+        """Результат из кэша или compute() -> (результат, момент устаревания или None)"""
+        if self.cache is None:
+            return compute()[0]
+        result = self.cache.get(key)
+        if result is None:
+            generation = self.cache.generation(key)
+            result, expires_at = compute()
+            self.cache.put(key, result, expires_at.timestamp() if expires_at else None, generation)
+        return list(result)
+    
+    def _invalidate_movie(self, movie_id: int, availability_changed: bool):
+        if self.cache:
+            self.cache.invalidate(('screenings', movie_id))
+            if availability_changed:
+                self.cache.invalidate(('available_movies',))
     
     def get_available_movies(self) -> List[Movie]:
         """Получить список доступных фильмов"""
+        if self.holds:
+            self.expire_holds()
+        return self._cached(('available_movies',), self._compute_available_movies)
+    
+    def _compute_available_movies(self):
         current_time = datetime.datetime.now()
-        available_movie_ids = set()
+        movies = []
+        # Фильм пропадет из списка, когда начнется его последний сеанс со свободными местами
+        expires_at = None
         
-        for screening in self.screenings:
-            if screening.screening_time > current_time and screening.available_seats > 0:
-                available_movie_ids.add(screening.movie_id)
+        for movie in self.movies:
+            last_time = next(
+                (screening.screening_time for screening in reversed(self._upcoming_screenings(movie.id, current_time))
+                 if screening.available_seats > 0),
+                None
+            )
+            if last_time:
+                movies.append(movie)
+                expires_at = min(expires_at, last_time) if expires_at else last_time
         
-        return [movie for movie in self.movies if movie.id in available_movie_ids]
+        return movies, expires_at
     
     def get_screenings_by_movie(self, movie_id: int) -> List[Screening]:
         """Получить сеансы для конкретного фильма"""
+        if self.holds:
+            self.expire_holds()
+        return self._cached(('screenings', movie_id), lambda: self._compute_screenings_by_movie(movie_id))
+    
+    def _compute_screenings_by_movie(self, movie_id: int):
         current_time = datetime.datetime.now()
-        return [
-            screening for screening in self.screenings 
-            if screening.movie_id == movie_id 
-            and screening.screening_time > current_time
-            and screening.available_seats > 0
+        screenings = [
+            screening for screening in self._upcoming_screenings(movie_id, current_time)
+            if screening.available_seats > 0
         ]
+        # Результат устаревает с началом первого сеанса из списка
+        return screenings, screenings[0].screening_time if screenings else None
     
-    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1) -> bool:
-        """Покупка билетов"""
-        # Находим сеанс
-        screening = None
-        for s in self.screenings:
-            if s.id == screening_id:
-                screening = s
-                break
+    def search_movies(self, query: Optional[str] = None, genre: Optional[str] = None, limit: int = 50) -> List[Movie]:
+        """Поиск фильмов с предстоящими сеансами со свободными местами по словам названия и жанра и по жанру"""
+        if self.holds:
+            self.expire_holds()
+        current_time = datetime.datetime.now()
+        found = self.search_index.search(query, genre)
+        candidates = self.movies if found is None else (self.movies_by_id[movie_id] for movie_id in found)
+        movies = (
+            movie for movie in candidates
+            if any(screening.available_seats > 0 for screening in self._upcoming_screenings(movie.id, current_time))
+        )
+        return heapq.nsmallest(limit, movies, key=lambda movie: (-movie.rating, movie.id))
+    
+    def search_screenings(self, query: Optional[str] = None, genre: Optional[str] = None,
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                          hall_number: Optional[int] = None, min_free_seats: int = 1,
+                          limit: int = 100) -> List[Screening]:
+        """Предстоящие сеансы по фильтрам (как search_screenings SQLite-системы), по времени сеанса"""
+        if self.holds:
+            self.expire_holds()
+        current_time = datetime.datetime.now()
         
+        def window(times: List[datetime.datetime], screenings: List[Screening]) -> List[Screening]:
+            # Сеансы строго после текущего момента, не раньше start и раньше end
+            if start is not None and start > current_time:
+                low = bisect.bisect_left(times, start)
+            else:
+                low = bisect.bisect_right(times, current_time)
+            high = bisect.bisect_left(times, end) if end is not None else len(times)
+            return screenings[low:high]
+        
+        found = self.search_index.search(query, genre)
+        candidates = window(self.screening_times, self.screenings_by_time)
+        if found is not None and len(found) >= len(candidates):
+            candidates = [screening for screening in candidates if screening.movie_id in found]
+        elif found is not None:
+            # Найденных фильмов меньше, чем сеансов в окне: их окна сливаются в общий порядок по времени
+            candidates = heapq.merge(
+                *(window(self.screening_times_by_movie[movie_id], self.screenings_by_movie[movie_id])
+                  for movie_id in found),
+                key=lambda screening: (screening.screening_time, screening.id)
+            )
+        
+        screenings = []
+        for screening in candidates:
+            if ((hall_number is None or screening.hall_number == hall_number)
+                    and (min_price is None or screening.price >= min_price)
+                    and (max_price is None or screening.price <= max_price)
+                    and screening.available_seats >= min_free_seats):
+                screenings.append(screening)
+                if len(screenings) == limit:
+                    break
+        return screenings
+    
+    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+                        seat_numbers: Optional[List[int]] = None) -> bool:
+        """Покупка билетов (на выбранные места или на подобранные рядом)"""
+        screening = self.screenings_by_id.get(screening_id)
+        seat_map, seats = self._allocate_seats(screening, seat_count, seat_numbers)
+        if not seats:
+            return False
+        
+        purchase_time = datetime.datetime.now()
+        if self.persistence:
+            # Покупка подтверждается только после записи в журнал
+            try:
+                self.persistence.log_purchase(screening_id, customer_name, customer_email, seats, purchase_time)
+            except Exception:
+                seat_map.release_seats(seats)
+                raise
+        self._record_purchase(screening, customer_name, customer_email, seats, purchase_time)
+        if self.persistence:
+            self.persistence.checkpoint_if_due()
+        return True
+    
+    def _allocate_seats(self, screening: Optional[Screening], seat_count: int, seat_numbers: Optional[List[int]]):
+        """Занять места на карте сеанса; возвращает (карта мест, места или None)"""
+        if self.holds:
+            self.expire_holds()
+        if seat_numbers is not None:
+            seat_count = len(seat_numbers)
         if not screening or screening.available_seats < seat_count:
+            return None, None
+        seat_map = self.get_seat_map(screening.id)
+        return seat_map, seat_map.allocate(seat_count, seat_numbers)
+    
+    def hold_seats(self, screening_id: int, seat_count: int = 1, seat_numbers: Optional[List[int]] = None,
+                   ttl: float = DEFAULT_HOLD_TTL) -> Optional[int]:
+        """Удержать места на ttl секунд (на время оплаты); возвращает id удержания или None.
+        
+        Удержанные места заняты на карте и не входят в available_seats, пока удержание
+        не подтверждено, не снято или не истекло.
+        """
+        screening = self.screenings_by_id.get(screening_id)
+        _, seats = self._allocate_seats(screening, seat_count, seat_numbers)
+        if not seats:
+            return None
+        
+        hold = Hold(self.next_hold_id, screening_id, seats, time.time() + ttl)
+        self.next_hold_id += 1
+        self.holds[hold.id] = hold
+        self.hold_wheel.schedule(hold.id, hold.expires_at)
+        screening.available_seats -= len(seats)
+        self._invalidate_movie(screening.movie_id, screening.available_seats == 0)
+        self.outbox.append(EVENT_HOLD, screening_id, hold_id=hold.id, seats=seats, expires_at=hold.expires_at)
+        return hold.id
+    
+    def confirm_hold(self, hold_id: int, customer_name: str, customer_email: str) -> bool:
+        """Купить удержанные места; False, если удержание истекло или уже снято"""
+        if self.holds:
+            self.expire_holds()
+        hold = self.holds.pop(hold_id, None)
+        if hold is None:
             return False
+        self.hold_wheel.cancel(hold_id)
         
+        purchase_time = datetime.datetime.now()
+        if self.persistence:
+            try:
+                self.persistence.log_purchase(hold.screening_id, customer_name, customer_email, hold.seats,
+                                              purchase_time)
+            except Exception:
+                self.holds[hold_id] = hold
+                self.hold_wheel.schedule(hold_id, hold.expires_at)
+                raise
+        screening = self.screenings_by_id[hold.screening_id]
+        # Места уже вычтены из свободных при удержании, _record_purchase вычтет их снова
+        screening.available_seats += len(hold.seats)
+        self._record_purchase(screening, customer_name, customer_email, hold.seats, purchase_time, hold_id)
+        if self.persistence:
+            self.persistence.checkpoint_if_due()
+        return True
+    
+    def release_hold(self, hold_id: int) -> bool:
+        """Снять удержание и освободить места"""
+        hold = self.holds.pop(hold_id, None)
+        if hold is None:
+            return False
+        self.hold_wheel.cancel(hold_id)
+        self._free_held_seats(hold)
+        self.outbox.append(EVENT_HOLD_RELEASED, hold.screening_id, hold_id=hold_id, seats=hold.seats)
+        return True
+    
+    def expire_holds(self) -> int:
+        """Снять удержания с истекшим сроком; возвращает их число"""
+        expired = 0
+        for hold_id in self.hold_wheel.advance():
+            hold = self.holds.pop(hold_id, None)
+            if hold:
+                self._free_held_seats(hold)
+                self.outbox.append(EVENT_HOLD_EXPIRED, hold.screening_id, hold_id=hold_id, seats=hold.seats)
+                expired += 1
+        return expired
+    
+    def _free_held_seats(self, hold: Hold):
+        screening = self.screenings_by_id[hold.screening_id]
+        self.get_seat_map(hold.screening_id).release_seats(hold.seats)
+        screening.available_seats += len(hold.seats)
+        self._invalidate_movie(screening.movie_id, True)
+    
+    def held_seats(self) -> Dict[int, List[int]]:
+        """Удержанные места по сеансам"""
+        held: Dict[int, List[int]] = {}
+        for hold in self.holds.values():
+            held.setdefault(hold.screening_id, []).extend(hold.seats)
+        return held
+    
+    def apply_purchase(self, screening_id: int, customer_name: str, customer_email: str, seats: List[int],
+                       purchase_time: datetime.datetime):
+        """Повторить записанную покупку мест seats (при восстановлении из журнала)"""
+        screening = self.screenings_by_id[screening_id]
+        if not self.get_seat_map(screening_id).claim_seats(seats):
+            raise ValueError(f"Места {seats} сеанса {screening_id} уже заняты: журнал не согласован со снимком")
+        self._record_purchase(screening, customer_name, customer_email, seats, purchase_time)
+    
+    def _record_purchase(self, screening: Screening, customer_name: str, customer_email: str, seats: List[int],
+                         purchase_time: datetime.datetime, hold_id: Optional[int] = None):
         # Покупка билетов
-        for i in range(seat_count):
-            ticket = Ticket(
-                self.next_ticket_id,
-                screening_id,
-                customer_name,
-                customer_email,
-                screening.available_seats - i,
-                datetime.datetime.now(),
-                screening.price
-            )
-            self.tickets.append(ticket)
-            self.next_ticket_id += 1
+        for seat in seats:
+            self._record_ticket(screening.id, customer_name, customer_email, seat, purchase_time, screening.price)
         
         # Обновление доступных мест
-        screening.available_seats -= seat_count
-        return True
+        screening.available_seats -= len(seats)
+        self.sales.add_sale(screening.id, len(seats), 0.0)
+        self._invalidate_movie(screening.movie_id, screening.available_seats == 0)
+        # Покупки, повторяемые при восстановлении, в поток изменений не попадают,
+        # а без зарегистрированных потребителей событие не собирается вовсе
+        if self.outbox is not None and self.outbox.consumers:
+            payload = dict(customer_name=customer_name, customer_email=customer_email, seats=seats,
+                           price=screening.price)
+            if hold_id is not None:
+                payload['hold_id'] = hold_id
+            self.outbox.append(EVENT_PURCHASE, screening.id, **payload)
+    
+    def purchase_tickets_bulk(self, orders: List[tuple]) -> List[bool]:
+        """Пакетная покупка.
+        
+        Заказ — кортеж (screening_id, customer_name, customer_email, seat_count[, seat_numbers]).
+        Возвращает результат для каждого заказа в исходном порядке.
+        """
+        return [self.purchase_ticket(*order) for order in orders]
+    
+    def register_consumer(self, consumer: str, from_latest: bool = False) -> int:
+        """Зарегистрировать потребителя потока изменений; возвращает его подтвержденную позицию"""
+        return self.outbox.register(consumer, from_latest)
+    
+    def consumer_position(self, consumer: str) -> Optional[int]:
+        """Подтвержденная позиция потребителя (None — не зарегистрирован)"""
+        return self.outbox.position(consumer)
+    
+    def read_changes(self, after: int = 0, limit: int = 1000) -> List[ChangeEvent]:
+        """Пакет событий потока изменений с номерами больше after"""
+        return self.outbox.read(after, limit)
+    
+    def ack_changes(self, consumer: str, position: int) -> int:
+        """Подтвердить обработку событий до position включительно; возвращает число удаленных событий"""
+        return self.outbox.acknowledge(consumer, position)
+    
+    def get_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """Загрузка залов и выручка по счетчикам: group_by — 'hall', 'movie' или 'day',
+        окно [start, end) — по дням сеансов"""
+        return self.sales.report(group_by, start, end)
+    
+    def recompute_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """То же, что get_sales_report, но по сеансам и билетам и с окном до секунды"""
+        counters = SalesCounters()
+        held = self.held_seats()
+        for screening in self.screenings:
+            if (start and screening.screening_time < start) or (end and screening.screening_time >= end):
+                continue
+            capacity = self._hall_capacity(screening.hall_number)
+            # Удержанные места заняты, но еще не проданы
+            sold_seats = capacity - screening.available_seats - len(held.get(screening.id, ()))
+            counters.add_screening(screening.id, screening.screening_time, screening.hall_number, screening.movie_id,
+                                   capacity, sold_seats)
+        for screening_id, total_price in zip(self.tickets.screening_ids, self.tickets.total_prices):
+            counters.add_sale(screening_id, 0, total_price)
+        return counters.report(group_by)
+    
+    def _history_entry(self, ticket: TicketView) -> Optional[Dict]:
+        # Находим информацию о сеансе и фильме
+        screening = self.screenings_by_id.get(ticket.screening_id)
+        if screening:
+            movie = self.movies_by_id.get(screening.movie_id)
+            if movie:
+                return {
+                    'ticket_id': ticket.id,
+                    'movie_title': movie.title,
+                    'screening_time': screening.screening_time,
+                    'hall_number': screening.hall_number,
+                    'seat_number': ticket.seat_number,
+                    'total_price': ticket.total_price,
+                    'purchase_time': ticket.purchase_time
+                }
+        return None
     
     def get_ticket_history(self, customer_email: str) -> List[Dict]:
         """Получить историю покупок"""
         customer_tickets = []
         
-        for ticket in self.tickets:
-            if ticket.customer_email == customer_email:
-                # Находим информацию о сеансе и фильме
-                screening = next((s for s in self.screenings if s.id == ticket.screening_id), None)
-                if screening:
-                    movie = next((m for m in self.movies if m.id == screening.movie_id), None)
-                    if movie:
-                        customer_tickets.append({
-                            'ticket_id': ticket.id,
-                            'movie_title': movie.title,
-                            'screening_time': screening.screening_time,
-                            'hall_number': screening.hall_number,
-                            'seat_number': ticket.seat_number,
-                            'total_price': ticket.total_price,
-                            'purchase_time': ticket.purchase_time
-                        })
+        for row in self.tickets.customer_rows(customer_email):
+            entry = self._history_entry(self.tickets[row])
+            if entry:
+                customer_tickets.append(entry)
         
         return customer_tickets
+    
+    def get_ticket_history_page(self, customer_email: str, page_size: int = 50, cursor: Optional[str] = None) -> Dict:
+        """Страница истории покупок (новые сначала).
+        
+        Возвращает {'tickets': [...], 'next_cursor': курсор следующей страницы или None}.
+        """
+        if page_size < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+        
+        rows = self.tickets.customer_rows(customer_email)
+        end = len(rows)
+        if cursor:
+            purchase_time, ticket_id = decode_cursor(cursor)
+            end = self.tickets.position_before(rows, datetime.datetime.fromisoformat(purchase_time), ticket_id)
+        start = max(end - page_size, 0)
+        page = [self.tickets[row] for row in reversed(rows[start:end])]
+        
+        tickets = [entry for entry in map(self._history_entry, page) if entry]
+        next_cursor = encode_cursor(page[-1].purchase_time, page[-1].id) if start > 0 else None
+        return {'tickets': tickets, 'next_cursor': next_cursor}
+    
+    def iter_ticket_history(self, customer_email: str, batch_size: int = 500) -> Iterator[Dict]:
+        """Потоковая выдача всей истории покупок (новые сначала) порциями по batch_size"""
+        cursor = None
+        while True:
+            page = self.get_ticket_history_page(customer_email, batch_size, cursor)
+            yield from page['tickets']
+            cursor = page['next_cursor']
+            if not cursor:
+                return
 
-def performance_experiment():
-    """Вычислительный эксперимент для сравнения производительности"""
+def preload_ticket_history(system: CinemaTicketSystemExperiment, ticket_count: int, customers: int = 10000):
+    """Заполнить систему историей продаж на прошедшие (полностью проданные) сеансы"""
+    purchase_time = datetime.datetime.now() - datetime.timedelta(days=30)
+    screening = None
+    
+    for i in range(ticket_count):
+        seat_number = i % 100 + 1
+        if seat_number == 1:
+            movie = system.movies[(i // 100) % len(system.movies)]
+            screening = system.add_screening(
+                movie.id,
+                purchase_time + datetime.timedelta(days=1, hours=i // 100 % 24),
+                (movie.id % 3) + 1,
+                350 + (movie.id * 50),
+                0
+            )
+        system.add_ticket(
+            screening.id,
+            f"History{i % customers}",
+            f"history{i % customers}@test.com",
+            seat_number,
+            purchase_time,
+            screening.price
+        )
+
+def _measure_ticket_memory(count: int, customers: int, columnar: bool) -> int:
+    """Прирост памяти (байт) при записи count билетов в объекты Ticket или в TicketStore"""
+    base_time = datetime.datetime.now()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if columnar:
+        store = TicketStore()
+        for i in range(count):
+            store.append(i + 1, i // 100 + 1, f"History{i % customers}", f"history{i % customers}@test.com",
+                         i % 100 + 1, base_time + datetime.timedelta(seconds=i), 500.0)
+    else:
+        # Прежнее устройство: список объектов и словарь списков по email
+        tickets = []
+        by_email = {}
+        for i in range(count):
+            ticket = Ticket(i + 1, i // 100 + 1, f"History{i % customers}", f"history{i % customers}@test.com",
+                            i % 100 + 1, base_time + datetime.timedelta(seconds=i), 500.0)
+            tickets.append(ticket)
+            by_email.setdefault(ticket.customer_email, []).append(ticket)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+def ticket_memory_experiment(count: int = 200000, customers: int = 10000):
+    """Сравнение памяти на один билет: объекты Ticket против колоночного хранилища"""
+    print("=== ПАМЯТЬ НА ОДИН БИЛЕТ ===")
+    objects = _measure_ticket_memory(count, customers, False)
+    columnar = _measure_ticket_memory(count, customers, True)
+    print(f"Билетов: {count}, покупателей: {customers}")
+    print(f"Объекты Ticket:         {objects / count:.1f} байт/билет")
+    print(f"Колоночное хранилище:   {columnar / count:.1f} байт/билет")
+    print(f"Экономия: в {objects / columnar:.1f} раза")
+
+def performance_experiment(history_size: int = 0):
+    """Вычислительный эксперимент для сравнения производительности
+    
+    history_size — число билетов в истории продаж до начала замеров (например, 10**6).
+    """
     print("=== ВЫЧИСЛИТЕЛЬНЫЙ ЭКСПЕРИМЕНТ ===")
     
-    # Создаем систему
+    # Создаем систему (без кэша афиши: замеряются индексы)
     system = CinemaTicketSystemExperiment()
+    if history_size:
+        preload_ticket_history(system, history_size)
+        print(f"Загружено билетов в историю: {history_size}")
     
-    # Тест 1: Поиск доступных фильмов
+    # Тест 1: Поиск доступных фильмов — по индексам и, отдельно, из кэша афиши
     print("\n1. Тест поиска доступных фильмов:")
-    start_time = time.time()
-    for _ in range(1000):
-        available_movies = system.get_available_movies()
-    end_time = time.time()
-    print(f"Время выполнения 1000 поисков: {(end_time - start_time)*1000:.2f} мс")
+    cached_system = CinemaTicketSystemExperiment(cache_size=256)
+    for name, searched in (("без кэша", system), ("с кэшем афиши", cached_system)):
+        start_time = time.time()
+        for _ in range(1000):
+            available_movies = searched.get_available_movies()
+        end_time = time.time()
+        print(f"Время выполнения 1000 поисков ({name}): {(end_time - start_time)*1000:.2f} мс")
+    cache_stats = cached_system.cache.stats()
+    print(f"Кэш афиши: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']} "
+          f"({cache_stats['hit_rate'] * 100:.1f}% попаданий)")
     
     # Тест 2: Покупка билетов
     print("\n2. Тест покупки билетов:")
@@ -184,7 +669,6 @@ def performance_experiment():
     
     # Тест 4: Нагрузочное тестирование
     print("\n4. Нагрузочное тестирование (параллельные операции):")
-    operations = []
     start_time = time.time()
     
     # Смешанные операции
@@ -208,19 +692,10 @@ def performance_experiment():
     print(f"Всего сеансов: {len(system.screenings)}")
     print(f"Всего проданных билетов: {len(system.tickets)}")
     
-    # Анализ загрузки залов
-    hall_utilization = {}
-    for screening in system.screenings:
-        hall = screening.hall_number
-        if hall not in hall_utilization:
-            hall_utilization[hall] = {'total_seats': 0, 'sold_seats': 0}
-        hall_utilization[hall]['total_seats'] += 100
-        hall_utilization[hall]['sold_seats'] += (100 - screening.available_seats)
-    
+    # Анализ загрузки залов (по счетчикам, без прохода по сеансам)
     print("\nЗагрузка залов:")
-    for hall, stats in hall_utilization.items():
-        utilization = (stats['sold_seats'] / stats['total_seats']) * 100
-        print(f"Зал {hall}: {utilization:.1f}%")
+    for hall, stats in system.get_sales_report('hall').items():
+        print(f"Зал {hall}: {stats['utilization'] * 100:.1f}%")
 
 def main_experiment():
     """Основная функция для экспериментальной версии"""
@@ -232,7 +707,8 @@ def main_experiment():
         print("2. Купить билет")
         print("3. История покупок")
         print("4. Запустить вычислительный эксперимент")
-        print("5. Выход")
+        print("5. Замер памяти на один билет")
+        print("6. Выход")
         
         choice = input("Выберите действие: ")
         
@@ -292,6 +768,9 @@ def main_experiment():
             performance_experiment()
             
         elif choice == '5':
+            ticket_memory_experiment()
+            
+        elif choice == '6':
             print("До свидания!")
             break
         else:
@@ -0,0 +1,431 @@
+import datetime
+import queue
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from cinema_holds import DEFAULT_HOLD_TTL, Hold, format_seats, parse_seats
+from cinema_outbox import EVENT_HOLD, EVENT_PURCHASE, INSERT_EVENT, ChangeEvent, event_row
+from cinema_rows import parse_datetime
+from cinema_seat_map import SeatMap, hall_layout
+from cinema_ticket_system_experiment import CinemaTicketSystemExperiment, Movie, Screening
+from cinema_ticket_system_sqlite import CinemaTicketSystemSQLite, remove_database
+
+# Режимы записи изменений в SQLite:
+#   'sync'  — операция возвращается после фиксации своей транзакции,
+#   'group' — изменения копятся в очереди и фиксируются пакетами в отдельном потоке;
+#             при сбое процесса теряются изменения, еще не записанные потоком (flush() дожидается записи).
+DURABILITY_MODES = ('sync', 'group')
+
+# Потребитель потока изменений модели в памяти, переносящий их в SQLite
+WRITE_BEHIND_CONSUMER = 'write-behind'
+
+# Загрузка модели: рабочие и архивные сеансы (архивные нужны истории покупок).
+# Удержанные места возвращаются в свободные: удержания восстанавливаются отдельно
+_LOAD_SCREENINGS = '''
+    SELECT s.id, s.movie_id, s.screening_time, s.hall_number, s.price,
+           s.available_seats + COALESCE(h.held, 0), s.seat_map
+    FROM screenings s
+    LEFT JOIN (SELECT screening_id, SUM(seat_count) AS held FROM holds GROUP BY screening_id) h
+        ON h.screening_id = s.id
+    UNION ALL
+    SELECT id, movie_id, screening_time, hall_number, price, available_seats, seat_map
+    FROM screenings_archive
+    ORDER BY 1
+'''
+
+_LOAD_TICKETS = '''
+    SELECT id, screening_id, customer_name, customer_email, seat_number, purchase_time, total_price FROM tickets
+    UNION ALL
+    SELECT id, screening_id, customer_name, customer_email, seat_number, purchase_time, total_price
+    FROM tickets_archive
+    ORDER BY 1
+'''
+
+class WriteBehindQueue:
+    """Поток записи: пакеты событий модели в памяти из очереди применяются к SQLite
+    одной транзакцией (одним fsync) на несколько пакетов, как у PurchaseBatcher"""
+
+    def __init__(self, system: 'CinemaTicketSystemHybrid', position: int, max_batch: int = 1024):
+        self.system = system
+        self.max_batch = max_batch
+        # Номер последнего события, зафиксированного в SQLite: до него события модели подтверждаются
+        self.persisted = position
+        # failure — первая ошибка записи, после нее пакеты не пишутся; error — она же, еще не переданная flush()
+        self.failure: Optional[Exception] = None
+        self.error: Optional[Exception] = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, events: List[ChangeEvent]):
+        self._queue.put(events)
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь событий"""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            # Пока фиксируется предыдущий пакет, в очереди копятся следующие
+            batches = [item]
+            events = len(item)
+            stop = False
+            while events < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batches.append(item)
+                events += len(item)
+
+            if self.failure is None:
+                events = [event for batch in batches for event in batch]
+                try:
+                    self.system._persist(events)
+                    self.persisted = events[-1].seq
+                except Exception as e:
+                    # Модель в памяти и база разошлись: следующие пакеты не пишутся (в базе был бы пропуск),
+                    # система перестает принимать операции
+                    self.failure = self.error = e
+                    print(f"Ошибка отложенной записи в SQLite: {e}")
+            for _ in range(len(batches) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+class CinemaTicketSystemHybrid:
+    """Модель в памяти с индексами для чтения и отложенной записью изменений в SQLite.
+
+    При запуске база загружается в CinemaTicketSystemExperiment; просмотр афиши, поиск, история
+    и отчеты читаются из памяти. Покупки и удержания проверяются и выполняются в памяти, а поток
+    изменений модели (cinema_outbox) переносится в SQLite — синхронно или пакетами (durability).
+    Предполагается, что в базу пишет только этот экземпляр.
+    """
+
+    def __init__(self, db_name: str = "cinema.db", durability: str = 'group', max_batch: int = 1024,
+                 cache_size: int = 0, cache_ttl: float = 30.0, sample_data: bool = True):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Неизвестный режим записи: {durability}")
+        self.durability = durability
+        self.store = CinemaTicketSystemSQLite(db_name, pool_size=1, sample_data=sample_data)
+        self.memory = CinemaTicketSystemExperiment(cache_size, cache_ttl, sample_data=False)
+        with self.store.writer.connection() as conn:
+            self._load(conn)
+        # _position — последнее переданное на запись событие, _acknowledged — последнее записанное
+        self._position = self.memory.register_consumer(WRITE_BEHIND_CONSUMER, from_latest=True)
+        self._acknowledged = self._position
+        # Ошибка синхронной записи: модель опередила базу, операции больше не принимаются
+        self._failure: Optional[Exception] = None
+        # Операции модели выполняются по одной, чтобы события уходили в SQLite в порядке модели
+        self._lock = threading.Lock()
+        self.write_behind = WriteBehindQueue(self, self._position, max_batch) if durability == 'group' else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Дописать накопленные изменения и закрыть базу"""
+        if self.write_behind:
+            self.write_behind.close()
+        self.store.close()
+
+    def flush(self):
+        """Дождаться записи в SQLite всех выполненных операций"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self.write_behind:
+            self.write_behind.flush()
+            self._acknowledge_persisted()
+            # Ошибка передается один раз; система после нее все равно не принимает операции
+            error, self.write_behind.error = self.write_behind.error, None
+            if error:
+                raise error
+
+    def _check_failure(self):
+        failure = self._failure or (self.write_behind and self.write_behind.failure)
+        if failure:
+            raise RuntimeError(f"Изменения не записаны в SQLite, система не принимает операции: {failure}") \
+                from failure
+
+    def _load(self, conn: sqlite3.Connection):
+        memory = self.memory
+        for movie_id, title, genre, duration, rating in conn.execute(
+                'SELECT id, title, genre, duration, rating FROM movies ORDER BY id'):
+            memory.next_movie_id = movie_id
+            memory.add_movie(title, genre, duration, rating)
+
+        cursor = conn.cursor()
+        for screening_id, movie_id, screening_time, hall_number, price, available_seats, bits in conn.execute(
+                _LOAD_SCREENINGS).fetchall():
+            memory.next_screening_id = screening_id
+            memory.add_screening(movie_id, parse_datetime(screening_time), hall_number, price, available_seats)
+            if bits is not None:
+                memory.seat_maps[screening_id] = SeatMap(*hall_layout(hall_number), bits)
+            elif available_seats < memory._hall_capacity(hall_number):
+                # Карта не сохранялась: места восстанавливаются по билетам, как в SQLite-системе
+                memory.seat_maps[screening_id] = self.store._load_seat_map(cursor, screening_id)
+
+        for ticket_id, screening_id, name, email, seat, purchase_time, total_price in conn.execute(_LOAD_TICKETS):
+            memory.next_ticket_id = ticket_id
+            memory.add_ticket(screening_id, name, email, seat, parse_datetime(purchase_time), total_price)
+
+        # Удержания прошлого запуска продолжают действовать до своего срока
+        for hold_id, screening_id, seats, expires_at in conn.execute(
+                'SELECT id, screening_id, seats, expires_at FROM holds'):
+            hold = Hold(hold_id, screening_id, parse_seats(seats), expires_at)
+            memory.holds[hold_id] = hold
+            memory.hold_wheel.schedule(hold_id, expires_at)
+            memory.screenings_by_id[screening_id].available_seats -= len(hold.seats)
+        memory.next_hold_id = conn.execute(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'holds'), 0) + 1").fetchone()[0]
+
+    def _drain(self):
+        """Передать события модели, накопленные последней операцией, на запись в SQLite.
+
+        События подтверждаются в модели только после фиксации в SQLite: до этого они остаются в ее потоке.
+        """
+        if self.write_behind:
+            self._acknowledge_persisted()
+        events = self.memory.read_changes(self._position, len(self.memory.outbox))
+        if not events:
+            return
+        self._position = events[-1].seq
+        if self.write_behind:
+            self.write_behind.submit(events)
+            return
+        try:
+            self._persist(events)
+        except Exception as e:
+            self._failure = e
+            raise
+        self.memory.ack_changes(WRITE_BEHIND_CONSUMER, self._position)
+        self._acknowledged = self._position
+
+    def _acknowledge_persisted(self):
+        # Поток записи только отмечает записанную позицию: поток модели меняется под self._lock
+        persisted = self.write_behind.persisted
+        if persisted > self._acknowledged:
+            self.memory.ack_changes(WRITE_BEHIND_CONSUMER, persisted)
+            self._acknowledged = persisted
+
+    def _persist(self, events: List[ChangeEvent]):
+        self.store._write_transaction(lambda cursor: self._apply(cursor, events))
+
+    def _apply(self, cursor: sqlite3.Cursor, events: List[ChangeEvent]):
+        """Повторить события модели в открытой транзакции SQLite.
+
+        Места и номера удержаний уже выбраны моделью, поэтому база получает те же карты мест,
+        а SQLite-поток изменений — те же события.
+        """
+        store = self.store
+        changed_movies = set()
+        for event in events:
+            payload = event.payload
+            screening_id = event.screening_id
+            seats = payload['seats']
+            hold_id = payload.get('hold_id')
+            if event.event == EVENT_PURCHASE:
+                if hold_id is None:
+                    self._claim_seats(cursor, screening_id, seats, changed_movies)
+                else:
+                    cursor.execute('DELETE FROM holds WHERE id = ?', (hold_id,))
+                store._insert_tickets(cursor, screening_id, payload['customer_name'], payload['customer_email'],
+                                      seats, payload['price'], hold_id)
+            elif event.event == EVENT_HOLD:
+                self._claim_seats(cursor, screening_id, seats, changed_movies)
+                cursor.execute('INSERT INTO holds (id, screening_id, seats, seat_count, expires_at) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (hold_id, screening_id, format_seats(seats), len(seats), payload['expires_at']))
+                cursor.execute(INSERT_EVENT, event_row(EVENT_HOLD, screening_id, hold_id=hold_id, seats=seats,
+                                                       expires_at=payload['expires_at']))
+            else:
+                # EVENT_HOLD_RELEASED и EVENT_HOLD_EXPIRED
+                cursor.execute('DELETE FROM holds WHERE id = ?', (hold_id,))
+                store._release_seats(cursor, screening_id, seats, changed_movies)
+                cursor.execute(INSERT_EVENT, event_row(event.event, screening_id, hold_id=hold_id, seats=seats))
+
+    def _claim_seats(self, cursor: sqlite3.Cursor, screening_id: int, seats: List[int], changed_movies: set):
+        if not self.store._claim_seats(cursor, screening_id, len(seats), seats, changed_movies):
+            raise ValueError(f"Места {seats} сеанса {screening_id} в базе уже заняты")
+
+    def _call(self, method, *args):
+        # Чтение тоже может изменить модель: истекшие удержания снимаются при просмотре афиши
+        with self._lock:
+            self._check_failure()
+            result = method(*args)
+            self._drain()
+            return result
+
+    def add_movie(self, title: str, genre: str, duration: int, rating: float) -> Movie:
+        """Добавить фильм (сразу в базу: id выдает SQLite)"""
+        with self._lock:
+            self._check_failure()
+            self._flush()
+            self.memory.next_movie_id = self.store.add_movie(title, genre, duration, rating)
+            return self.memory.add_movie(title, genre, duration, rating)
+
+    def add_screening(self, movie_id: int, screening_time: datetime.datetime, hall_number: int,
+                      price: float, available_seats: int) -> Screening:
+        """Добавить сеанс (сразу в базу: id выдает SQLite)"""
+        with self._lock:
+            self._check_failure()
+            self._flush()
+            self.memory.next_screening_id = self.store.add_screening(movie_id, screening_time, hall_number, price,
+                                                                     available_seats)
+            return self.memory.add_screening(movie_id, screening_time, hall_number, price, available_seats)
+
+    def get_available_movies(self) -> List[Movie]:
+        """Получить список доступных фильмов"""
+        return self._call(self.memory.get_available_movies)
+
+    def get_screenings_by_movie(self, movie_id: int) -> List[Screening]:
+        """Получить сеансы для конкретного фильма"""
+        return self._call(self.memory.get_screenings_by_movie, movie_id)
+
+    def search_movies(self, query: Optional[str] = None, genre: Optional[str] = None, limit: int = 50) -> List[Movie]:
+        """Поиск фильмов по словам названия и жанра и по жанру"""
+        return self._call(self.memory.search_movies, query, genre, limit)
+
+    def search_screenings(self, query: Optional[str] = None, genre: Optional[str] = None,
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                          hall_number: Optional[int] = None, min_free_seats: int = 1,
+                          limit: int = 100) -> List[Screening]:
+        """Предстоящие сеансы по фильтрам, по времени сеанса"""
+        return self._call(self.memory.search_screenings, query, genre, min_price, max_price, start, end,
+                          hall_number, min_free_seats, limit)
+
+    def get_seat_map(self, screening_id: int) -> Optional[SeatMap]:
+        """Получить карту мест сеанса"""
+        return self._call(self.memory.get_seat_map, screening_id)
+
+    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+                        seat_numbers: Optional[List[int]] = None) -> bool:
+        """Покупка билетов: места выбираются в памяти, запись в базу — по режиму durability"""
+        return self._call(self.memory.purchase_ticket, screening_id, customer_name, customer_email, seat_count,
+                          seat_numbers)
+
+    def purchase_tickets_bulk(self, orders: List[tuple]) -> List[bool]:
+        """Пакетная покупка; в базу записывается одной транзакцией"""
+        return self._call(self.memory.purchase_tickets_bulk, orders)
+
+    def hold_seats(self, screening_id: int, seat_count: int = 1, seat_numbers: Optional[List[int]] = None,
+                   ttl: float = DEFAULT_HOLD_TTL) -> Optional[int]:
+        """Удержать места на ttl секунд; возвращает id удержания или None"""
+        return self._call(self.memory.hold_seats, screening_id, seat_count, seat_numbers, ttl)
+
+    def confirm_hold(self, hold_id: int, customer_name: str, customer_email: str) -> bool:
+        """Купить удержанные места; False, если удержание истекло или уже снято"""
+        return self._call(self.memory.confirm_hold, hold_id, customer_name, customer_email)
+
+    def release_hold(self, hold_id: int) -> bool:
+        """Снять удержание и освободить места"""
+        return self._call(self.memory.release_hold, hold_id)
+
+    def expire_holds(self) -> int:
+        """Снять удержания с истекшим сроком"""
+        return self._call(self.memory.expire_holds)
+
+    def get_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """Загрузка залов и выручка по счетчикам в памяти"""
+        return self._call(self.memory.get_sales_report, group_by, start, end)
+
+    def recompute_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """То же, что get_sales_report, но по сеансам и билетам модели"""
+        return self._call(self.memory.recompute_sales_report, group_by, start, end)
+
+    def get_ticket_history(self, customer_email: str) -> List[Dict]:
+        """Получить историю покупок"""
+        return self._call(self.memory.get_ticket_history, customer_email)
+
+    def get_ticket_history_page(self, customer_email: str, page_size: int = 50, cursor: Optional[str] = None) -> Dict:
+        """Страница истории покупок (курсор — как у систем в памяти и SQLite)"""
+        return self._call(self.memory.get_ticket_history_page, customer_email, page_size, cursor)
+
+    def iter_ticket_history(self, customer_email: str, batch_size: int = 500) -> Iterator[Dict]:
+        """История покупок по частям; каждая страница читается под блокировкой, как и остальные чтения"""
+        cursor = None
+        while True:
+            page = self.get_ticket_history_page(customer_email, batch_size, cursor)
+            yield from page['tickets']
+            cursor = page['next_cursor']
+            if not cursor:
+                return
+
+    # Поток изменений для внешних потребителей читается из базы: в нем только записанные изменения
+    def register_consumer(self, consumer: str, from_latest: bool = False) -> int:
+        return self.store.register_consumer(consumer, from_latest)
+
+    def consumer_position(self, consumer: str) -> Optional[int]:
+        return self.store.consumer_position(consumer)
+
+    def read_changes(self, after: int = 0, limit: int = 1000) -> List[ChangeEvent]:
+        return self.store.read_changes(after, limit)
+
+    def ack_changes(self, consumer: str, position: int) -> int:
+        return self.store.ack_changes(consumer, position)
+
+def hybrid_experiment(purchases: int = 5000, reads: int = 5000, db_name: str = "cinema_hybrid.db"):
+    """Покупки и чтение в режимах sync и group по сравнению с SQLite-системой; проверка состояния после перезапуска"""
+    def state(system) -> tuple:
+        history = system.get_ticket_history("hybrid7@test.com")
+        return [(entry['ticket_id'], entry['seat_number']) for entry in history], system.get_sales_report('movie')
+
+    print("=== ГИБРИДНАЯ СИСТЕМА: ПАМЯТЬ + ОТЛОЖЕННАЯ ЗАПИСЬ В SQLITE ===")
+    try:
+        for name, factory in (('sqlite', lambda: CinemaTicketSystemSQLite(db_name)),
+                              ('hybrid/sync', lambda: CinemaTicketSystemHybrid(db_name, durability='sync')),
+                              ('hybrid/group', lambda: CinemaTicketSystemHybrid(db_name, durability='group'))):
+            remove_database(db_name)
+            rng = random.Random(42)
+            orders = [(rng.randint(1, 140), f"Hybrid{i}", f"hybrid{i % 50}@test.com", rng.randint(1, 2))
+                      for i in range(purchases)]
+            system = factory()
+            started = time.perf_counter()
+            successful = sum(system.purchase_ticket(*order) for order in orders)
+            purchase_us = (time.perf_counter() - started) / purchases * 1e6
+            started = time.perf_counter()
+            if hasattr(system, 'flush'):
+                system.flush()
+            flush_ms = (time.perf_counter() - started) * 1e3
+            started = time.perf_counter()
+            for _ in range(reads):
+                system.get_available_movies()
+            read_us = (time.perf_counter() - started) / reads * 1e6
+            before = state(system)
+            system.close()
+
+            started = time.perf_counter()
+            system = factory()
+            load_ms = (time.perf_counter() - started) * 1e3
+            same = state(system) == before
+            system.close()
+            print(f"{name:<13} покупка {purchase_us:6.1f} мкс (успешных {successful}), дозапись {flush_ms:6.1f} мс, "
+                  f"афиша {read_us:6.1f} мкс, запуск {load_ms:6.1f} мс, состояние после перезапуска "
+                  f"{'совпадает' if same else 'НЕ СОВПАДАЕТ'}")
+    finally:
+        remove_database(db_name)
+
+if __name__ == "__main__":
+    hybrid_experiment()
@@ -1,58 +1,486 @@
 import sqlite3
 import datetime
-from typing import List, Dict, Optional
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Set
+from urllib.request import pathname2url
+
+from cinema_archive import SCREENINGS_ARCHIVE_TABLE, TICKETS_ARCHIVE_TABLE, archive_batch
+from cinema_analytics import (ADD_SALE, ADD_SCREENING_SALES, REBUILD_SALES_DAILY, SALES_DAILY_TABLE,
+                              rebuild_sales_counters, recompute_sales_report, sales_report)
+from cinema_cache import QueryCache
+from cinema_holds import DEFAULT_HOLD_TTL, HOLDS_TABLE, TimingWheel, format_seats, parse_seats
+from cinema_instrumentation import Instrumentation, TracedConnection
+from cinema_outbox import (EVENT_HOLD, EVENT_HOLD_EXPIRED, EVENT_HOLD_RELEASED, EVENT_PURCHASE, INSERT_EVENT,
+                           OUTBOX_CONSUMERS_TABLE, OUTBOX_TABLE, ChangeEvent, acknowledge, consumer_position,
+                           event_row, read_events, register_consumer)
+from cinema_pagination import decode_cursor, encode_cursor
+from cinema_rows import (ROW_MODES, HistoryRow, MovieRow, ScreeningRow, SearchScreeningRow, check_row_mode, convert_rows,
+                         prepare_cursor, to_epoch)
+from cinema_search import MOVIES_FTS_TABLE, MOVIES_FTS_TRIGGERS, REBUILD_MOVIES_FTS, fts_query
+from cinema_seat_map import SeatMap, DEFAULT_HALL
+
+# Размер кэша подготовленных запросов на соединение (у модуля sqlite3 по умолчанию 128)
+DEFAULT_STATEMENT_CACHE_SIZE = 256
+
+# PRAGMA, которые применяются один раз при открытии каждого соединения пула
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # 16 МБ страничного кэша на соединение
+    'mmap_size': 268435456,  # 256 МБ
+    'temp_store': 'MEMORY',
+}
+
+def _is_busy_error(error: sqlite3.OperationalError) -> bool:
+    """Ошибка вызвана блокировкой базы другим соединением (SQLITE_BUSY / SQLITE_LOCKED)"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+class ConnectionPool:
+    """Ограниченный пул постоянных соединений с базой данных"""
+
+    def __init__(self, db_name: str, size: int = 4, pragmas: Optional[Dict] = None, timeout: float = 30.0,
+                 readonly: bool = False, instrumentation: Optional[Instrumentation] = None,
+                 cached_statements: int = DEFAULT_STATEMENT_CACHE_SIZE):
+        self.db_name = db_name
+        self.size = size
+        # Подготовленные запросы кэшируются по тексту SQL, поэтому текст запросов постоянный
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pragmas or {})
+        self.timeout = timeout
+        self.readonly = readonly
+        # При инструментировании соединения измеряют время каждого запроса
+        self.instrumentation = instrumentation
+        self.factory = TracedConnection if instrumentation else sqlite3.Connection
+        if readonly:
+            # Режим журнала задает соединение-писатель, читатель его изменить не может
+            self.pragmas.pop('journal_mode', None)
+        # LIFO: чаще всего выдается последнее использованное соединение с "горячим" кэшем
+        self._idle = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+        # Выданные соединения: при закрытии пула они закрываются только после возврата
+        self._checked_out: Set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = f'file:{pathname2url(os.path.abspath(self.db_name))}?mode=ro'
+            conn = sqlite3.connect(uri, timeout=self.timeout, check_same_thread=False, uri=True, factory=self.factory,
+                                   cached_statements=self.cached_statements)
+        else:
+            conn = sqlite3.connect(self.db_name, timeout=self.timeout, check_same_thread=False, factory=self.factory,
+                                   cached_statements=self.cached_statements)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.instrumentation:
+            conn.instrumentation = self.instrumentation
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Взять соединение из пула (при необходимости открыв новое)"""
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Пул соединений закрыт")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if len(self._connections) < self.size:
+                    conn = self._connect()
+                    self._connections.append(conn)
+            if conn is not None:
+                self._checked_out.add(conn)
+                return conn
+        
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Нет свободных соединений в пуле")
+        with self._lock:
+            if conn is None:
+                # Метка закрытия пула возвращается в очередь для остальных ожидающих потоков
+                self._idle.put(None)
+                raise sqlite3.ProgrammingError("Пул соединений закрыт")
+            self._checked_out.add(conn)
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Вернуть соединение в пул (после закрытия пула соединение закрывается)"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._checked_out.discard(conn)
+            if not self._closed:
+                self._idle.put(conn)
+                return
+            self._connections.remove(conn)
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер для временного использования соединения"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Закрыть пул: свободные соединения закрываются сразу, выданные — при возврате"""
+        with self._lock:
+            self._closed = True
+            idle = []
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if conn is not None:
+                    idle.append(conn)
+            # Метка закрытия будит потоки, ожидающие свободное соединение
+            self._idle.put(None)
+            for conn in idle:
+                self._connections.remove(conn)
+        for conn in idle:
+            conn.close()
+
+# Миграции схемы: версия N получается применением MIGRATIONS[N - 1] к версии N - 1.
+# Уже выпущенные миграции не меняются, новые добавляются в конец списка.
+MIGRATIONS = [
+    # 1: исходные таблицы (IF NOT EXISTS — чтобы принять базы, созданные до миграций)
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            genre TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            rating REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS screenings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            screening_time DATETIME NOT NULL,
+            hall_number INTEGER NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            available_seats INTEGER NOT NULL,
+            FOREIGN KEY (movie_id) REFERENCES movies (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            screening_id INTEGER NOT NULL,
+            customer_name TEXT NOT NULL,
+            customer_email TEXT NOT NULL,
+            seat_number INTEGER NOT NULL,
+            purchase_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            total_price DECIMAL(10,2) NOT NULL,
+            FOREIGN KEY (screening_id) REFERENCES screenings (id)
+        )
+        ''',
+    ),
+    # 2: индексы для истории покупок и поиска сеансов
+    (
+        # История покупок: поиск по email и сортировка по времени покупки без отдельной сортировки
+        'CREATE INDEX IF NOT EXISTS idx_tickets_email_time ON tickets (customer_email, purchase_time)',
+        'CREATE INDEX IF NOT EXISTS idx_tickets_screening ON tickets (screening_id)',
+        # Сеансы фильма, упорядоченные по времени
+        'CREATE INDEX IF NOT EXISTS idx_screenings_movie_time ON screenings (movie_id, screening_time)',
+        # Покрывающий индекс для поиска фильмов с будущими сеансами
+        'CREATE INDEX IF NOT EXISTS idx_screenings_time_movie ON screenings (screening_time, movie_id)',
+    ),
+    # 3: схемы залов и карта мест сеанса (битовая маска, NULL — карта еще не создавалась)
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS halls (
+            number INTEGER PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            seats_per_row INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO halls (number, rows, seats_per_row) VALUES (1, 10, 10), (2, 10, 10), (3, 10, 10)',
+        'ALTER TABLE screenings ADD COLUMN seat_map BLOB',
+    ),
+    # 4: счетчики продаж по дням, залам и фильмам (заполняются по уже имеющимся данным)
+    (
+        SALES_DAILY_TABLE,
+        REBUILD_SALES_DAILY,
+    ),
+    # 5: удержания мест на время оплаты
+    (
+        HOLDS_TABLE,
+        # Поиск истекших удержаний — диапазон по сроку
+        'CREATE INDEX IF NOT EXISTS idx_holds_expires ON holds (expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_holds_screening ON holds (screening_id)',
+    ),
+    # 6: время сеанса и покупки в секундах эпохи (текстовые колонки остаются для вывода и отчетов),
+    # индексы по времени начала и архив прошедших сеансов. Время сеанса записано местным временем
+    # (модификатор 'utc' переводит его в UTC), время покупки — CURRENT_TIMESTAMP, то есть уже в UTC
+    (
+        'ALTER TABLE screenings ADD COLUMN starts_at INTEGER',
+        "UPDATE screenings SET starts_at = CAST(strftime('%s', screening_time, 'utc') AS INTEGER)",
+        'ALTER TABLE tickets ADD COLUMN purchased_at INTEGER',
+        "UPDATE tickets SET purchased_at = CAST(strftime('%s', purchase_time) AS INTEGER)",
+        # Предстоящие сеансы фильма и поиск фильмов с будущими сеансами — диапазон по целому числу
+        'DROP INDEX IF EXISTS idx_screenings_movie_time',
+        'CREATE INDEX IF NOT EXISTS idx_screenings_movie_starts ON screenings (movie_id, starts_at)',
+        'CREATE INDEX IF NOT EXISTS idx_screenings_starts_movie ON screenings (starts_at, movie_id)',
+        SCREENINGS_ARCHIVE_TABLE,
+        TICKETS_ARCHIVE_TABLE,
+        'CREATE INDEX IF NOT EXISTS idx_tickets_archive_email_time ON tickets_archive (customer_email, purchase_time)',
+        'CREATE INDEX IF NOT EXISTS idx_tickets_archive_screening ON tickets_archive (screening_id)',
+        'CREATE INDEX IF NOT EXISTS idx_screenings_archive_time ON screenings_archive (screening_time)',
+    ),
+    # 7: поиск фильмов (FTS5 по названию и жанру) и индексы фильтров поиска сеансов
+    (
+        MOVIES_FTS_TABLE,
+        *MOVIES_FTS_TRIGGERS,
+        REBUILD_MOVIES_FTS,
+        'CREATE INDEX IF NOT EXISTS idx_movies_genre ON movies (genre)',
+        'CREATE INDEX IF NOT EXISTS idx_screenings_hall_starts ON screenings (hall_number, starts_at)',
+    ),
+    # 8: поток изменений (outbox) и позиции его потребителей
+    (
+        OUTBOX_TABLE,
+        OUTBOX_CONSUMERS_TABLE,
+    ),
+]
+
+# Запросы чтения; колонки названы как поля MovieRow, ScreeningRow и HistoryRow.
+# Параметр «сейчас» — int(time.time()), сравнивается с starts_at.
+AVAILABLE_MOVIES_QUERY = '''
+    SELECT DISTINCT m.id, m.title, m.genre, m.duration, m.rating 
+    FROM movies m 
+    JOIN screenings s ON m.id = s.movie_id 
+    WHERE s.starts_at > ?
+    ORDER BY m.rating DESC
+'''
+
+AVAILABLE_MOVIES_EXPIRY_QUERY = '''
+    SELECT MIN(last_start)
+    FROM (
+        SELECT MAX(starts_at) AS last_start
+        FROM screenings
+        WHERE starts_at > ?
+        GROUP BY movie_id
+    )
+'''
+
+SCREENINGS_BY_MOVIE_QUERY = '''
+    SELECT s.id, s.screening_time, s.hall_number, s.price, s.available_seats
+    FROM screenings s
+    WHERE s.movie_id = ? AND s.starts_at > ?
+    ORDER BY s.starts_at
+'''
+
+# История покупок охватывает рабочие и архивные таблицы; билет и его сеанс всегда
+# в одной паре таблиц. Параметры условия повторяются для каждой части.
+def _history_query(condition: str = '', limit: str = '') -> str:
+    parts = [f'''
+        SELECT t.id AS ticket_id, m.title AS movie_title, s.screening_time, s.hall_number, t.seat_number,
+               t.total_price, t.purchase_time
+        FROM {tickets} t
+        JOIN {screenings} s ON t.screening_id = s.id
+        JOIN movies m ON s.movie_id = m.id
+        WHERE t.customer_email = ? {condition}
+    ''' for tickets, screenings in (('tickets', 'screenings'), ('tickets_archive', 'screenings_archive'))]
+    return ' UNION ALL '.join(parts) + f'ORDER BY purchase_time DESC, ticket_id DESC {limit}'
+
+HISTORY_QUERY = _history_query()
+HISTORY_PAGE_QUERY = _history_query(limit='LIMIT ?')
+HISTORY_PAGE_AFTER_QUERY = _history_query('AND (t.purchase_time, t.id) < (?, ?)', 'LIMIT ?')
+
+def _purchase_event(screening_id: int, customer_name: str, customer_email: str, seats: List[int], price: float,
+                    hold_id: Optional[int] = None) -> tuple:
+    payload = dict(customer_name=customer_name, customer_email=customer_email, seats=seats, price=price)
+    if hold_id is not None:
+        payload['hold_id'] = hold_id
+    return event_row(EVENT_PURCHASE, screening_id, **payload)
+
+class PurchaseBatcher:
+    """Групповая фиксация покупок: заказы из разных потоков собираются в пакет
+    и записываются одной транзакцией (одним fsync) в отдельном потоке"""
+
+    def __init__(self, system: 'CinemaTicketSystemSQLite', max_batch: int = 256, max_delay: float = 0.0):
+        self.system = system
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        # Постановка в очередь и закрытие упорядочены: после метки остановки заказы не ставятся
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="purchase-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        """Принимает ли групповая фиксация заказы"""
+        return not self._closed and self._thread.is_alive()
+
+    def submit(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+               seat_numbers: Optional[List[int]] = None) -> Future:
+        """Поставить заказ в очередь; результат (bool) будет в Future.
+        
+        После закрытия или остановки потока заказ сразу отклоняется (ProgrammingError).
+        """
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise sqlite3.ProgrammingError("Групповая фиксация остановлена")
+            self._queue.put(((screening_id, customer_name, customer_email, seat_count, seat_numbers), future))
+        return future
+
+    def close(self):
+        """Дописать накопленные заказы и остановить поток"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            self._process()
+        finally:
+            # Поток завершился (в том числе из-за ошибки): заказы, оставшиеся в очереди, не ждут вечно
+            with self._lock:
+                self._closed = True
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(sqlite3.ProgrammingError("Групповая фиксация остановлена"))
+
+    def _process(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            # Пока фиксируется предыдущий пакет, в очереди копятся следующие заказы;
+            # max_delay позволяет дополнительно подождать новых заказов
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            try:
+                results = self.system.purchase_tickets_bulk([order for order, _ in batch])
+            except Exception as e:
+                # Ошибка пакета передается его заказам, следующие пакеты записываются как обычно
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            if stop:
+                return
 
 class CinemaTicketSystemSQLite:
-    def __init__(self, db_name: str = "cinema.db"):
+    def __init__(self, db_name: str = "cinema.db", pool_size: int = 4, pragmas: Optional[Dict] = None,
+                 max_retries: int = 5, retry_delay: float = 0.01, group_commit: bool = False,
+                 readonly: bool = False, cache_size: int = 0, cache_ttl: float = 30.0, sample_data: bool = True,
+                 instrumentation: Optional[Instrumentation] = None, row_mode: str = 'dict',
+                 statement_cache_size: int = DEFAULT_STATEMENT_CACHE_SIZE):
         self.db_name = db_name
-        self.init_database()
+        # Формат строк результатов чтения (см. cinema_rows.ROW_MODES)
+        self.row_mode = check_row_mode(row_mode)
+        # Кэш результатов просмотра афиши; сбрасывается покупками этого экземпляра
+        # (cache_size=0 — без кэша)
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # Все записи идут через одно соединение-писатель: SQLite допускает одного писателя,
+        # и покупки ждут в очереди пула, а не повторяют транзакцию после SQLITE_BUSY
+        self.writer = ConnectionPool(db_name, 1, pragmas, readonly=readonly, instrumentation=instrumentation,
+                                     cached_statements=statement_cache_size)
+        # Просмотр афиши, история и отчеты читают через пул соединений mode=ro: в режиме WAL
+        # читатели не ждут писателя и видят последнее зафиксированное состояние
+        self.readers = ConnectionPool(db_name, pool_size, pragmas, readonly=True, instrumentation=instrumentation,
+                                      cached_statements=statement_cache_size)
+        # Сроки удержаний, созданных этим экземпляром: по ним чтение афиши снимает
+        # истекшие удержания, не опрашивая таблицу holds
+        self.hold_wheel = TimingWheel()
+        # Экземпляр только для чтения работает с базой, уже созданной писателем
+        if not readonly:
+            self.init_database(sample_data)
+        # При групповой фиксации покупки из разных потоков объединяются в одну транзакцию
+        self.batcher = PurchaseBatcher(self) if group_commit else None
+        # Инструментирование (задержки методов и SQL-запросов) включается только явно
+        self.instrumentation = instrumentation
+        if instrumentation:
+            instrumentation.attach(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """Закрыть соединения с базой данных"""
+        if self.batcher:
+            self.batcher.close()
+        # Писатель закрывается последним: соединение mode=ro не может выполнить
+        # контрольную точку и удалить файлы -wal/-shm при закрытии
+        self.readers.close()
+        self.writer.close()
     
-    def init_database(self):
+    def init_database(self, sample_data: bool = True):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Создание таблиц
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS movies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                genre TEXT NOT NULL,
-                duration INTEGER NOT NULL,
-                rating REAL NOT NULL
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS screenings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                movie_id INTEGER NOT NULL,
-                screening_time DATETIME NOT NULL,
-                hall_number INTEGER NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                available_seats INTEGER NOT NULL,
-                FOREIGN KEY (movie_id) REFERENCES movies (id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tickets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                screening_id INTEGER NOT NULL,
-                customer_name TEXT NOT NULL,
-                customer_email TEXT NOT NULL,
-                seat_number INTEGER NOT NULL,
-                purchase_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                total_price DECIMAL(10,2) NOT NULL,
-                FOREIGN KEY (screening_id) REFERENCES screenings (id)
-            )
-        ''')
-        
-        # Добавление тестовых данных
-        self.add_sample_data(cursor)
+        with self.writer.connection() as conn:
+            self.migrate(conn)
+            
+            # Тестовые данные добавляются только в пустую базу
+            if sample_data and conn.execute('SELECT 1 FROM movies LIMIT 1').fetchone() is None:
+                self.add_sample_data(conn.cursor())
+                conn.commit()
+    
+    def migrate(self, conn: sqlite3.Connection):
+        """Применить недостающие миграции схемы"""
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        if self._schema_version(conn) >= len(MIGRATIONS):
+            return
         
-        conn.commit()
-        conn.close()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Версию перечитываем под блокировкой: базу мог обновить другой процесс
+            for version in range(self._schema_version(conn) + 1, len(MIGRATIONS) + 1):
+                for statement in MIGRATIONS[version - 1]:
+                    conn.execute(statement)
+                conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def _schema_version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
     
     def add_sample_data(self, cursor):
         """Добавление тестовых данных"""
@@ -83,132 +511,818 @@ class CinemaTicketSystemSQLite:
                         screening_time,
                         (movie_id % 3) + 1,  # Залы 1-3
                         350 + (movie_id * 50),  # Цена
-                        100  # Доступные места
+                        100,  # Доступные места
+                        to_epoch(screening_time)
                     ))
         
         cursor.executemany(
-            'INSERT OR IGNORE INTO screenings (movie_id, screening_time, hall_number, price, available_seats) VALUES (?, ?, ?, ?, ?)',
+            'INSERT OR IGNORE INTO screenings (movie_id, screening_time, hall_number, price, available_seats, starts_at) VALUES (?, ?, ?, ?, ?, ?)',
             screening_times
         )
+        rebuild_sales_counters(cursor.connection)
+    
+    def add_movie(self, title: str, genre: str, duration: int, rating: float) -> int:
+        """Добавить фильм; возвращает его id"""
+        cursor = self._write_transaction(lambda cursor: cursor.execute(
+            'INSERT INTO movies (title, genre, duration, rating) VALUES (?, ?, ?, ?)',
+            (title, genre, duration, rating)
+        ))
+        return cursor.lastrowid
+    
+    def add_screening(self, movie_id: int, screening_time: datetime.datetime, hall_number: int,
+                      price: float, available_seats: int) -> int:
+        """Добавить сеанс; возвращает его id"""
+        def insert(cursor):
+            cursor.execute(
+                'INSERT INTO screenings (movie_id, screening_time, hall_number, price, available_seats, starts_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (movie_id, screening_time, hall_number, price, available_seats, to_epoch(screening_time))
+            )
+            screening_id = cursor.lastrowid
+            cursor.execute(ADD_SCREENING_SALES, (screening_id,))
+            return screening_id
+        
+        screening_id = self._write_transaction(insert)
+        self._invalidate_movies([movie_id])
+        if self.cache:
+            self.cache.invalidate(('available_movies',))
+        return screening_id
+    
+    def _cached(self, key: tuple, compute) -> list:
+        """Результат из кэша или compute(conn) -> (результат, момент устаревания или None)"""
+        if self.cache is None:
+            with self.readers.connection() as conn:
+                return list(compute(conn)[0])
+        result = self.cache.get(key)
+        if result is not None:
+            return list(result)
+        
+        # Покупка, зафиксированная между чтением и put, сбросит ключ: тогда результат не кэшируется
+        generation = self.cache.generation(key)
+        with self.readers.connection() as conn:
+            result, expires_at = compute(conn)
+        self.cache.put(key, result, expires_at, generation)
+        return list(result)
+    
+    def _invalidate_movies(self, movie_ids):
+        if self.cache:
+            for movie_id in movie_ids:
+                self.cache.invalidate(('screenings', movie_id))
     
     def get_available_movies(self) -> List[Dict]:
         """Получить список доступных фильмов"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        self._expire_due_holds()
+        return self._cached(('available_movies',), self._query_available_movies)
+    
+    def _query_available_movies(self, conn: sqlite3.Connection):
+        cursor = prepare_cursor(conn.cursor(), self.row_mode)
+        now = int(time.time())
+        movies = convert_rows(cursor.execute(AVAILABLE_MOVIES_QUERY, (now,)).fetchall(), MovieRow, self.row_mode)
         
-        cursor.execute('''
-            SELECT DISTINCT m.id, m.title, m.genre, m.duration, m.rating 
-            FROM movies m 
-            JOIN screenings s ON m.id = s.movie_id 
-            WHERE s.screening_time > datetime('now')
-            ORDER BY m.rating DESC
-        ''')
-        
-        movies = []
-        for row in cursor.fetchall():
-            movies.append({
-                'id': row[0],
-                'title': row[1],
-                'genre': row[2],
-                'duration': row[3],
-                'rating': row[4]
-            })
+        expires_at = None
+        if self.cache is not None:
+            # Фильм пропадет из списка, когда начнется его последний сеанс
+            expires_at = cursor.execute(AVAILABLE_MOVIES_EXPIRY_QUERY, (now,)).fetchone()[0]
         
-        conn.close()
-        return movies
+        return movies, expires_at
     
     def get_screenings_by_movie(self, movie_id: int) -> List[Dict]:
         """Получить сеансы для конкретного фильма"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        self._expire_due_holds()
+        return self._cached(('screenings', movie_id), lambda conn: self._query_screenings_by_movie(conn, movie_id))
+    
+    def _query_screenings_by_movie(self, conn: sqlite3.Connection, movie_id: int):
+        cursor = prepare_cursor(conn.cursor(), self.row_mode)
+        rows = cursor.execute(SCREENINGS_BY_MOVIE_QUERY, (movie_id, int(time.time()))).fetchall()
+        
+        # Результат устаревает с началом первого сеанса из списка
+        expires_at = to_epoch(rows[0][1]) if rows and self.cache is not None else None
+        return convert_rows(rows, ScreeningRow, self.row_mode), expires_at
+    
+    def search_movies(self, query: Optional[str] = None, genre: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Поиск фильмов с предстоящими сеансами со свободными местами по словам названия и жанра и по жанру.
+        
+        Каждое слово query ищется как начало слова (индекс FTS5), нужны все слова.
+        Результат — по убыванию рейтинга, как у get_available_movies.
+        """
+        self._expire_due_holds()
+        conditions = ['EXISTS (SELECT 1 FROM screenings s WHERE s.movie_id = m.id AND s.starts_at > ? '
+                      'AND s.available_seats > 0)']
+        params = [int(time.time())]
+        match = fts_query(query)
+        if match:
+            conditions.append('m.id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?)')
+            params.append(match)
+        if genre is not None:
+            conditions.append('m.genre = ?')
+            params.append(genre)
+        params.append(limit)
+        
+        with self.readers.connection() as conn:
+            rows = prepare_cursor(conn.cursor(), self.row_mode).execute(f'''
+                SELECT m.id, m.title, m.genre, m.duration, m.rating
+                FROM movies m
+                WHERE {' AND '.join(conditions)}
+                ORDER BY m.rating DESC, m.id
+                LIMIT ?
+            ''', params).fetchall()
+        return convert_rows(rows, MovieRow, self.row_mode)
+    
+    def search_screenings(self, query: Optional[str] = None, genre: Optional[str] = None,
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                          hall_number: Optional[int] = None, min_free_seats: int = 1,
+                          limit: int = 100) -> List[Dict]:
+        """Предстоящие сеансы по фильтрам: слова названия и жанра фильма, жанр, цена
+        [min_price, max_price], время сеанса в окне [start, end), зал и число свободных мест.
+        
+        Окно по времени и зал выбираются по индексам screenings, фильмы — по FTS5 и индексу жанров.
+        Результат упорядочен по времени сеанса.
+        """
+        self._expire_due_holds()
+        # Порядок условий постоянный: одинаковые наборы фильтров дают один и тот же текст запроса
+        conditions = ['s.starts_at > ?']
+        params = [int(time.time())]
+        for condition, value in (('s.starts_at >= ?', to_epoch(start) if start is not None else None),
+                                 ('s.starts_at < ?', to_epoch(end) if end is not None else None),
+                                 ('s.hall_number = ?', hall_number),
+                                 ('s.price >= ?', min_price),
+                                 ('s.price <= ?', max_price),
+                                 ('s.available_seats >= ?', min_free_seats or None),
+                                 ('s.movie_id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?)',
+                                  fts_query(query)),
+                                 ('s.movie_id IN (SELECT id FROM movies WHERE genre = ?)', genre)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        params.append(limit)
         
+        with self.readers.connection() as conn:
+            rows = prepare_cursor(conn.cursor(), self.row_mode).execute(f'''
+                SELECT s.id, s.movie_id, m.title AS movie_title, s.screening_time, s.hall_number, s.price,
+                       s.available_seats
+                FROM screenings s
+                JOIN movies m ON m.id = s.movie_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.starts_at, s.id
+                LIMIT ?
+            ''', params).fetchall()
+        return convert_rows(rows, SearchScreeningRow, self.row_mode)
+    
+    def _load_seat_map(self, cursor: sqlite3.Cursor, screening_id: int) -> Optional[SeatMap]:
         cursor.execute('''
-            SELECT s.id, s.screening_time, s.hall_number, s.price, s.available_seats
+            SELECT s.seat_map, COALESCE(h.rows, ?), COALESCE(h.seats_per_row, ?)
             FROM screenings s
-            WHERE s.movie_id = ? AND s.screening_time > datetime('now')
-            ORDER BY s.screening_time
-        ''', (movie_id,))
-        
-        screenings = []
-        for row in cursor.fetchall():
-            screenings.append({
-                'id': row[0],
-                'screening_time': row[1],
-                'hall_number': row[2],
-                'price': row[3],
-                'available_seats': row[4]
-            })
+            LEFT JOIN halls h ON h.number = s.hall_number
+            WHERE s.id = ?
+        ''', (DEFAULT_HALL[0], DEFAULT_HALL[1], screening_id))
+        result = cursor.fetchone()
+        if not result:
+            return None
         
-        conn.close()
-        return screenings
+        bits, rows, cols = result
+        seat_map = SeatMap(rows, cols, bits)
+        if bits is None:
+            # Карта еще не создавалась: восстанавливаем ее по уже проданным билетам
+            cursor.execute('SELECT seat_number FROM tickets WHERE screening_id = ?', (screening_id,))
+            for (seat,) in cursor.fetchall():
+                seat_map.claim(seat)
+        return seat_map
     
-    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1) -> bool:
-        """Покупка билетов"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+    def get_seat_map(self, screening_id: int) -> Optional[SeatMap]:
+        """Получить карту мест сеанса"""
+        with self.readers.connection() as conn:
+            return self._load_seat_map(conn.cursor(), screening_id)
+    
+    def _write_transaction(self, operation):
+        """Выполнить operation(cursor) в транзакции BEGIN IMMEDIATE.
         
-        try:
-            # Проверка доступности мест
-            cursor.execute('SELECT available_seats, price FROM screenings WHERE id = ?', (screening_id,))
-            result = cursor.fetchone()
-            
-            if not result or result[0] < seat_count:
+        Блокировка на запись берется до первого чтения, поэтому проверка и изменение
+        данных не могут чередоваться с другим писателем. При SQLITE_BUSY транзакция
+        повторяется с экспоненциальной задержкой, не более max_retries раз.
+        """
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            with self.writer.connection() as conn:
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    result = operation(conn.cursor())
+                    conn.commit()
+                    return result
+                except sqlite3.OperationalError as e:
+                    conn.rollback()
+                    if not _is_busy_error(e) or attempt == self.max_retries:
+                        raise
+                except Exception:
+                    conn.rollback()
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 1.0)
+    
+    def _purchase(self, cursor: sqlite3.Cursor, screening_id: int, customer_name: str, customer_email: str,
+                  seat_count: int, seat_numbers: Optional[List[int]], changed_movies: set) -> Optional[List[int]]:
+        """Покупка внутри открытой транзакции; возвращает номера мест или None.
+        
+        В changed_movies добавляются фильмы, чьи сеансы изменились (для сброса кэша после фиксации).
+        """
+        claimed = self._claim_seats(cursor, screening_id, seat_count, seat_numbers, changed_movies)
+        if not claimed:
+            return None
+        
+        seats, price = claimed
+        self._insert_tickets(cursor, screening_id, customer_name, customer_email, seats, price)
+        return seats
+    
+    def _claim_seats(self, cursor: sqlite3.Cursor, screening_id: int, seat_count: int,
+                     seat_numbers: Optional[List[int]], changed_movies: set) -> Optional[tuple]:
+        """Занять места сеанса внутри открытой транзакции; возвращает (места, цена) или None"""
+        # Проверка доступности мест
+        cursor.execute('SELECT available_seats, price, movie_id FROM screenings WHERE id = ?', (screening_id,))
+        result = cursor.fetchone()
+        
+        if not result or result[0] < seat_count:
+            return None
+        
+        available_seats, price, movie_id = result
+        seat_map = self._load_seat_map(cursor, screening_id)
+        seats = seat_map.allocate(seat_count, seat_numbers)
+        if not seats:
+            return None
+        
+        # Обновление доступных мест и карты мест (условное, на случай рассинхронизации счетчика)
+        cursor.execute('''
+            UPDATE screenings 
+            SET available_seats = available_seats - ?, seat_map = ?
+            WHERE id = ? AND available_seats >= ?
+        ''', (seat_count, seat_map.to_bytes(), screening_id, seat_count))
+        if cursor.rowcount != 1:
+            return None
+        changed_movies.add(movie_id)
+        return seats, price
+    
+    def _insert_tickets(self, cursor: sqlite3.Cursor, screening_id: int, customer_name: str, customer_email: str,
+                        seats: List[int], price: float, hold_id: Optional[int] = None):
+        """Билеты на уже занятые места, их учет в счетчиках продаж и событие покупки"""
+        cursor.executemany('''
+            INSERT INTO tickets (screening_id, customer_name, customer_email, seat_number, total_price, purchased_at)
+            VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+        ''', [(screening_id, customer_name, customer_email, seat, price) for seat in seats])
+        cursor.execute(ADD_SALE, (len(seats), price * len(seats), screening_id))
+        cursor.execute(INSERT_EVENT, _purchase_event(screening_id, customer_name, customer_email, seats, price, hold_id))
+    
+    def purchase_ticket(self, screening_id: int, customer_name: str, customer_email: str, seat_count: int = 1,
+                        seat_numbers: Optional[List[int]] = None) -> bool:
+        """Покупка билетов (на выбранные места или на подобранные рядом)"""
+        if self.batcher:
+            try:
+                return self.batcher.submit(screening_id, customer_name, customer_email, seat_count,
+                                           seat_numbers).result()
+            except Exception as e:
+                print(f"Ошибка при покупке билета: {e}")
                 return False
+        if seat_numbers is not None:
+            seat_count = len(seat_numbers)
+        
+        changed_movies = set()
+        
+        def purchase(cursor):
+            self._expire_holds(cursor, changed_movies)
+            return self._purchase(cursor, screening_id, customer_name, customer_email, seat_count, seat_numbers,
+                                  changed_movies)
+        
+        try:
+            seats = self._write_transaction(purchase)
+            self._invalidate_movies(changed_movies)
+            return seats is not None
+        except Exception as e:
+            print(f"Ошибка при покупке билета: {e}")
+            return False
+    
+    def _purchase_many(self, cursor: sqlite3.Cursor, orders: List[tuple], changed_movies: set) -> List[bool]:
+        """Пакетная покупка внутри открытой транзакции"""
+        screenings = {}  # screening_id -> [available_seats, price, movie_id, seat_map, исходное available_seats]
+        tickets = []
+        events = []
+        results = []
+        self._expire_holds(cursor, changed_movies)
+        
+        for order in orders:
+            screening_id, customer_name, customer_email, seat_count = order[:4]
+            seat_numbers = order[4] if len(order) > 4 else None
+            if seat_numbers is not None:
+                seat_count = len(seat_numbers)
             
-            available_seats, price = result
+            if screening_id not in screenings:
+                cursor.execute('SELECT available_seats, price, movie_id FROM screenings WHERE id = ?', (screening_id,))
+                result = cursor.fetchone()
+                screenings[screening_id] = [*result, self._load_seat_map(cursor, screening_id), result[0]] if result else None
+            state = screenings[screening_id]
             
-            # Покупка билетов
-            for seat in range(1, seat_count + 1):
-                cursor.execute('''
-                    INSERT INTO tickets (screening_id, customer_name, customer_email, seat_number, total_price)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (screening_id, customer_name, customer_email, available_seats - seat + 1, price))
+            seats = None
+            if state and state[0] >= seat_count:
+                seats = state[3].allocate(seat_count, seat_numbers)
+            if not seats:
+                results.append(False)
+                continue
             
-            # Обновление доступных мест
+            state[0] -= seat_count
+            tickets.extend((screening_id, customer_name, customer_email, seat, state[1]) for seat in seats)
+            events.append(_purchase_event(screening_id, customer_name, customer_email, seats, state[1]))
+            results.append(True)
+        
+        cursor.executemany('''
+            INSERT INTO tickets (screening_id, customer_name, customer_email, seat_number, total_price, purchased_at)
+            VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+        ''', tickets)
+        cursor.executemany(
+            'UPDATE screenings SET available_seats = ?, seat_map = ? WHERE id = ?',
+            [(state[0], state[3].to_bytes(), screening_id) for screening_id, state in screenings.items() if state]
+        )
+        cursor.executemany(ADD_SALE, [
+            (state[4] - state[0], (state[4] - state[0]) * state[1], screening_id)
+            for screening_id, state in screenings.items() if state and state[4] != state[0]
+        ])
+        cursor.executemany(INSERT_EVENT, events)
+        changed_movies.update(state[2] for state in screenings.values() if state)
+        return results
+    
+    def purchase_tickets_bulk(self, orders: List[tuple]) -> List[bool]:
+        """Пакетная покупка в одной транзакции.
+        
+        Заказ — кортеж (screening_id, customer_name, customer_email, seat_count[, seat_numbers]).
+        Возвращает результат для каждого заказа в исходном порядке.
+        """
+        orders = list(orders)
+        changed_movies = set()
+        try:
+            results = self._write_transaction(lambda cursor: self._purchase_many(cursor, orders, changed_movies))
+            self._invalidate_movies(changed_movies)
+            return results
+        except Exception as e:
+            print(f"Ошибка при пакетной покупке билетов: {e}")
+            return [False] * len(orders)
+    
+    def hold_seats(self, screening_id: int, seat_count: int = 1, seat_numbers: Optional[List[int]] = None,
+                   ttl: float = DEFAULT_HOLD_TTL) -> Optional[int]:
+        """Удержать места на ttl секунд (на время оплаты); возвращает id удержания или None.
+        
+        Места занимаются короткой транзакцией, открытой транзакции на время оплаты нет:
+        удержание — строка holds, которую подтверждение превращает в билеты.
+        """
+        if seat_numbers is not None:
+            seat_count = len(seat_numbers)
+        expires_at = time.time() + ttl
+        changed_movies = set()
+        
+        def hold(cursor):
+            self._expire_holds(cursor, changed_movies)
+            claimed = self._claim_seats(cursor, screening_id, seat_count, seat_numbers, changed_movies)
+            if not claimed:
+                return None
+            seats, _ = claimed
+            cursor.execute('INSERT INTO holds (screening_id, seats, seat_count, expires_at) VALUES (?, ?, ?, ?)',
+                           (screening_id, format_seats(seats), len(seats), expires_at))
+            hold_id = cursor.lastrowid
+            cursor.execute(INSERT_EVENT, event_row(EVENT_HOLD, screening_id, hold_id=hold_id, seats=seats,
+                                                   expires_at=expires_at))
+            return hold_id
+        
+        try:
+            hold_id = self._write_transaction(hold)
+        except Exception as e:
+            print(f"Ошибка при удержании мест: {e}")
+            return None
+        self._invalidate_movies(changed_movies)
+        if hold_id is not None:
+            self.hold_wheel.schedule(hold_id, expires_at)
+        return hold_id
+    
+    def confirm_hold(self, hold_id: int, customer_name: str, customer_email: str) -> bool:
+        """Купить удержанные места; False, если удержание истекло или уже снято"""
+        changed_movies = set()
+        
+        def confirm(cursor):
+            self._expire_holds(cursor, changed_movies)
             cursor.execute('''
-                UPDATE screenings 
-                SET available_seats = available_seats - ? 
-                WHERE id = ?
-            ''', (seat_count, screening_id))
-            
-            conn.commit()
+                SELECT h.screening_id, h.seats, s.price
+                FROM holds h
+                JOIN screenings s ON s.id = h.screening_id
+                WHERE h.id = ?
+            ''', (hold_id,))
+            result = cursor.fetchone()
+            if not result:
+                return False
+            screening_id, seats, price = result
+            cursor.execute('DELETE FROM holds WHERE id = ?', (hold_id,))
+            self._insert_tickets(cursor, screening_id, customer_name, customer_email, parse_seats(seats), price,
+                                 hold_id)
             return True
-            
+        
+        try:
+            confirmed = self._write_transaction(confirm)
         except Exception as e:
-            conn.rollback()
-            print(f"Ошибка при покупке билета: {e}")
+            print(f"Ошибка при подтверждении удержания: {e}")
             return False
-        finally:
-            conn.close()
+        self.hold_wheel.cancel(hold_id)
+        self._invalidate_movies(changed_movies)
+        return confirmed
+    
+    def release_hold(self, hold_id: int) -> bool:
+        """Снять удержание и освободить места"""
+        changed_movies = set()
+        
+        def release(cursor):
+            cursor.execute('SELECT screening_id, seats FROM holds WHERE id = ?', (hold_id,))
+            result = cursor.fetchone()
+            if not result:
+                return False
+            screening_id, seats = result[0], parse_seats(result[1])
+            cursor.execute('DELETE FROM holds WHERE id = ?', (hold_id,))
+            self._release_seats(cursor, screening_id, seats, changed_movies)
+            cursor.execute(INSERT_EVENT, event_row(EVENT_HOLD_RELEASED, screening_id, hold_id=hold_id, seats=seats))
+            return True
+        
+        try:
+            released = self._write_transaction(release)
+        except Exception as e:
+            print(f"Ошибка при снятии удержания: {e}")
+            return False
+        self.hold_wheel.cancel(hold_id)
+        self._invalidate_movies(changed_movies)
+        return released
+    
+    def expire_holds(self) -> int:
+        """Снять удержания с истекшим сроком (в том числе созданные другими экземплярами)"""
+        changed_movies = set()
+        expired = self._write_transaction(lambda cursor: self._expire_holds(cursor, changed_movies))
+        self._invalidate_movies(changed_movies)
+        return expired
+    
+    def _expire_due_holds(self):
+        # Колесо срабатывает только на удержания этого экземпляра; транзакция снимает все истекшие
+        if self.hold_wheel and not self.writer.readonly and self.hold_wheel.advance():
+            self.expire_holds()
+    
+    def _expire_holds(self, cursor: sqlite3.Cursor, changed_movies: set) -> int:
+        """Снять истекшие удержания внутри открытой транзакции (диапазон по индексу expires_at)"""
+        cursor.execute('SELECT id, screening_id, seats FROM holds WHERE expires_at <= ?', (time.time(),))
+        expired = cursor.fetchall()
+        if not expired:
+            return 0
+        
+        released: Dict[int, List[int]] = {}
+        events = []
+        for hold_id, screening_id, seats in expired:
+            seats = parse_seats(seats)
+            released.setdefault(screening_id, []).extend(seats)
+            events.append(event_row(EVENT_HOLD_EXPIRED, screening_id, hold_id=hold_id, seats=seats))
+        cursor.executemany('DELETE FROM holds WHERE id = ?', [(row[0],) for row in expired])
+        for screening_id, seats in released.items():
+            self._release_seats(cursor, screening_id, seats, changed_movies)
+        cursor.executemany(INSERT_EVENT, events)
+        return len(expired)
+    
+    def _release_seats(self, cursor: sqlite3.Cursor, screening_id: int, seats: List[int], changed_movies: set):
+        seat_map = self._load_seat_map(cursor, screening_id)
+        seat_map.release_seats(seats)
+        cursor.execute('UPDATE screenings SET available_seats = available_seats + ?, seat_map = ? WHERE id = ?',
+                       (len(seats), seat_map.to_bytes(), screening_id))
+        cursor.execute('SELECT movie_id FROM screenings WHERE id = ?', (screening_id,))
+        changed_movies.add(cursor.fetchone()[0])
+    
+    def register_consumer(self, consumer: str, from_latest: bool = False) -> int:
+        """Зарегистрировать потребителя потока изменений; возвращает его подтвержденную позицию.
+        
+        Пока потребитель зарегистрирован, не подтвержденные им события не удаляются.
+        """
+        return self._write_transaction(lambda cursor: register_consumer(cursor, consumer, from_latest))
+    
+    def consumer_position(self, consumer: str) -> Optional[int]:
+        """Подтвержденная позиция потребителя (None — не зарегистрирован)"""
+        with self.readers.connection() as conn:
+            return consumer_position(conn.cursor(), consumer)
+    
+    def read_changes(self, after: int = 0, limit: int = 1000) -> List[ChangeEvent]:
+        """Пакет событий потока изменений с номерами больше after, по порядку фиксации"""
+        with self.readers.connection() as conn:
+            return read_events(conn, after, limit)
+    
+    def ack_changes(self, consumer: str, position: int) -> int:
+        """Подтвердить обработку событий до position включительно; события, подтвержденные
+        всеми потребителями, удаляются. Возвращает число удаленных событий."""
+        return self._write_transaction(lambda cursor: acknowledge(cursor, consumer, position))
+    
+    def get_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """Загрузка залов и выручка по счетчикам: group_by — 'hall', 'movie' или 'day',
+        окно [start, end) — по дням сеансов"""
+        with self.readers.connection() as conn:
+            return sales_report(conn, group_by, start, end)
+    
+    def recompute_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        """То же, что get_sales_report, но по сеансам и билетам и с окном до секунды"""
+        with self.readers.connection() as conn:
+            return recompute_sales_report(conn, group_by, start, end)
+    
+    def rebuild_sales_counters(self):
+        """Пересчитать счетчики продаж по сеансам и билетам"""
+        self._write_transaction(lambda cursor: rebuild_sales_counters(cursor.connection))
+    
+    def archive_past_screenings(self, before: Optional[datetime.datetime] = None,
+                                batch_size: int = 500) -> Dict[str, int]:
+        """Перенести сеансы, начавшиеся до before (по умолчанию — до текущего момента),
+        вместе с билетами в архивные таблицы.
+        
+        Каждый пакет из batch_size сеансов переносится отдельной короткой транзакцией,
+        чтобы покупки не ждали писателя. История покупок и пересчет отчетов видят архив,
+        счетчики продаж не меняются. Возвращает {'screenings': ..., 'tickets': ...}.
+        """
+        cutoff = to_epoch(before) if before is not None else int(time.time())
+        moved = {'screenings': 0, 'tickets': 0}
+        while True:
+            screenings, tickets = self._write_transaction(lambda cursor: archive_batch(cursor, cutoff, batch_size))
+            moved['screenings'] += screenings
+            moved['tickets'] += tickets
+            if screenings < batch_size:
+                return moved
     
     def get_ticket_history(self, customer_email: str) -> List[Dict]:
         """Получить историю покупок"""
+        with self.readers.connection() as conn:
+            return self._query_ticket_history(conn, customer_email)
+    
+    def _query_ticket_history(self, conn: sqlite3.Connection, customer_email: str) -> List[Dict]:
+        cursor = prepare_cursor(conn.cursor(), self.row_mode)
+        rows = cursor.execute(HISTORY_QUERY, (customer_email, customer_email)).fetchall()
+        return convert_rows(rows, HistoryRow, self.row_mode)
+    
+    @contextmanager
+    def snapshot(self) -> Iterator['ReadSnapshot']:
+        """Согласованное чтение для страницы из нескольких запросов.
+        
+        Все запросы внутри блока with выполняются в одной транзакции чтения на соединении
+        mode=ro и видят одно и то же зафиксированное состояние, даже если между ними
+        проходят покупки. Кэш афиши в снимке не используется.
+        """
+        with self.readers.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield ReadSnapshot(self, conn)
+            finally:
+                conn.rollback()
+    
+    def get_ticket_history_page(self, customer_email: str, page_size: int = 50, cursor: Optional[str] = None) -> Dict:
+        """Страница истории покупок (новые сначала), постраничный поиск по ключу (purchase_time, id).
+        
+        Возвращает {'tickets': [...], 'next_cursor': курсор следующей страницы или None}.
+        """
+        if page_size < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+        
+        query = HISTORY_PAGE_QUERY
+        params = [customer_email]
+        if cursor:
+            query = HISTORY_PAGE_AFTER_QUERY
+            params.extend(decode_cursor(cursor))
+        # Условие повторяется в рабочей и архивной части запроса
+        params = params * 2 + [page_size + 1]
+        
+        with self.readers.connection() as conn:
+            rows = prepare_cursor(conn.cursor(), self.row_mode).execute(query, params).fetchall()
+        
+        # Лишняя строка показывает, что есть следующая страница
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor(rows[-1][6], rows[-1][0])
+        return {'tickets': convert_rows(rows, HistoryRow, self.row_mode), 'next_cursor': next_cursor}
+    
+    def iter_ticket_history(self, customer_email: str, batch_size: int = 500) -> Iterator[Dict]:
+        """Потоковая выдача всей истории покупок (новые сначала) порциями fetchmany.
+        
+        Соединение занято до конца итерации (или до закрытия генератора).
+        """
+        with self.readers.connection() as conn:
+            cursor = prepare_cursor(conn.cursor(), self.row_mode)
+            cursor.execute(HISTORY_QUERY, (customer_email, customer_email))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from convert_rows(rows, HistoryRow, self.row_mode)
+    
+class ReadSnapshot:
+    """Запросы чтения в транзакции снимка (см. CinemaTicketSystemSQLite.snapshot)"""
+
+    def __init__(self, system: CinemaTicketSystemSQLite, conn: sqlite3.Connection):
+        self.system = system
+        self.conn = conn
+
+    def get_available_movies(self) -> List[Dict]:
+        return self.system._query_available_movies(self.conn)[0]
+
+    def get_screenings_by_movie(self, movie_id: int) -> List[Dict]:
+        return self.system._query_screenings_by_movie(self.conn, movie_id)[0]
+
+    def get_seat_map(self, screening_id: int) -> Optional[SeatMap]:
+        return self.system._load_seat_map(self.conn.cursor(), screening_id)
+
+    def get_ticket_history(self, customer_email: str) -> List[Dict]:
+        return self.system._query_ticket_history(self.conn, customer_email)
+
+    def get_sales_report(self, group_by: str = 'hall', start=None, end=None) -> Dict:
+        return sales_report(self.conn, group_by, start, end)
+
+class _ConnectPerCallPool:
+    """Открывает новое соединение на каждый вызов (поведение до введения пула)"""
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+
+    @contextmanager
+    def connection(self):
         conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+def remove_database(db_name: str):
+    """Удалить файл базы вместе с файлами -wal и -shm"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+
+def connection_benchmark(db_name: str = "cinema_benchmark.db", iterations: int = 1000):
+    """Замер задержки одного вызова: соединение на вызов против пула соединений"""
+    print("=== ЗАМЕР ЗАДЕРЖКИ СОЕДИНЕНИЙ ===")
+    remove_database(db_name)
+    try:
+        _connection_benchmark(db_name, iterations)
+    finally:
+        remove_database(db_name)
+
+def _connection_benchmark(db_name: str, iterations: int):
+    with CinemaTicketSystemSQLite(db_name) as system:
+        system.purchase_ticket(1, "Benchmark", "benchmark@test.com", 1)
+        operations = [
+            ('get_available_movies', lambda: system.get_available_movies()),
+            ('get_screenings_by_movie', lambda: system.get_screenings_by_movie(1)),
+            ('get_ticket_history', lambda: system.get_ticket_history("benchmark@test.com")),
+        ]
+        pooled = system.readers
         
-        cursor.execute('''
-            SELECT t.id, m.title, s.screening_time, s.hall_number, t.seat_number, t.total_price, t.purchase_time
-            FROM tickets t
-            JOIN screenings s ON t.screening_id = s.id
-            JOIN movies m ON s.movie_id = m.id
-            WHERE t.customer_email = ?
-            ORDER BY t.purchase_time DESC
-        ''', (customer_email,))
+        for mode, pool in (('соединение на вызов', _ConnectPerCallPool(db_name)), ('пул соединений', pooled)):
+            system.readers = pool
+            print(f"\nРежим: {mode}")
+            for name, operation in operations:
+                operation()  # прогрев
+                timings = []
+                for _ in range(iterations):
+                    start_time = time.perf_counter_ns()
+                    operation()
+                    timings.append(time.perf_counter_ns() - start_time)
+                timings.sort()
+                mean = sum(timings) / len(timings) / 1000
+                median = timings[len(timings) // 2] / 1000
+                print(f"{name}: среднее {mean:.1f} мкс, медиана {median:.1f} мкс")
         
-        tickets = []
-        for row in cursor.fetchall():
-            tickets.append({
-                'ticket_id': row[0],
-                'movie_title': row[1],
-                'screening_time': row[2],
-                'hall_number': row[3],
-                'seat_number': row[4],
-                'total_price': row[5],
-                'purchase_time': row[6]
-            })
+        system.readers = pooled
+
+def bulk_purchase_benchmark(db_name: str = "cinema_benchmark.db", order_count: int = 2000, threads: int = 8):
+    """Сравнение пропускной способности: покупки в цикле, пакетная покупка и групповая фиксация"""
+    print("=== ПАКЕТНАЯ ПОКУПКА БИЛЕТОВ ===")
+    
+    orders = [
+        (i % 140 + 1, f"Bulk{i}", f"bulk{i % 100}@test.com", 1)
+        for i in range(order_count)
+    ]
+    
+    def fresh_system(**kwargs) -> CinemaTicketSystemSQLite:
+        remove_database(db_name)
+        return CinemaTicketSystemSQLite(db_name, **kwargs)
+    
+    def report(name: str, elapsed: float, successful: int):
+        print(f"{name}: {successful}/{order_count} заказов, {order_count / elapsed:.0f} заказов/с")
+    
+    try:
+        with fresh_system() as system:
+            start_time = time.perf_counter()
+            successful = sum(system.purchase_ticket(*order) for order in orders)
+            report("purchase_ticket в цикле", time.perf_counter() - start_time, successful)
+    
+        with fresh_system() as system:
+            start_time = time.perf_counter()
+            successful = sum(system.purchase_tickets_bulk(orders))
+            report("purchase_tickets_bulk", time.perf_counter() - start_time, successful)
+    
+        with fresh_system(pool_size=threads, group_commit=True) as system:
+            results = []
+            def buy(part):
+                results.extend(system.purchase_ticket(*order) for order in part)
+            workers = [threading.Thread(target=buy, args=(orders[i::threads],)) for i in range(threads)]
+            start_time = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            report(f"групповая фиксация ({threads} потоков)", time.perf_counter() - start_time, sum(results))
+    finally:
+        remove_database(db_name)
+
+def read_under_write_benchmark(db_name: str = "cinema_benchmark.db", duration: float = 3.0, readers: int = 4):
+    """Пропускная способность чтения, пока поток-покупатель непрерывно покупает билеты.
+    
+    Сравниваются чтение без записи, общий пул соединений для чтения и записи
+    (как было до выделения писателя) и читатели mode=ro рядом с писателем.
+    """
+    print("=== ЧТЕНИЕ ПОД НАГРУЗКОЙ ЗАПИСИ ===")
+    
+    def run(shared_pool: bool, writes: bool):
+        remove_database(db_name)
+        system = CinemaTicketSystemSQLite(db_name, pool_size=readers)
+        # Дальние сеансы, чтобы покупкам хватило мест на весь замер
+        base_time = datetime.datetime.now() + datetime.timedelta(days=30)
+        screening_ids = [system.add_screening(i % 5 + 1, base_time + datetime.timedelta(hours=i), i % 3 + 1, 500, 100)
+                         for i in range(500)]
+        if shared_pool:
+            # Собственные пулы системы закрываются, иначе их соединения останутся открытыми
+            system.readers.close()
+            system.writer.close()
+            pooled = ConnectionPool(db_name, readers + 1)
+            system.writer, system.readers = pooled, pooled
         
-        conn.close()
-        return tickets
+        stop = threading.Event()
+        counts = [0] * (readers + 1)
+        
+        def reader(number: int):
+            rng = random.Random(number)
+            while not stop.is_set():
+                operation = rng.random()
+                if operation < 0.4:
+                    system.get_available_movies()
+                elif operation < 0.8:
+                    system.get_screenings_by_movie(rng.randint(1, 5))
+                else:
+                    system.get_ticket_history(f"load{rng.randint(0, 99)}@test.com")
+                counts[number] += 1
+        
+        def writer():
+            rng = random.Random(0)
+            while not stop.is_set():
+                counts[readers] += system.purchase_ticket(rng.choice(screening_ids), "Load",
+                                                          f"load{rng.randint(0, 99)}@test.com", 1)
+        
+        workers = [threading.Thread(target=reader, args=(number,)) for number in range(readers)]
+        if writes:
+            workers.append(threading.Thread(target=writer))
+        for worker in workers:
+            worker.start()
+        time.sleep(duration)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        system.close()
+        return sum(counts[:readers]) / duration, counts[readers] / duration
+    
+    try:
+        for name, shared_pool, writes in (("без записи", False, False),
+                                           ("общий пул чтения и записи", True, True),
+                                           ("писатель и читатели mode=ro", False, True)):
+            reads, purchases = run(shared_pool, writes)
+            print(f"{name}: {reads:.0f} чтений/с, {purchases:.0f} покупок/с")
+    finally:
+        remove_database(db_name)
+
+def row_mode_benchmark(db_name: str = "cinema_benchmark.db", tickets: int = 20000, repeats: int = 20):
+    """Строк в секунду при чтении истории и сеансов в каждом формате строк"""
+    print("=== ФОРМАТЫ СТРОК РЕЗУЛЬТАТОВ ===")
+    remove_database(db_name)
+    try:
+        with CinemaTicketSystemSQLite(db_name) as system:
+            base_time = datetime.datetime.now() + datetime.timedelta(days=30)
+            screening_ids = [system.add_screening(1, base_time + datetime.timedelta(hours=i), i % 3 + 1, 500, 100)
+                             for i in range(tickets // 100 + 1)]
+            system.purchase_tickets_bulk([(screening_ids[i // 100], "Rows", "rows@test.com", 1)
+                                          for i in range(tickets)])
+    
+        operations = (
+            ('get_ticket_history', lambda system: system.get_ticket_history("rows@test.com")),
+            ('get_screenings_by_movie', lambda system: system.get_screenings_by_movie(1)),
+        )
+        for row_mode in ROW_MODES:
+            with CinemaTicketSystemSQLite(db_name, row_mode=row_mode, sample_data=False) as system:
+                for name, operation in operations:
+                    operation(system)  # прогрев
+                    rows = 0
+                    start_time = time.perf_counter()
+                    for _ in range(repeats):
+                        rows += len(operation(system))
+                    elapsed = time.perf_counter() - start_time
+                    print(f"{row_mode:>5} {name:<24} {rows / elapsed:10.0f} строк/с")
+    finally:
+        remove_database(db_name)
 
 def main_sqlite():
     """Основная функция для SQLite версии"""
@@ -219,7 +1333,11 @@ def main_sqlite():
         print("1. Просмотреть доступные фильмы")
         print("2. Купить билет")
         print("3. История покупок")
-        print("4. Выход")
+        print("4. Замер задержки соединений")
+        print("5. Замер пакетной покупки")
+        print("6. Замер чтения под нагрузкой записи")
+        print("7. Замер форматов строк")
+        print("8. Выход")
         
         choice = input("Выберите действие: ")
         
@@ -276,6 +1394,19 @@ def main_sqlite():
                     print(f"Билет {ticket['ticket_id']}: {ticket['movie_title']} - {ticket['screening_time']} - Место {ticket['seat_number']} - {ticket['total_price']} руб.")
                     
         elif choice == '4':
+            connection_benchmark()
+            
+        elif choice == '5':
+            bulk_purchase_benchmark()
+            
+        elif choice == '6':
+            read_under_write_benchmark()
+            
+        elif choice == '7':
+            row_mode_benchmark()
+            
+        elif choice == '8':
+            system.close()
             print("До свидания!")
             break
         else: